@@ -0,0 +1,186 @@
+# coding:utf-8
+
+""" 推箱子的位棋盘(bitboard)状态表示 (不依赖 tkinter)
+
+基本说明：
+    1. 墙，目的地，箱子各用一个 Python 整数表示，每个格子对应其中的一位，人的位置为位编号
+    2. 地图四周各加一圈墙(地图外的格子也视为墙)，每行宽 cols + 2 位，
+       上下左右移动分别为位编号 -stride, +stride, -1, +1, 不会越界或跨行
+    3. 移动，推箱子，过关判断都只是几次位运算; (boxes, worker) 可直接作为哈希键
+    4. 与 game_maps.basic_maps 的二维列表格式相互转换: BitboardState.from_map() / to_map()
+    5. replay() 按推箱子记法(u d l r 走动, U D L R 推动)批量重放走法
+    6. step() 返回一步的增量 (原位置, 新位置, 箱子变化的位)，undo() / redo() 用它在 O(1) 时间内后退 / 前进一步
+
+开发人员: Edwin.Zhang
+开发时间: 2019-6-28
+"""
+
+# 与 play.py 中的定义相同: 0-墙，1-人，2-箱子，3-路，4-目的地, 5-人在目的地，6-箱子在目的地, -1-地图外
+Wall, Worker, Box, Passageway, Destination, WorkerInDest, BoxInDest = (0, 1, 2, 3, 4, 5, 6)
+Outside = -1
+
+DIRECTION_NAMES = {"u": "Up", "d": "Down", "l": "Left", "r": "Right"}
+
+
+class BitboardState:
+    """ 一个关卡的当前局面, 见模块说明 """
+
+    def __init__(self, rows, cols, walls, goals, boxes, worker, outside=0):
+        """
+            rows, cols : 地图的行数，列数
+            walls      : 墙的位棋盘(含四周的一圈墙)
+            goals      : 目的地的位棋盘
+            boxes      : 箱子的位棋盘
+            worker     : 人所在的位编号
+            outside    : 地图外格子(-1)的位棋盘，只用于还原地图
+        """
+        self.rows = rows
+        self.cols = cols
+        self.stride = cols + 2
+        self.walls = walls
+        self.goals = goals
+        self.boxes = boxes
+        self.worker = worker
+        self.outside = outside
+        self.offsets = {"Up": -self.stride, "Down": self.stride, "Left": -1, "Right": 1}
+
+    def bit_index(self, row, col):
+        return (row + 1) * self.stride + col + 1
+
+    def position(self, index):
+        """ 位编号对应的 (行, 列) """
+        row, col = divmod(index, self.stride)
+        return row - 1, col - 1
+
+    @classmethod
+    def from_map(cls, game_map):
+        """
+            由二维列表(或 numpy 数组)创建，格式与 game_maps.basic_maps 相同
+        """
+        rows, cols = len(game_map), len(game_map[0])
+        stride = cols + 2
+        walls, goals, boxes, outside = 0, 0, 0, 0
+        worker = None
+        for row in range(-1, rows + 1):
+            for col in range(-1, cols + 1):
+                bit = 1 << ((row + 1) * stride + col + 1)
+                if not (0 <= row < rows and 0 <= col < cols):
+                    walls |= bit
+                    continue
+                cell = int(game_map[row][col])
+                if cell in (Wall, Outside):
+                    walls |= bit
+                if cell == Outside:
+                    outside |= bit
+                if cell in (Destination, WorkerInDest, BoxInDest):
+                    goals |= bit
+                if cell in (Box, BoxInDest):
+                    boxes |= bit
+                if cell in (Worker, WorkerInDest):
+                    worker = (row + 1) * stride + col + 1
+        if worker is None:
+            raise ValueError("There is no worker in the map.")
+        return cls(rows, cols, walls, goals, boxes, worker, outside)
+
+    def cell(self, row, col):
+        """ (行, 列) 格子的编码，与 basic_maps 中的编码相同 """
+        index = self.bit_index(row, col)
+        bit = 1 << index
+        if self.outside & bit:
+            return Outside
+        if self.walls & bit:
+            return Wall
+        goal = self.goals & bit
+        if self.boxes & bit:
+            return BoxInDest if goal else Box
+        if index == self.worker:
+            return WorkerInDest if goal else Worker
+        return Destination if goal else Passageway
+
+    def to_map(self):
+        """ 转换为二维列表，格式与 basic_maps 相同 """
+        return [[self.cell(row, col) for col in range(self.cols)] for row in range(self.rows)]
+
+    def copy(self):
+        return BitboardState(self.rows, self.cols, self.walls, self.goals, self.boxes, self.worker, self.outside)
+
+    def key(self):
+        """ 局面的哈希键 """
+        return self.boxes, self.worker
+
+    def move(self, direction):
+        """
+            按 play.py 的规则向 direction ("Up", "Down", "Left", "Right") 移动一步
+            返回 (是否移动, 是否推动了箱子)
+        """
+        offset = self.offsets[direction]
+        target = self.worker + offset
+        target_bit = 1 << target
+        if self.walls & target_bit:
+            return False, False
+        if self.boxes & target_bit:
+            beyond_bit = 1 << (target + offset)
+            if (self.walls | self.boxes) & beyond_bit:
+                return False, False
+            self.boxes ^= target_bit | beyond_bit
+            self.worker = target
+            return True, True
+        self.worker = target
+        return True, False
+
+    def is_push(self, direction):
+        """ 向 direction 移动时是否会推箱子(前方格子上有箱子)，不改变局面 """
+        return bool(self.boxes >> (self.worker + self.offsets[direction]) & 1)
+
+    def step(self, direction):
+        """
+            同 move()，成功时返回这一步的增量 (人原来的位编号, 人现在的位编号, 箱子变化的位)，不能移动时返回 None
+            增量只有三个整数，不复制整个局面
+        """
+        old = self.worker
+        moved, pushed = self.move(direction)
+        if not moved:
+            return None
+        changed_boxes = (1 << self.worker | 1 << (2 * self.worker - old)) if pushed else 0
+        return old, self.worker, changed_boxes
+
+    def undo(self, delta):
+        old, new, changed_boxes = delta
+        self.boxes ^= changed_boxes
+        self.worker = old
+
+    def redo(self, delta):
+        old, new, changed_boxes = delta
+        self.boxes ^= changed_boxes
+        self.worker = new
+
+    def changed_cells(self, delta):
+        """ 增量涉及的格子 (行, 列): 人原来和现在的格子，推动时还有箱子被推到的格子 """
+        old, new, changed_boxes = delta
+        cells = [self.position(old), self.position(new)]
+        if changed_boxes:
+            cells.append(self.position(2 * new - old))
+        return cells
+
+    def box_positions(self):
+        """ 所有箱子的 (行, 列) """
+        boxes = self.boxes
+        while boxes:
+            low = boxes & -boxes
+            yield self.position(low.bit_length() - 1)
+            boxes ^= low
+
+    def is_solved(self):
+        """ 过关条件: 每个目的地上都有箱子 (箱子数与目的地数相同时，即所有箱子都在目的地上) """
+        return self.goals & ~self.boxes == 0
+
+    def replay(self, moves):
+        """
+            按推箱子记法重放走法: u d l r 为走动, U D L R 为推动(必须推动箱子)
+            返回成功执行的步数，遇到不能执行的一步时停止，局面停在这一步之前
+        """
+        for count, letter in enumerate(moves):
+            direction = DIRECTION_NAMES[letter.lower()]
+            if self.is_push(direction) != letter.isupper() or not self.move(direction)[0]:
+                return count
+        return len(moves)
@@ -0,0 +1,145 @@
+# coding:utf-8
+
+""" 推箱子的死锁检测 (不依赖 tkinter, 求解器和游戏界面共用)
+
+基本说明：
+    1. 静态死格子: 箱子一旦推到这些格子上，就再也推不到任何目的地，每个关卡只需计算一次
+        - 角落: 不是目的地，且上下至少一侧是墙，左右至少一侧是墙
+        - 沿墙的直线: 两个角落之间紧贴同一侧墙的一段格子，其中没有目的地
+        - 反向 "拉" 箱子时，从所有目的地都到达不了的格子 (包含以上两种情况)
+    2. 冻结死锁: 箱子在水平和垂直方向上都被墙，死格子或其它被冻结的箱子挡住，永远推不动，
+       只要其中有一个箱子不在目的地上，关卡就无解了
+    3. 格子用一维编号 row * cols + col 表示，与 solver.py 一致
+
+开发人员: Edwin.Zhang
+开发时间: 2019-6-28
+"""
+
+from collections import deque
+
+# 与 play.py 中的定义相同: 0-墙，1-人，2-箱子，3-路，4-目的地, 5-人在目的地，6-箱子在目的地, -1-地图外
+Wall, Worker, Box, Passageway, Destination, WorkerInDest, BoxInDest = (0, 1, 2, 3, 4, 5, 6)
+
+UP, DOWN, LEFT, RIGHT = (-1, 0), (1, 0), (0, -1), (0, 1)
+
+
+class DeadlockDetector:
+    """ 一个关卡的死锁检测, 见模块说明 """
+
+    def __init__(self, game_map):
+        """
+            game_map : 二维列表 或 numpy 数组，与 game_maps.basic_maps 中的格式相同，只使用墙和目的地的信息
+        """
+        self.rows = len(game_map)
+        self.cols = len(game_map[0])
+        self.floor = set()
+        self.goals = set()
+        for i in range(self.rows):
+            for j in range(self.cols):
+                cell = int(game_map[i][j])
+                if cell not in (Wall, -1):
+                    self.floor.add(i * self.cols + j)
+                if cell in (Destination, WorkerInDest, BoxInDest):
+                    self.goals.add(i * self.cols + j)
+
+        self.corner_squares = self.find_corners()
+        self.line_squares = self.find_wall_lines()
+        self.dead_squares = self.corner_squares | self.line_squares | self.find_unreachable_squares()
+
+    def neighbor(self, pos, offset):
+        """ pos 在 offset 方向上的相邻格子，出界或为墙时返回 None """
+        row, col = divmod(pos, self.cols)
+        row, col = row + offset[0], col + offset[1]
+        if 0 <= row < self.rows and 0 <= col < self.cols and row * self.cols + col in self.floor:
+            return row * self.cols + col
+        return None
+
+    def is_wall(self, pos, offset):
+        return self.neighbor(pos, offset) is None
+
+    def find_corners(self):
+        return {pos for pos in self.floor if pos not in self.goals and
+                (self.is_wall(pos, UP) or self.is_wall(pos, DOWN)) and
+                (self.is_wall(pos, LEFT) or self.is_wall(pos, RIGHT))}
+
+    def find_wall_lines(self):
+        """ 两个角落之间，紧贴同一侧墙，且没有目的地的直线格子 """
+        dead = set()
+        for corner in self.corner_squares:
+            for along, sides in ((RIGHT, (UP, DOWN)), (DOWN, (LEFT, RIGHT))):
+                for side in sides:
+                    if not self.is_wall(corner, side):
+                        continue
+                    line = [corner]
+                    pos = self.neighbor(corner, along)
+                    while pos is not None and pos not in self.goals and self.is_wall(pos, side):
+                        line.append(pos)
+                        if pos in self.corner_squares:
+                            dead.update(line)
+                            break
+                        pos = self.neighbor(pos, along)
+        return dead
+
+    def find_unreachable_squares(self):
+        """ 从目的地反向拉箱子(箱子从 p 拉到 p - d, 人需要站在 p - 2d)，到达不了的格子 """
+        reached = set(self.goals)
+        queue = deque(self.goals)
+        while queue:
+            pos = queue.popleft()
+            for offset in (UP, DOWN, LEFT, RIGHT):
+                prev = self.neighbor(pos, offset)
+                if prev is None or prev in reached:
+                    continue
+                if self.neighbor(prev, offset) is not None:
+                    reached.add(prev)
+                    queue.append(prev)
+        return self.floor - reached
+
+    def is_dead_square(self, pos):
+        return pos in self.dead_squares
+
+    def is_frozen(self, pos, boxes, visited, frozen):
+        """
+            判断 pos 上的箱子是否被冻结: 水平和垂直方向都被挡住
+            visited : 检查过程中视为墙的箱子(列表)，避免相互依赖时无限递归
+            frozen  : 被冻结的箱子(列表)
+            判断为未冻结时，撤销本次检查中加入的记录，因为它们以 "pos 是墙" 为前提
+        """
+        mark = len(visited), len(frozen)
+        visited.append(pos)
+        for axis in ((UP, DOWN), (LEFT, RIGHT)):
+            a, b = self.neighbor(pos, axis[0]), self.neighbor(pos, axis[1])
+            blocked = a is None or b is None or a in visited or b in visited or \
+                (a in self.dead_squares and b in self.dead_squares)
+            if not blocked:
+                blocked = (a in boxes and self.is_frozen(a, boxes, visited, frozen)) or \
+                          (b in boxes and self.is_frozen(b, boxes, visited, frozen))
+            if not blocked:
+                del visited[mark[0]:]
+                del frozen[mark[1]:]
+                return False
+        frozen.append(pos)
+        return True
+
+    def is_freeze_deadlock(self, boxes, pos):
+        """
+            推动后 pos 上的箱子被冻结，且冻结的箱子中有不在目的地上的，返回 True
+            boxes : 推动后所有箱子的位置
+        """
+        frozen = []
+        if not self.is_frozen(pos, boxes, [], frozen):
+            return False
+        return any(box not in self.goals for box in frozen)
+
+    def is_dead_push(self, boxes, pos):
+        """ 把箱子推到 pos 后是否死锁，求解器在生成推动时调用 """
+        return pos in self.dead_squares or self.is_freeze_deadlock(boxes, pos)
+
+    def deadlocked_boxes(self, boxes):
+        """ 当前局面中处于死锁的箱子(死格子上的，或冻结且不在目的地的)，游戏中用于提示玩家 """
+        boxes = set(boxes)
+        dead = {box for box in boxes if box in self.dead_squares}
+        for box in boxes - dead:
+            if box not in self.goals and self.is_freeze_deadlock(boxes, box):
+                dead.add(box)
+        return dead
@@ -6,30 +6,34 @@
     1. 参考game_maps.py 中的现有游戏场景，自己设计新的游戏关卡（可借鉴其他推箱子游戏的场景，自定义模仿设置）
     2. 设置 push_box_game.BOX_SIZE, 设置箱子大小，缺省为64， 理论上，可按自己需要，任意设置， 一般大小为 32, 64, 96, 128
     3. 设置 push_box_game.start_index, 设置开始关卡数， 进行游戏
-    4. 该程序仅用于演示参考，不是完整的商业游戏，大家可以自行扩展功能，如实时调整大小，回退功能等。
+    4. 该程序仅用于演示参考，不是完整的商业游戏，大家可以自行扩展功能，如实时调整大小等。
+    5. 操作: 方向键移动，空格键重新开始，BackSpace / z 后退一步，y 前进一步(撤销后退)，
+       h 从当前局面自动求解(后台线程中进行，界面不会停止响应)并回放，Esc 停止回放
+    6. 回放走法: python play.py --level 7 --replay "uuLLdR..." --delay 100  (u d l r 为走动, U D L R 为推动)
 
 开发人员: Edwin.Zhang
 开发时间: 2019-6-28
 """
 
+import queue
+import threading
 import PIL as pil
 from PIL import ImageTk
 from tkinter import *
 from tkinter.messagebox import *
-import numpy as np
 from game_maps import basic_maps
+from deadlock import DeadlockDetector
+from bitboard import BitboardState, DIRECTION_NAMES
+from solver import solve
 
 root = Tk()
 TOTAL_GAMES = len(basic_maps)  # 总的游戏关数
 BOX_SIZE = 64    # 游戏的方块大小, 可设置访问(32, 64, 96, 128) 其实，可以任意
+REPLAY_DELAY = 200   # 回放时每步之间的间隔(毫秒)
+HINT_POLL = 100      # 求解期间检查后台线程结果的间隔(毫秒)
 
 
-DIRECTIONS = {
-    "Up": (-1, 0, -2, 0),
-    "Down": (1, 0, 2, 0),
-    "Left": (0, -1, 0, -2),
-    "Right": (0, 1, 0, 2),
-}
+DIRECTIONS = ("Up", "Down", "Left", "Right")
 
 
 def resized_image(img_name, w_box=BOX_SIZE, h_box=BOX_SIZE):
@@ -74,14 +78,26 @@ Wall, Worker, Box, Passageway, Destination, WorkerInDest, BoxInDest = (0, 1, 2,
 
 
 class BoxGame:
-    def __init__(self, game_index=1):
+    def __init__(self, game_index=1, replay_delay=REPLAY_DELAY):
         """
-            game_index : 游戏关数, 从1开始
+            game_index   : 游戏关数, 从1开始
+            replay_delay : 回放时每步之间的间隔(毫秒)
         """
         self.game_index = max([1, game_index])
+        self.replay_delay = replay_delay
         self.game_steps = 0
         self.screen = None
         self.direction = "Stop"
+        self.deadlock = None
+        self.deadlocked = False
+        self.cell_items = None
+        self.history = []       # 已走的每一步: (增量, 方向), 增量见 BitboardState.step()
+        self.redo_steps = []    # 后退过的步，可以再前进
+        self.replay_job = None  # 回放中下一步的定时任务
+        self.replay_moves = None
+        self.hint_results = queue.Queue()  # 后台求解线程的结果，只在主线程中取出
+        self.hint_job = None    # 检查求解结果的定时任务, 不为 None 表示正在求解
+        self.hint_state = None  # 开始求解时的 (关卡, 局面)
 
     def start_game(self, *args):
         if self.screen is not None:
@@ -92,11 +108,15 @@ class BoxGame:
             del self.btn_refresh
 
         # 获得当前关卡的地图
-        self.cur_map = np.asarray(basic_maps[self.game_index-1], dtype=np.int)
-        self.rows, self.cols = self.cur_map.shape[0:2]   # 地图的行数, 列数
-        self.x, self.y = 0, 0                            # 推箱工人的位置 (self.x, self.y)
+        cur_map = basic_maps[self.game_index-1]
+        self.state = BitboardState.from_map(cur_map)     # 墙，目的地，箱子，人的位棋盘
+        self.rows, self.cols = self.state.rows, self.state.cols   # 地图的行数, 列数
         self.game_steps = 0                              # 当前关的步数
         self.direction = "Stop"
+        self.deadlock = DeadlockDetector(cur_map)        # 每关计算一次死格子
+        self.deadlocked = False                          # 是否已出现无法完成的局面
+        self.history, self.redo_steps = [], []
+        self.stop_replay()
 
         # 创建并刷新游戏界面
         win_width = self.cols * BOX_SIZE + BOX_SIZE/2 + 40
@@ -118,112 +138,178 @@ class BoxGame:
         self.btn_refresh.bind("<Button-1>", self.start_game)  # 重新开始游戏，可以按“空格”来完成
         self.btn_refresh.pack()
 
-    # 刷新绘制整个游戏区域图形
+    # 绘制整个游戏区域图形: 每个格子创建一个图片项并保存，之后移动时只更新变化的格子
     def refresh_screen(self):
-        self.screen.delete('all')    # 先清空画布，这句话很重要，否则，大的游戏界面刷新会越来越慢
+        self.screen.delete('all')
+        self.cell_items = [None] * (self.rows * self.cols)   # 按 i * cols + j 索引的图片项, 地图外的格子为 None
         for i in range(0, self.rows):
             for j in range(0, self.cols):
-                if self.cur_map[i, j] == Worker:
-                    self.x, self.y = i, j
-                    _img = imgs[Worker][self.direction][0]
-                elif self.cur_map[i, j] == WorkerInDest:
-                    self.x, self.y = i, j
-                    _img = imgs[Worker][self.direction][1]
-                elif self.cur_map[i, j] == -1:
-                    _img = None
-                else:
-                    _img = imgs[self.cur_map[i, j]]  # 获得对应位置的图片，并进行绘制
+                _img = self.cell_image(i, j)
                 if _img:
-                    self.screen.create_image((j * BOX_SIZE + BOX_SIZE / 2, i * BOX_SIZE + BOX_SIZE / 2), image=_img)
+                    self.cell_items[i * self.cols + j] = self.screen.create_image(
+                        (j * BOX_SIZE + BOX_SIZE / 2, i * BOX_SIZE + BOX_SIZE / 2), image=_img)
         root.update()
         self.screen.focus_set()
 
+    # 只刷新变化的格子(每次移动最多3个)，不再重建整个画布，大地图也不会变慢
+    def refresh_cells(self, cells):
+        for i, j in cells:
+            item = self.cell_items[i * self.cols + j]
+            if item is not None:
+                self.screen.itemconfig(item, image=self.cell_image(i, j))
+        root.update()
+
+    def cell_image(self, i, j):  # 获得对应位置的图片
+        cell = self.state.cell(i, j)
+        if cell == Worker:
+            return imgs[Worker][self.direction][0]
+        elif cell == WorkerInDest:
+            return imgs[Worker][self.direction][1]
+        elif cell == -1:
+            return None
+        return imgs[cell]
+
     def play_game(self, event):
         key_code = event.keysym
 
-        if key_code in DIRECTIONS.keys():  # 按方向键 "Up", "Down", "Left", "Right" 键的方向，进行移动
+        if key_code in DIRECTIONS:         # 按方向键 "Up", "Down", "Left", "Right" 键的方向，进行移动
+            self.stop_replay()
             self.move_to(key_code)
         elif key_code == "space":          # 按空格键，重新开始游戏
             self.start_game()
+        elif key_code in ("BackSpace", "z"):   # 后退一步
+            self.stop_replay()
+            self.undo()
+        elif key_code == "y":              # 前进一步
+            self.stop_replay()
+            self.redo()
+        elif key_code == "h":              # 自动求解并回放
+            self.hint()
+        elif key_code == "Escape":         # 停止回放
+            self.stop_replay()
 
     def move_to(self, move_direct):
         self.direction = move_direct   # 记录移动方向，可用来绘制搬运工人的不同方向上的图像
-        m = DIRECTIONS[move_direct]    # 获得移动方向的位移信息
-        x1, y1, x2, y2 = (self.x + m[0], self.y + m[1], self.x + m[2], self.y + m[3])  # 获得移动方向的后2个位置的坐标
-
-        p1, p2 = None, None   # 按某方向移动前，需要判断该方向前2个格子的状态，才能决定下一步行为
-        if self.is_valid_position(x1, y1):  # 判断是否在游戏区域
-            p1 = self.cur_map[x1, y1]
-        if self.is_valid_position(x2, y2):
-            p2 = self.cur_map[x2, y2]
-
-        if p1 == Wall or not self.is_valid_position(x1, y1):  # p1 是墙
-            return
-
-        if p1 == Passageway:      # P1处为通道
-            self.move_workman()
-            self.x = x1
-            self.y = y1
-            self.cur_map[x1, y1] = Worker
-        if p1 == Destination:     # P1处为目的地
-            self.move_workman()
-            self.x = x1
-            self.y = y1
-            self.cur_map[x1, y1] = WorkerInDest
-        if p1 == Box:
-            if p2 == Wall or not self.is_valid_position(x2, y2) or p2 == Box:  # P2是墙 或 出界 或为箱子
-                return
-        if p1 == Box and p2 == Passageway:
-            self.move_workman()
-            self.x = x1
-            self.y = y1
-            self.cur_map[x2, y2] = Box
-            self.cur_map[x1, y1] = Worker
-        if p1 == Box and p2 == Destination:
-            self.move_workman()
-            self.x = x1
-            self.y = y1
-            self.cur_map[x2, y2] = BoxInDest
-            self.cur_map[x1, y1] = Worker
-        if p1 == BoxInDest and p2 == Passageway:
-            self.move_workman()
-            self.x = x1
-            self.y = y1
-            self.cur_map[x2, y2] = Box
-            self.cur_map[x1, y1] = WorkerInDest
-        if p1 == BoxInDest and p2 == Destination:
-            self.move_workman()
-            self.x = x1
-            self.y = y1
-            self.cur_map[x2, y2] = BoxInDest
-            self.cur_map[x1, y1] = WorkerInDest
+        delta = self.state.step(move_direct)   # 前方是墙，或箱子前方是墙或箱子时不能移动
+        if delta is None:
+            return False
 
+        self.history.append((delta, move_direct))
+        self.redo_steps = []           # 走了新的一步，之前后退的步不能再前进
         self.game_steps += 1  # 统计已经用的步数
-        self.game_title()
-        self.refresh_screen()
+        self.after_step(delta)
 
         if self.is_passed():
             showinfo(title="提示", message=" 恭喜你顺利通过第({})关! \n\n一共用了({})步".format(self.game_index, self.game_steps))
             self.game_index = self.game_index % TOTAL_GAMES + 1
             self.start_game()
+        return True
 
-    def move_workman(self):
-        if self.cur_map[self.x, self.y] == Worker:
-            self.cur_map[self.x, self.y] = Passageway
-        elif self.cur_map[self.x, self.y] == WorkerInDest:
-            self.cur_map[self.x, self.y] = Destination
+    def undo(self):  # 后退一步: 只还原增量中的人的位置和箱子，不重新开始关卡
+        if not self.history:
+            return
+        delta, self.direction = self.history.pop()
+        self.state.undo(delta)
+        self.redo_steps.append((delta, self.direction))
+        self.game_steps -= 1
+        self.after_step(delta)
+
+    def redo(self):  # 前进一步: 重做最近后退的一步
+        if not self.redo_steps:
+            return
+        delta, self.direction = self.redo_steps.pop()
+        self.state.redo(delta)
+        self.history.append((delta, self.direction))
+        self.game_steps += 1
+        self.after_step(delta)
+
+    def after_step(self, delta):  # 移动，后退，前进后更新死锁提示，标题及变化的格子
+        if delta[2]:   # 箱子有变化
+            self.check_deadlock()
+        self.game_title()
+        self.refresh_cells(self.state.changed_cells(delta))
+
+    def replay(self, moves, delay=None):
+        """
+            从当前局面回放走法 moves (u d l r 为走动, U D L R 为推动)，每步间隔 delay 毫秒
+            回放的每一步都记入历史，可以后退; 按方向键，后退/前进，Esc 或重新开始时停止回放
+        """
+        self.stop_replay()
+        self.replay_moves = iter(moves)
+        self.replay_step(self.replay_delay if delay is None else delay)
+
+    def replay_step(self, delay):
+        letter = next(self.replay_moves, None)
+        if letter is None:
+            self.stop_replay()
+            return
+        # 先安排下一步，过关后 start_game() 会取消它
+        self.replay_job = root.after(delay, self.replay_step, delay)
+        direction = DIRECTION_NAMES[letter.lower()]
+        # 走法与当前局面不符(小写却会推箱子，大写却推不到箱子，或不能移动)时停止，不执行这一步
+        if self.state.is_push(direction) != letter.isupper() or not self.move_to(direction):
+            self.stop_replay()
+
+    def stop_replay(self):
+        if self.replay_job is not None:
+            root.after_cancel(self.replay_job)
+        self.replay_job = None
+        self.replay_moves = None
+        self.hint_results = queue.Queue()  # 后台求解线程的结果，只在主线程中取出
+        self.hint_job = None    # 检查求解结果的定时任务, 不为 None 表示正在求解
+        self.hint_state = None  # 开始求解时的 (关卡, 局面)
+
+    def hint(self):  # 在后台线程中从当前局面求解，tkinter 只在主线程中操作: 由 poll_hint() 定时取回结果并回放
+        if self.hint_job is not None:
+            return
+        self.hint_state = (self.game_index, self.state.key())
+        game_map = self.state.to_map()
+        threading.Thread(target=lambda: self.hint_results.put(solve(game_map, time_limit=10)), daemon=True).start()
+        self.hint_job = root.after(HINT_POLL, self.poll_hint)
+        self.game_title()
+
+    def poll_hint(self):
+        try:
+            solution = self.hint_results.get_nowait()
+        except queue.Empty:
+            self.hint_job = root.after(HINT_POLL, self.poll_hint)
+            return
+        self.hint_job = None
+        self.game_title()
+        if (self.game_index, self.state.key()) != self.hint_state:
+            return  # 求解期间玩家已移动或换了关卡，解不适用于当前局面
+        if not solution.solved:
+            showinfo(title="提示", message=" 当前局面无解，或在限定时间内没有找到解，请后退或重新开始")
+            return
+        self.replay(solution.moves)
 
-    def is_valid_position(self, row, col):  # 判断坐标是否在地图范围内
-        return 0 <= row < self.rows and 0 <= col < self.cols
+    def check_deadlock(self):  # 推动箱子后检查死锁，箱子推到死格子或被冻结时，提示玩家重新开始
+        boxes = [row * self.cols + col for row, col in self.state.box_positions()]
+        self.deadlocked = len(self.deadlock.deadlocked_boxes(boxes)) > 0
 
     def game_title(self):  # 为简化，直接在窗体标题中，显示游戏进度信息
-        root.title("推箱子 - 第({}/{})关    总步数: {}".format(self.game_index, TOTAL_GAMES, self.game_steps))
+        title = "推箱子 - 第({}/{})关    总步数: {}".format(self.game_index, TOTAL_GAMES, self.game_steps)
+        if self.deadlocked:
+            title += "    箱子已无法推到目的地，请按空格键重新开始"
+        if self.hint_job is not None:
+            title += "    正在求解..."
+        root.title(title)
 
-    def is_passed(self):  # 过关条件: 不存在空目的地 及 人在目的地的格子
-        return not np.any([self.cur_map == Destination, self.cur_map == WorkerInDest])
+    def is_passed(self):  # 过关条件: 不存在空目的地 及 人在目的地的格子, 即每个目的地上都有箱子
+        return self.state.is_solved()
 
 
 if __name__ == "__main__":
-    start_index = 1   # 自己设置要开始玩完的关卡
-    BoxGame(game_index=start_index).start_game()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Boxman game")
+    parser.add_argument("--level", type=int, default=1, help="level number starting from 1")
+    parser.add_argument("--replay", default=None, help="moves to replay, u/d/l/r walk, U/D/L/R push")
+    parser.add_argument("--delay", type=int, default=REPLAY_DELAY, help="milliseconds between replayed moves")
+    args = parser.parse_args()
+
+    game = BoxGame(game_index=args.level, replay_delay=args.delay)
+    game.start_game()
+    if args.replay:
+        game.replay(args.replay)
     root.mainloop()
@@ -0,0 +1,372 @@
+# coding:utf-8
+
+""" 推箱子自动求解 (不依赖 tkinter, 可在无界面环境中批量验证关卡)
+
+基本说明：
+    1. 以箱子的位置为搜索状态，A* 搜索推箱子的次数最少的解 (weight > 1 时为加权 A*, 更快, 解接近最优)
+    2. 搬运工人的位置规范化为其可到达区域中编号最小的格子，人在同一区域内走动不产生新状态
+       可到达区域以位掩码按箱子布局缓存: 推动后人所在的格子已在缓存的区域中时不再计算可到达区域，
+       展开状态时直接使用入队时算好的区域
+    3. 只生成 "推箱子" 的动作，人走到箱子旁边的路径在还原解时用广度优先搜索补全
+    4. 状态用 Zobrist 哈希(64位)标识，推一次箱子只需增量更新哈希值，置换表记录每个状态的最少推动次数
+    5. 解用标准的推箱子记法表示: u d l r 为人走动, U D L R 为推动箱子
+    6. 推动后箱子在死格子上，或形成冻结死锁的状态直接剪枝，见 deadlock.py
+
+    用法：
+        python solver.py            # 求解 game_maps.basic_maps 中的所有关卡
+        python solver.py --level 7  # 只求解第 7 关
+
+开发人员: Edwin.Zhang
+开发时间: 2019-6-28
+"""
+
+import time
+import random
+from heapq import heappush, heappop
+from collections import deque
+
+from game_maps import basic_maps
+from deadlock import DeadlockDetector
+
+# 与 play.py 中的定义相同: 0-墙，1-人，2-箱子，3-路，4-目的地, 5-人在目的地，6-箱子在目的地, -1-地图外
+Wall, Worker, Box, Passageway, Destination, WorkerInDest, BoxInDest = (0, 1, 2, 3, 4, 5, 6)
+
+# 方向: (行位移, 列位移, 走动记法, 推动记法), 与 play.py 中 DIRECTIONS 的方向名称一致
+MOVES = {
+    "Up": (-1, 0, "u", "U"),
+    "Down": (1, 0, "d", "D"),
+    "Left": (0, -1, "l", "L"),
+    "Right": (0, 1, "r", "R"),
+}
+OPPOSITE = {"Up": "Down", "Down": "Up", "Left": "Right", "Right": "Left"}
+
+
+class Level:
+    """ 关卡的静态信息: 墙，目的地，以及初始的箱子和人的位置，格子用一维编号 row * cols + col 表示 """
+
+    def __init__(self, game_map):
+        """
+            game_map : 二维列表，与 game_maps.basic_maps 中的格式相同
+        """
+        self.rows = len(game_map)
+        self.cols = len(game_map[0])
+        self.size = self.rows * self.cols
+        self.floor = [False] * self.size  # 可通行的格子(非墙，在地图内)
+        self.goals = set()
+        self.boxes = set()
+        self.worker = None
+        for i, row in enumerate(game_map):
+            for j, cell in enumerate(row):
+                pos = i * self.cols + j
+                self.floor[pos] = cell not in (Wall, -1)
+                if cell in (Destination, WorkerInDest, BoxInDest):
+                    self.goals.add(pos)
+                if cell in (Box, BoxInDest):
+                    self.boxes.add(pos)
+                if cell in (Worker, WorkerInDest):
+                    self.worker = pos
+        if self.worker is None:
+            raise ValueError("There is no worker in the map.")
+        if len(self.boxes) != len(self.goals):
+            raise ValueError("The map has %d boxes but %d destinations." % (len(self.boxes), len(self.goals)))
+
+        # 每个格子在 4 个方向上的相邻格子，出界为 None
+        self.neighbors = []
+        for pos in range(self.size):
+            row, col = divmod(pos, self.cols)
+            steps = {}
+            for name, (dr, dc, _, _) in MOVES.items():
+                r, c = row + dr, col + dc
+                steps[name] = r * self.cols + c if 0 <= r < self.rows and 0 <= c < self.cols else None
+            self.neighbors.append(steps)
+        # 每个格子相邻的可通行格子，计算可到达区域时使用
+        self.floor_neighbors = [[nxt for nxt in steps.values() if nxt is not None and self.floor[nxt]]
+                                for steps in self.neighbors]
+
+        self.push_distance = self.compute_push_distance()
+
+    def step(self, pos, direction):
+        """ pos 向 direction 方向的相邻格子，出界或为墙时返回 None """
+        nxt = self.neighbors[pos][direction]
+        return nxt if nxt is not None and self.floor[nxt] else None
+
+    def compute_push_distance(self):
+        """
+            每个格子上的箱子(不考虑其它箱子)推到最近目的地的最少次数，推不到目的地为 None
+            从目的地反向 "拉" 箱子做广度优先搜索: 箱子从 p 拉到 p - d, 需要人站在 p - 2d
+        """
+        distance = [None] * self.size
+        queue = deque()
+        for goal in self.goals:
+            distance[goal] = 0
+            queue.append(goal)
+        while queue:
+            pos = queue.popleft()
+            for direction in MOVES:
+                prev = self.step(pos, OPPOSITE[direction])                  # 推之前箱子的位置
+                stand = self.step(prev, OPPOSITE[direction]) if prev is not None else None  # 推之前人的位置
+                if stand is not None and distance[prev] is None:
+                    distance[prev] = distance[pos] + 1
+                    queue.append(prev)
+        return distance
+
+    def reachable(self, start, boxes):
+        """ 人从 start 出发，不推箱子能到达的所有格子 """
+        seen = {start}
+        stack = [start]
+        while stack:
+            pos = stack.pop()
+            for direction in MOVES:
+                nxt = self.step(pos, direction)
+                if nxt is not None and nxt not in seen and nxt not in boxes:
+                    seen.add(nxt)
+                    stack.append(nxt)
+        return seen
+
+    def reachable_mask(self, start, boxes):
+        """ 同 reachable(), 返回 (区域中编号最小的格子, 区域的位掩码)，第 i 位为 1 表示格子 i 可到达 """
+        floor_neighbors = self.floor_neighbors
+        mask = 1 << start
+        stack = [start]
+        while stack:
+            pos = stack.pop()
+            for nxt in floor_neighbors[pos]:
+                if not mask >> nxt & 1 and nxt not in boxes:
+                    mask |= 1 << nxt
+                    stack.append(nxt)
+        return (mask & -mask).bit_length() - 1, mask
+
+    def walk_path(self, start, target, boxes):
+        """ 人从 start 走到 target 的最短路径(走动记法字符串)，不能到达时返回 None """
+        if start == target:
+            return ""
+        came_from = {start: None}
+        queue = deque([start])
+        while queue:
+            pos = queue.popleft()
+            for direction, (_, _, walk, _) in MOVES.items():
+                nxt = self.step(pos, direction)
+                if nxt is None or nxt in boxes or nxt in came_from:
+                    continue
+                came_from[nxt] = (pos, walk)
+                if nxt == target:
+                    path = []
+                    while came_from[nxt] is not None:
+                        nxt, walk = came_from[nxt]
+                        path.append(walk)
+                    return "".join(reversed(path))
+                queue.append(nxt)
+        return None
+
+
+class Solution:
+    """ 求解结果: pushes 为推动序列 [(箱子行, 箱子列, 方向), ...], moves 为完整的走动/推动记法字符串 """
+
+    def __init__(self, solved, pushes, moves, stats):
+        self.solved = solved
+        self.pushes = pushes
+        self.moves = moves
+        self.stats = stats
+
+    def __repr__(self):
+        if not self.solved:
+            return "Solution(unsolved, %d nodes)" % self.stats["expanded"]
+        return "Solution(%d pushes, %d moves)" % (len(self.pushes), len(self.moves))
+
+
+class Solver:
+    """ 推箱子求解器, 见模块说明 """
+
+    def __init__(self, game_map, weight=1.0, max_nodes=2000000, time_limit=None, track_memory=False, seed=2019):
+        """
+            game_map     : 二维列表，与 game_maps.basic_maps 中的格式相同
+            weight       : 启发值的权重，1.0 为 A* (推动次数最优)，大于 1 时搜索更快，解接近最优
+            max_nodes    : 最多展开的状态数，超过后放弃
+            time_limit   : 最长搜索时间(秒)，None 为不限制
+            track_memory : 用 tracemalloc 统计搜索过程的内存峰值(会使搜索变慢)
+            seed         : Zobrist 随机数的种子
+        """
+        self.level = Level(game_map)
+        self.deadlock = DeadlockDetector(game_map)
+        self.weight = weight
+        self.max_nodes = max_nodes
+        self.time_limit = time_limit
+        self.track_memory = track_memory
+
+        rnd = random.Random(seed)
+        self.zobrist_box = [rnd.getrandbits(64) for _ in range(self.level.size)]
+        self.zobrist_worker = [rnd.getrandbits(64) for _ in range(self.level.size)]
+
+    def heuristic(self, boxes):
+        """ 每个箱子推到最近目的地的次数之和(可采纳的下界)，有箱子推不到任何目的地时返回 None """
+        total = 0
+        for box in boxes:
+            distance = self.level.push_distance[box]
+            if distance is None:
+                return None
+            total += distance
+        return total
+
+    def is_dead_push(self, boxes, box):
+        """ 推动后立即可判定无解的情况(死格子，冻结死锁)，box 为推动后的箱子位置 """
+        return self.deadlock.is_dead_push(boxes, box)
+
+    def normalize(self, worker, boxes, box_key=None, regions=None):
+        """
+            返回 (规范化的人的位置, 人可到达区域的位掩码)
+            regions 为 {箱子布局的哈希 box_key: [(规范化的位置, 位掩码), ...]} 缓存，
+            人所在格子已在同一箱子布局的某个区域中时直接返回该区域，不做泛洪填充
+        """
+        if regions is None:
+            return self.level.reachable_mask(worker, boxes)
+        known = regions.setdefault(box_key, [])
+        for region in known:
+            if region[1] >> worker & 1:
+                return region
+        region = self.level.reachable_mask(worker, boxes)
+        known.append(region)
+        return region
+
+    def solve(self):
+        """
+            搜索推箱子的解
+            返回 Solution, 其 stats 中包含: 展开 / 生成的状态数，置换表大小，耗时，每秒展开的状态数，内存峰值
+        """
+        if self.track_memory:
+            import tracemalloc
+            tracemalloc.start()
+        start_time = time.perf_counter()
+
+        level = self.level
+        boxes = frozenset(level.boxes)
+        box_key = 0
+        for box in boxes:
+            box_key ^= self.zobrist_box[box]
+        regions = {}                  # 可到达区域的缓存，见 normalize()
+        worker, region = self.normalize(level.worker, boxes, box_key, regions)
+        key = box_key ^ self.zobrist_worker[worker]
+
+        h = self.heuristic(boxes)
+        best_cost = {key: 0}          # 置换表: Zobrist 哈希 -> 到达该状态的最少推动次数
+        came_from = {key: None}       # 还原解: 哈希 -> (上一状态的哈希, 推动前箱子的位置, 方向)
+        open_list = []
+        counter = 0                   # 相同 f 值时先展开后加入的状态(深度优先倾向)
+        if h is not None:
+            heappush(open_list, (self.weight * h, 0, counter, key, box_key, worker, region, boxes))
+
+        expanded, generated, peak_open = 0, 1, 1
+        solved_key = None
+        status = "unsolvable"
+        while open_list:
+            _, cost, _, key, box_key, worker, region, boxes = heappop(open_list)
+            if cost > best_cost.get(key, cost):
+                continue  # 已找到到达该状态的更短路径
+            if boxes == level.goals:
+                solved_key = key
+                status = "solved"
+                break
+            expanded += 1
+            if expanded > self.max_nodes:
+                status = "node limit"
+                break
+            if self.time_limit is not None and expanded % 1000 == 0 and \
+                    time.perf_counter() - start_time > self.time_limit:
+                status = "time limit"
+                break
+
+            # 可到达区域在入队时已算好，每个状态只计算一次
+            for box in boxes:
+                for direction in MOVES:
+                    target = level.step(box, direction)
+                    stand = level.step(box, OPPOSITE[direction])
+                    if target is None or target in boxes or stand is None or not region >> stand & 1:
+                        continue
+                    new_boxes = boxes - {box} | {target}
+                    if self.is_dead_push(new_boxes, target):
+                        continue
+                    new_box_key = box_key ^ self.zobrist_box[box] ^ self.zobrist_box[target]
+                    new_worker, new_region = self.normalize(box, new_boxes, new_box_key, regions)
+                    new_key = new_box_key ^ self.zobrist_worker[new_worker]
+                    new_cost = cost + 1
+                    if new_cost >= best_cost.get(new_key, new_cost + 1):
+                        continue
+                    h = self.heuristic(new_boxes)
+                    if h is None:
+                        continue
+                    best_cost[new_key] = new_cost
+                    came_from[new_key] = (key, box, direction)
+                    counter -= 1
+                    heappush(open_list, (new_cost + self.weight * h, new_cost, counter, new_key, new_box_key,
+                                         new_worker, new_region, new_boxes))
+                    generated += 1
+            peak_open = max(peak_open, len(open_list))
+
+        elapsed = time.perf_counter() - start_time
+        stats = {
+            "status": status,
+            "expanded": expanded,
+            "generated": generated,
+            "transpositions": len(best_cost),
+            "peak_open": peak_open,
+            "elapsed": elapsed,
+            "nodes_per_sec": expanded / elapsed if elapsed > 0 else None,
+            "peak_memory": None,
+        }
+        if self.track_memory:
+            import tracemalloc
+            stats["peak_memory"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        if solved_key is None:
+            return Solution(False, None, None, stats)
+        pushes = []
+        while came_from[solved_key] is not None:
+            solved_key, box, direction = came_from[solved_key]
+            pushes.append((box, direction))
+        pushes.reverse()
+        return Solution(True, [(box // level.cols, box % level.cols, direction) for box, direction in pushes],
+                        self.push_moves(pushes), stats)
+
+    def push_moves(self, pushes):
+        """ 将推动序列展开为完整的走动/推动记法字符串 """
+        level = self.level
+        worker = level.worker
+        boxes = set(level.boxes)
+        moves = []
+        for box, direction in pushes:
+            moves.append(level.walk_path(worker, level.step(box, OPPOSITE[direction]), boxes))
+            moves.append(MOVES[direction][3])
+            boxes.remove(box)
+            boxes.add(level.step(box, direction))
+            worker = box
+        return "".join(moves)
+
+
+def solve(game_map, **kwargs):
+    """ 求解一个关卡，参数见 Solver """
+    return Solver(game_map, **kwargs).solve()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Boxman (Sokoban) solver")
+    parser.add_argument("--level", type=int, default=None, help="level number starting from 1, default all levels")
+    parser.add_argument("--weight", type=float, default=1.0, help="heuristic weight, 1.0 for optimal pushes")
+    parser.add_argument("--max-nodes", type=int, default=2000000)
+    parser.add_argument("--memory", action="store_true", help="track peak memory with tracemalloc")
+    args = parser.parse_args()
+
+    levels = [args.level] if args.level else range(1, len(basic_maps) + 1)
+    for index in levels:
+        result = solve(basic_maps[index - 1], weight=args.weight, max_nodes=args.max_nodes,
+                       track_memory=args.memory)
+        stats = result.stats
+        line = "Level %2d : %-10s pushes=%-4s expanded=%-8d %8.0f nodes/sec %8.3f s" % (
+            index, stats["status"], len(result.pushes) if result.solved else "-", stats["expanded"],
+            stats["nodes_per_sec"] or 0, stats["elapsed"])
+        if stats["peak_memory"] is not None:
+            line += "  peak memory=%.1f KB" % (stats["peak_memory"] / 1024.0)
+        print(line)
+        if result.solved:
+            print("          " + result.moves)
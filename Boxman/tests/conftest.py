@@ -0,0 +1,7 @@
+# coding:utf-8
+
+# 模块之间按顶层模块互相引用 (from deadlock import DeadlockDetector), 测试时把项目目录加入搜索路径
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
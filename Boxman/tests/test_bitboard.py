@@ -0,0 +1,80 @@
+# coding:utf-8
+
+""" BitboardState 的测试: 与二维列表的相互转换，step / undo / redo，重放求解器的走法 """
+
+import random
+
+import pytest
+
+from game_maps import basic_maps
+from bitboard import BitboardState
+from solver import solve
+
+LEVELS = range(len(basic_maps))
+DIRECTIONS = ("Up", "Down", "Left", "Right")
+
+
+def as_lists(game_map):
+    return [[int(cell) for cell in row] for row in game_map]
+
+
+@pytest.mark.parametrize("index", LEVELS)
+def test_map_round_trip(index):
+    game_map = as_lists(basic_maps[index])
+    state = BitboardState.from_map(game_map)
+    assert state.to_map() == game_map
+    assert BitboardState.from_map(state.to_map()).key() == state.key()
+
+
+@pytest.mark.parametrize("index", LEVELS)
+def test_undo_redo_restore_state(index):
+    state = BitboardState.from_map(basic_maps[index])
+    rnd = random.Random(index)
+    history = [state.key()]
+    deltas = []
+    for _ in range(200):
+        delta = state.step(rnd.choice(DIRECTIONS))
+        if delta is not None:
+            deltas.append(delta)
+            history.append(state.key())
+
+    # 逐步后退，每一步都回到之前的局面; 再逐步前进，回到最后的局面
+    for delta, key in zip(reversed(deltas), reversed(history[:-1])):
+        state.undo(delta)
+        assert state.key() == key
+    assert state.to_map() == as_lists(basic_maps[index])
+    for delta, key in zip(deltas, history[1:]):
+        state.redo(delta)
+        assert state.key() == key
+
+
+def test_blocked_step_returns_none():
+    state = BitboardState.from_map([
+        [0, 0, 0, 0],
+        [0, 1, 2, 0],
+        [0, 0, 0, 0],
+    ])
+    before = state.key()
+    assert state.step("Up") is None
+    assert state.step("Right") is None    # 箱子前方是墙
+    assert state.key() == before
+
+
+@pytest.mark.parametrize("index", LEVELS)
+def test_replay_solver_moves(index):
+    solution = solve(basic_maps[index])
+    assert solution.solved
+    state = BitboardState.from_map(basic_maps[index])
+    assert state.replay(solution.moves) == len(solution.moves)
+    assert state.is_solved()
+    assert sorted(state.box_positions()) == sorted(state.position(i) for i in range(state.goals.bit_length())
+                                                   if state.goals >> i & 1)
+
+
+def test_replay_stops_at_wrong_letter():
+    state = BitboardState.from_map(basic_maps[0])
+    moves = solve(basic_maps[0]).moves
+    push = moves.index(next(letter for letter in moves if letter.isupper()))
+    # 推动写成走动时停在这一步之前
+    wrong = moves[:push] + moves[push].lower() + moves[push + 1:]
+    assert state.replay(wrong) == push
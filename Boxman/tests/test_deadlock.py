@@ -0,0 +1,123 @@
+# coding:utf-8
+
+""" DeadlockDetector 的测试: 手工构造的小地图上的死格子和冻结死锁，以及所有关卡的初始局面 """
+
+import pytest
+
+from game_maps import basic_maps
+from deadlock import DeadlockDetector
+
+# 0-墙，1-人，2-箱子，3-路，4-目的地
+# 四个角落 (1,1) (1,4) (3,1) (3,4); 上边一行和左右两列是沿墙的死直线, 下边一行有目的地，不是死直线
+OPEN_ROOM = [
+    [0, 0, 0, 0, 0, 0],
+    [0, 3, 3, 3, 3, 0],
+    [0, 3, 1, 2, 3, 0],
+    [0, 3, 3, 4, 3, 0],
+    [0, 0, 0, 0, 0, 0],
+]
+
+# 上边一行两端是目的地，不是角落，也没有死直线; 两个箱子并排贴着墙时互相冻结
+GOALS_AT_ENDS = [
+    [0, 0, 0, 0, 0, 0],
+    [0, 4, 3, 3, 4, 0],
+    [0, 3, 3, 3, 3, 0],
+    [0, 3, 1, 2, 2, 0],
+    [0, 0, 0, 0, 0, 0],
+]
+
+# 目的地就在贴墙并排的两个格子上，箱子被冻结在目的地上不算死锁
+GOALS_IN_ROW = [
+    [0, 0, 0, 0, 0, 0],
+    [0, 3, 4, 4, 3, 0],
+    [0, 3, 3, 3, 3, 0],
+    [0, 3, 1, 2, 2, 0],
+    [0, 0, 0, 0, 0, 0],
+]
+
+
+def pos(game_map, row, col):
+    return row * len(game_map[0]) + col
+
+
+def initial_boxes(game_map):
+    return [pos(game_map, i, j) for i, row in enumerate(game_map) for j, cell in enumerate(row) if cell in (2, 6)]
+
+
+@pytest.mark.parametrize("cell", [(1, 1), (1, 4), (3, 1), (3, 4)])
+def test_corner_is_dead(cell):
+    detector = DeadlockDetector(OPEN_ROOM)
+    box = pos(OPEN_ROOM, *cell)
+    assert box in detector.corner_squares
+    assert detector.is_dead_push({box}, box)
+
+
+def test_goal_is_never_dead():
+    detector = DeadlockDetector(GOALS_AT_ENDS)
+    for goal in detector.goals:
+        assert goal not in detector.corner_squares
+        assert not detector.is_dead_square(goal)
+
+
+@pytest.mark.parametrize("cell", [(1, 2), (1, 3), (2, 1), (2, 4)])
+def test_wall_line_is_dead(cell):
+    detector = DeadlockDetector(OPEN_ROOM)
+    box = pos(OPEN_ROOM, *cell)
+    assert box in detector.line_squares
+    assert detector.is_dead_push({box}, box)
+
+
+def test_wall_line_with_goal_is_not_dead():
+    detector = DeadlockDetector(OPEN_ROOM)
+    assert pos(OPEN_ROOM, 3, 2) not in detector.line_squares
+    assert not detector.is_dead_square(pos(OPEN_ROOM, 3, 2))
+
+
+@pytest.mark.parametrize("cell", [(2, 2), (2, 3)])
+def test_open_floor_is_not_dead(cell):
+    detector = DeadlockDetector(OPEN_ROOM)
+    box = pos(OPEN_ROOM, *cell)
+    assert not detector.is_dead_square(box)
+    assert not detector.is_dead_push({box}, box)
+
+
+def test_frozen_pair_against_wall():
+    detector = DeadlockDetector(GOALS_AT_ENDS)
+    left, right = pos(GOALS_AT_ENDS, 1, 2), pos(GOALS_AT_ENDS, 1, 3)
+    assert not detector.is_dead_square(left) and not detector.is_dead_square(right)
+    boxes = {left, right}
+    assert detector.is_freeze_deadlock(boxes, right)
+    assert detector.is_dead_push(boxes, right)
+    assert detector.deadlocked_boxes(boxes) == boxes
+
+
+def test_pair_apart_is_not_frozen():
+    detector = DeadlockDetector(GOALS_AT_ENDS)
+    boxes = {pos(GOALS_AT_ENDS, 1, 2), pos(GOALS_AT_ENDS, 2, 3)}
+    for box in boxes:
+        assert not detector.is_dead_push(boxes, box)
+    assert detector.deadlocked_boxes(boxes) == set()
+
+
+def test_frozen_pair_on_goals_is_not_deadlock():
+    detector = DeadlockDetector(GOALS_IN_ROW)
+    boxes = {pos(GOALS_IN_ROW, 1, 2), pos(GOALS_IN_ROW, 1, 3)}
+    frozen = []
+    assert detector.is_frozen(pos(GOALS_IN_ROW, 1, 3), boxes, [], frozen)
+    assert set(frozen) == boxes
+    assert not detector.is_freeze_deadlock(boxes, pos(GOALS_IN_ROW, 1, 3))
+    assert detector.deadlocked_boxes(boxes) == set()
+
+
+def test_frozen_pair_with_one_box_off_goal():
+    # 一个箱子在目的地上，另一个不在，仍然是死锁
+    detector = DeadlockDetector(GOALS_IN_ROW)
+    boxes = {pos(GOALS_IN_ROW, 1, 3), pos(GOALS_IN_ROW, 1, 4)}
+    assert detector.is_freeze_deadlock(boxes, pos(GOALS_IN_ROW, 1, 4))
+
+
+@pytest.mark.parametrize("index", range(len(basic_maps)))
+def test_levels_do_not_start_deadlocked(index):
+    game_map = basic_maps[index]
+    detector = DeadlockDetector(game_map)
+    assert detector.deadlocked_boxes(initial_boxes(game_map)) == set()
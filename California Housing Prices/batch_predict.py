@@ -0,0 +1,234 @@
+# -*- coding:utf-8 -*-
+
+# ******************************************************************************
+# 模块说明 ：大文件批量预测
+#            BatchPredictor() - 分块读取待预测的 CSV 文件，用登记的处理流程转换，在进程池中并行预测，
+#                               预测结果按原顺序逐块追加写入 CSV 或 Parquet 文件，
+#                               内存占用只与块大小和同时处理的块数有关，与文件大小无关
+#
+#            运行: python batch_predict.py parcels.csv predictions.csv --chunksize 100000 --workers 4
+#                  (--model 缺省为评分最好的登记模型; 输出文件名以 .parquet 结尾时写入 Parquet, 需要 pyarrow)
+#
+# 开发人员 ：Edwin.Zhang
+# 开发时间 : 2018-5-18
+# ******************************************************************************
+
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+
+import prepare_data as myprepare
+from model_registry import ModelRegistry
+from predictor import Predictor
+
+
+def myprint(message):
+    """
+    说明：一个小函数，为了缩减文件，使重点突出，没有加共用函数库，冗余了这段代码
+    """
+    import time
+    print(time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time())) + " : " + message)
+
+
+# 每个工作进程中常驻的预测器，由 init_worker() 装载一次
+_worker_predictor = None
+
+
+def init_worker(entry, registry_path, use_compact):
+    """
+    说明：
+        工作进程的初始化函数，装载模型及处理流程，之后该进程处理的所有数据块都使用它
+        紧凑格式模型以内存映射方式打开，所有工作进程共享同一份物理内存
+    """
+    global _worker_predictor
+    _worker_predictor = Predictor(registry=ModelRegistry(registry_path), use_compact=use_compact, entry=entry)
+
+
+def predict_chunk(chunk, keep_columns=None, predictor=None):
+    """
+    说明：
+        转换并预测一个数据块
+    输入：
+        chunk:(pandas.DataFrame) - 待预测的数据块，可以含标签列
+        keep_columns:(list) - 需要原样写入结果文件的列，如地块编号
+        predictor:(Predictor) - 缺省为工作进程中装载的预测器
+    输出:
+        result:(pandas.DataFrame) - keep_columns 列及预测值列
+    """
+    predictor = predictor if predictor is not None else _worker_predictor
+    # 工作进程内不再开线程，并行度由进程池控制
+    preparer = myprepare.PrepareData(chunk, n_jobs=1)
+    preparer.full_pipeline = predictor.full_pipeline
+    prepared = preparer.transform_data()
+
+    result = pd.DataFrame(index=chunk.index)
+    for name in keep_columns or []:
+        result[name] = chunk[name].values
+    result[BatchPredictor.PREDICTION_COLUMN] = predictor.model.predict(prepared)
+    return result
+
+
+class ResultWriter:
+    """
+    说明:
+        逐块追加写入预测结果，文件名以 .parquet 结尾时写入 Parquet (需要 pyarrow)，否则写入 CSV
+    """
+    def __init__(self, filename, append=False):
+        self.filename = filename
+        self.is_parquet = filename.lower().endswith(".parquet")
+        if append and self.is_parquet:
+            raise ValueError("Parquet output can not be appended, please use a new file.")
+        self.append = append
+        # 非追加模式先写临时文件，全部完成后再改名，避免中断后留下不完整的结果文件
+        self.tmpname = filename if append else filename + ".tmp"
+        self.header = not (append and os.path.exists(filename) and os.path.getsize(filename) > 0)
+        self.file = None
+        self.parquet_writer = None
+
+    def write(self, result):
+        if self.is_parquet:
+            import pyarrow
+            import pyarrow.parquet
+            table = pyarrow.Table.from_pandas(result, preserve_index=False)
+            if self.parquet_writer is None:
+                self.parquet_writer = pyarrow.parquet.ParquetWriter(self.tmpname, table.schema)
+            self.parquet_writer.write_table(table)
+        else:
+            if self.file is None:
+                self.file = open(self.tmpname, "a" if self.append else "w", newline="")
+            result.to_csv(self.file, header=self.header, index=False, sep=',')
+            self.header = False
+
+    def close(self, discard=False):
+        """
+        说明：
+            关闭文件，非追加模式下将临时文件改名为结果文件; discard 为 True 时(处理中断)删除临时文件
+        """
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+        if self.file is not None:
+            self.file.close()
+        if not self.append and os.path.exists(self.tmpname):
+            if discard:
+                os.remove(self.tmpname)
+            else:
+                os.replace(self.tmpname, self.filename)
+
+
+class BatchPredictor:
+    """
+    说明:
+        1. 主进程分块读取 CSV 文件，提交给进程池，同时处理的块数不超过 max_in_flight, 内存占用有上界
+        2. 工作进程启动时装载一次模型(init_worker)，之后只接收数据块，不再传递模型
+        3. 按提交顺序取回结果并写入文件，结果文件的行顺序与输入文件一致
+    """
+    PREDICTION_COLUMN = "predicted_median_house_value"
+
+    def __init__(self, modelname=None, registry=None, chunksize=100000, n_workers=None, max_in_flight=None,
+                 keep_columns=None, use_compact=True, log_interval=10.0):
+        """
+        输入：
+            modelname:(string) - 登记的模型名称，使用其最新版本; 为 None 时使用评分最好的登记模型
+            registry:(ModelRegistry) - 模型版本管理，缺省为 trainmodels 目录
+            chunksize:(int) - 每个数据块的行数
+            n_workers:(int) - 工作进程数，缺省为 CPU 核数; 1 时在主进程中预测，不启动进程池
+            max_in_flight:(int) - 同时处理(已读取未写出)的最大块数，缺省为 2 * n_workers
+            keep_columns:(list) - 需要原样写入结果文件的列
+            use_compact:(bool) - 登记的模型已导出紧凑格式时，使用紧凑格式预测
+            log_interval:(float) - 两次显示处理速度之间的最小间隔秒数
+        """
+        self.registry = registry if registry is not None else ModelRegistry()
+        self.entry = self.registry.best_entry() if modelname is None else self.registry.latest_entry(modelname)
+        if self.entry is None:
+            raise ValueError("There is no registered model in folder '%s', please train models first." %
+                             self.registry.path)
+        self.chunksize = chunksize
+        self.n_workers = n_workers if n_workers is not None else (os.cpu_count() or 1)
+        self.max_in_flight = max_in_flight if max_in_flight is not None else 2 * self.n_workers
+        self.keep_columns = keep_columns
+        self.use_compact = use_compact
+        self.log_interval = log_interval
+
+        self.rows = 0
+        self.chunks = 0
+        self.start_time = None
+        self.last_log_time = None
+
+    def log_progress(self, force=False):
+        now = time.time()
+        if not force and now - self.last_log_time < self.log_interval:
+            return
+        self.last_log_time = now
+        elapsed = max(now - self.start_time, 1e-9)
+        myprint("Predicted %d chunks, %d rows, %.0f rows/sec" % (self.chunks, self.rows, self.rows / elapsed))
+
+    def write_result(self, writer, result):
+        writer.write(result)
+        self.rows += len(result)
+        self.chunks += 1
+        self.log_progress()
+
+    def predict_file(self, input_filename, output_filename, append=False):
+        """
+        说明：
+            预测整个 CSV 文件，结果写入 output_filename
+        输入：
+            input_filename:(string) - 待预测的 CSV 文件，列与训练数据集相同，可以不含标签列
+            output_filename:(string) - 结果文件，.csv 或 .parquet
+            append:(bool) - 追加到已有的结果文件(只支持 CSV)
+        输出:
+            summary:(dict) - 行数，块数，耗时，处理速度
+        """
+        myprint("Batch predict %s with model %s v%d ..." % (input_filename, self.entry["name"],
+                                                              self.entry["version"]))
+        self.rows, self.chunks = 0, 0
+        self.start_time = self.last_log_time = time.time()
+        reader = pd.read_csv(input_filename, chunksize=self.chunksize)
+        writer = ResultWriter(output_filename, append)
+        try:
+            if self.n_workers == 1:
+                predictor = Predictor(registry=self.registry, use_compact=self.use_compact, entry=self.entry)
+                for chunk in reader:
+                    self.write_result(writer, predict_chunk(chunk, self.keep_columns, predictor))
+            else:
+                with ProcessPoolExecutor(self.n_workers, initializer=init_worker,
+                                         initargs=(self.entry, self.registry.path, self.use_compact)) as executor:
+                    in_flight = deque()
+                    for chunk in reader:
+                        if len(in_flight) >= self.max_in_flight:
+                            self.write_result(writer, in_flight.popleft().result())
+                        in_flight.append(executor.submit(predict_chunk, chunk, self.keep_columns))
+                    while in_flight:
+                        self.write_result(writer, in_flight.popleft().result())
+        except BaseException:
+            writer.close(discard=True)
+            raise
+        writer.close()
+
+        elapsed = time.time() - self.start_time
+        self.log_progress(force=True)
+        myprint("Predictions are saved to " + output_filename)
+        return {"rows": self.rows, "chunks": self.chunks, "elapsed": elapsed,
+                "rows_per_sec": self.rows / elapsed if elapsed > 0 else None,
+                "model": self.entry["name"], "version": self.entry["version"]}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="California housing batch prediction")
+    parser.add_argument("input", help="input CSV file")
+    parser.add_argument("output", help="output .csv or .parquet file")
+    parser.add_argument("--model", default=None, help="registered model name, default is the best scored model")
+    parser.add_argument("--chunksize", type=int, default=100000)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, default is CPU count")
+    parser.add_argument("--max-in-flight", type=int, default=None, help="chunks in progress, default 2 * workers")
+    parser.add_argument("--keep-columns", default=None, help="comma separated input columns copied to output")
+    parser.add_argument("--append", action="store_true", help="append to an existing CSV output file")
+    args = parser.parse_args()
+
+    BatchPredictor(args.model, chunksize=args.chunksize, n_workers=args.workers, max_in_flight=args.max_in_flight,
+                   keep_columns=args.keep_columns.split(",") if args.keep_columns else None).predict_file(
+        args.input, args.output, append=args.append)
@@ -0,0 +1,224 @@
+# -*- coding:utf-8 -*-
+
+# ******************************************************************************
+# 模块说明 ：California Housing 流程的性能基准测试
+#            按不同的数据规模(缺省 2万, 20万, 200万行)合成与 housing.csv 列相同的数据集，
+#            分别测试 DataLoader 装载，PrepareData.prepare_data，
+#            以及 linear / decisiontree / randomforest 三种模型的训练和批量预测耗时，
+#            训练很慢的模型超过 MODEL_MAX_ROWS 的规模时跳过(缺省 100 棵树的随机森林只测到 20万行)，
+#            结果保存为 JSON 文件，便于比较不同版本之间的性能变化
+#
+#            运行: python benchmark.py --scales 20000,200000 --output benchmark_results.json
+#
+# 开发人员 ：Edwin.Zhang
+# 开发时间 : 2018-5-18
+# ******************************************************************************
+
+import os
+import json
+import time
+import shutil
+import platform
+import tempfile
+import numpy as np
+import pandas as pd
+
+import load_data as myload
+import prepare_data as myprepare
+from main import get_default_model
+from profiler import PipelineProfiler
+
+
+def myprint(message):
+    """
+    说明：一个小函数，为了缩减文件，使重点突出，没有加共用函数库，冗余了这段代码
+    """
+    import time
+    print(time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time())) + " : " + message)
+
+
+DEFAULT_SCALES = [20000, 200000, 2000000]
+MODEL_TYPES = ["linear", "decisiontree", "randomforest"]
+# 各模型参与测试的最大行数，超过时跳过该模型的训练和预测; 未列出的模型不限制
+# 缺省参数的随机森林在 2万行上训练约需 30 秒，耗时随行数线性以上增长
+MODEL_MAX_ROWS = {"randomforest": 200000}
+OCEAN_PROXIMITY = ["<1H OCEAN", "INLAND", "NEAR OCEAN", "NEAR BAY", "ISLAND"]
+OCEAN_PROXIMITY_P = [0.443, 0.317, 0.129, 0.1108, 0.0002]
+
+
+def synthesize_housing(n_rows, seed=42):
+    """
+    说明：
+        合成与 housing.csv 列名，类型，取值范围相近的数据集，含约 1% 的 total_bedrooms 缺失值
+    输入：
+        n_rows:(int) - 行数
+        seed:(int) - 随机种子，相同的参数得到相同的数据
+    输出:
+        data:(pandas.DataFrame)
+    """
+    rs = np.random.RandomState(seed)
+    households = np.maximum(1, np.round(rs.lognormal(6.0, 0.7, n_rows)))
+    total_rooms = np.maximum(2, np.round(households * rs.normal(5.3, 1.5, n_rows).clip(1.5, 20)))
+    total_bedrooms = np.round(total_rooms * rs.normal(0.21, 0.05, n_rows).clip(0.05, 0.6))
+    total_bedrooms[rs.rand(n_rows) < 0.01] = np.nan
+    population = np.maximum(3, np.round(households * rs.normal(3.0, 1.0, n_rows).clip(0.7, 12)))
+    median_income = rs.lognormal(1.27, 0.47, n_rows).clip(0.5, 15.0001).round(4)
+    longitude = rs.uniform(-124.35, -114.31, n_rows).round(2)
+    latitude = rs.uniform(32.54, 41.95, n_rows).round(2)
+    housing_median_age = rs.randint(1, 53, n_rows).astype(np.float64)
+    ocean_proximity = rs.choice(OCEAN_PROXIMITY, n_rows, p=OCEAN_PROXIMITY_P)
+
+    value = 40000.0 * median_income + 1000.0 * housing_median_age - 5000.0 * (latitude - 32.5)
+    value += np.where(ocean_proximity == "INLAND", -60000.0, 20000.0) + rs.normal(0, 40000.0, n_rows)
+    median_house_value = value.clip(14999, 500001).round()
+
+    return pd.DataFrame({
+        "longitude": longitude,
+        "latitude": latitude,
+        "housing_median_age": housing_median_age,
+        "total_rooms": total_rooms,
+        "total_bedrooms": total_bedrooms,
+        "population": population,
+        "households": households,
+        "median_income": median_income,
+        "median_house_value": median_house_value,
+        "ocean_proximity": ocean_proximity,
+    })
+
+
+def write_housing_csv(filename, n_rows, chunksize=1000000, seed=42):
+    """
+    说明：
+        分块合成并写入 CSV 文件，内存占用只与 chunksize 有关
+    """
+    with open(filename, "w", newline="") as f:
+        for i, start in enumerate(range(0, n_rows, chunksize)):
+            chunk = synthesize_housing(min(chunksize, n_rows - start), seed + i)
+            chunk.to_csv(f, header=(i == 0), index=False)
+
+
+class BenchmarkLoader(myload.DataLoader):
+    """
+    说明:
+        数据文件放在基准测试的临时目录中的 DataLoader
+    """
+    def __init__(self, workdir, use_cache=True):
+        super(BenchmarkLoader, self).__init__(use_cache=use_cache)
+        self.FILENAME_ALL_SET = os.path.join(workdir, "housing.csv")
+        if use_cache:
+            self.cache = myload.DataCache(os.path.join(workdir, "cache"))
+
+
+def run_scale(n_rows, workdir, model_types=MODEL_TYPES, predict_rows=100000, model_max_rows=MODEL_MAX_ROWS):
+    """
+    说明：
+        在一种数据规模上运行所有测试项目
+    输入：
+        n_rows:(int) - 数据行数
+        workdir:(string) - 临时目录
+        model_types:(list) - 参与测试的模型类型，见 main.get_default_model()
+        predict_rows:(int) - 批量预测测试的行数
+        model_max_rows:(dict) - 模型类型 -> 参与测试的最大行数，见 MODEL_MAX_ROWS
+    输出:
+        stages:(list of dict) - 每个测试项目的性能记录
+    """
+    profiler = PipelineProfiler()
+
+    with profiler.stage("synthesize_csv", rows=n_rows):
+        write_housing_csv(os.path.join(workdir, "housing.csv"), n_rows)
+
+    # load_csv: 不使用缓存，解析 CSV; write_cache: 计算源文件哈希并写入缓存，使用上一步解析的结果，不再解析一次;
+    # load_warm_cache: 直接从缓存装载
+    with profiler.stage("load_csv", rows=n_rows):
+        data = BenchmarkLoader(workdir, use_cache=False).load_all_set()
+    with profiler.stage("write_cache", rows=n_rows):
+        loader = BenchmarkLoader(workdir)
+        loader.parse_csv = lambda filename: data
+        loader.load_all_set()
+    with profiler.stage("load_warm_cache", rows=n_rows):
+        data = BenchmarkLoader(workdir).load_all_set()
+
+    with profiler.stage("prepare_data", rows=n_rows):
+        preparer = myprepare.PrepareData(data)
+        train_prepared = preparer.prepare_data()
+    train_label = np.asarray(preparer.train_label)
+    del data, preparer
+
+    predict_set = train_prepared[:predict_rows]
+    for model_type in model_types:
+        if n_rows > model_max_rows.get(model_type, n_rows):
+            myprint("Skip %s on %d rows, more than %d rows" % (model_type, n_rows, model_max_rows[model_type]))
+            continue
+        model = get_default_model(model_type)
+        with profiler.stage("train_" + model_type, rows=n_rows):
+            model.fit(train_prepared, train_label)
+        with profiler.stage("predict_" + model_type, rows=len(predict_set)):
+            model.predict(predict_set)
+        del model
+
+    for record in profiler.stages:
+        record["n_rows"] = n_rows
+    return profiler.stages
+
+
+def environment_info():
+    import sklearn
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+        "time": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time())),
+    }
+
+
+def run_benchmark(scales=DEFAULT_SCALES, output="benchmark_results.json", model_types=MODEL_TYPES,
+                  predict_rows=100000, workdir=None, model_max_rows=MODEL_MAX_ROWS):
+    """
+    说明：
+        运行所有数据规模的基准测试，并保存结果
+    输入：
+        scales:(list of int) - 数据规模(行数)
+        output:(string) - 结果文件名(JSON)
+        workdir:(string) - 临时文件目录，缺省为系统临时目录，测试完成后删除
+        model_max_rows:(dict) - 模型类型 -> 参与测试的最大行数，见 MODEL_MAX_ROWS
+    输出:
+        results:(dict)
+    """
+    results = {"environment": environment_info(), "scales": scales, "model_max_rows": model_max_rows, "results": []}
+    for n_rows in scales:
+        scale_dir = tempfile.mkdtemp(prefix="housing_bench_%d_" % n_rows, dir=workdir)
+        try:
+            myprint("Benchmark %d rows ..." % n_rows)
+            stages = run_scale(n_rows, scale_dir, model_types, predict_rows, model_max_rows)
+            results["results"].extend(stages)
+            for record in stages:
+                myprint("%12d rows : %-24s %10.3f s" % (n_rows, record["stage"], record["wall_time"]))
+        finally:
+            shutil.rmtree(scale_dir, ignore_errors=True)
+
+        # 每完成一种规模就保存一次，大规模测试中断时也能保留已完成的结果
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2, default=float)
+    myprint("Benchmark results are saved to " + output)
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="California housing pipeline benchmark")
+    parser.add_argument("--scales", default=",".join(str(s) for s in DEFAULT_SCALES),
+                        help="comma separated row counts, default %(default)s")
+    parser.add_argument("--models", default=",".join(MODEL_TYPES), help="comma separated model types")
+    parser.add_argument("--predict-rows", type=int, default=100000, help="rows for batch predict timing")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--workdir", default=None, help="folder for temporary data files")
+    parser.add_argument("--no-model-limit", action="store_true",
+                        help="train every model at every scale, ignoring MODEL_MAX_ROWS")
+    args = parser.parse_args()
+
+    run_benchmark([int(s) for s in args.scales.split(",")], args.output, args.models.split(","),
+                  args.predict_rows, args.workdir, {} if args.no_model_limit else MODEL_MAX_ROWS)
@@ -0,0 +1,198 @@
+# -*- coding:utf-8 -*-
+
+# ******************************************************************************
+# 模块说明 ：决策树 / 随机森林模型的紧凑存储格式
+#            CompactForest() - 将训练好的树模型转换为一个连续的节点数组，
+#                              阈值和节点值为 float32, 子节点索引为 int32,
+#                              用 numpy 向量化方式一次性遍历一个批次在所有树上的路径
+#
+#            文件格式: <文件名>.npy  - 节点数组(结构化数组，可内存映射，多个进程共享)
+#                      <文件名>.json - 树的根节点位置，特征个数，最大深度等信息
+#
+# 开发人员 ：Edwin.Zhang
+# 开发时间 : 2018-5-18
+# ******************************************************************************
+
+import os
+import json
+import numpy as np
+
+
+def myprint(message):
+    """
+    说明：一个小函数，为了缩减文件，使重点突出，没有加共用函数库，冗余了这段代码
+    """
+    import time
+    print(time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time())) + " : " + message)
+
+
+# 每个节点 20 字节: 分裂特征，分裂阈值，左右子节点在整个数组中的位置，节点的预测值
+NODE_DTYPE = np.dtype([("feature", "<i4"), ("threshold", "<f4"), ("left", "<i4"), ("right", "<i4"), ("value", "<f4")])
+
+
+class CompactForest:
+    """
+    说明:
+        1. 所有树的节点依次存放在一个连续数组中，子节点索引为整个数组中的位置
+        2. 叶子节点的左右子节点指向自身，阈值为 +inf, 遍历时所有样本同步前进，最多 max_depth 步全部到达叶子
+        3. 阈值向下取整到 float32, 对 float32 的输入与 scikit-Learn 的判断结果完全一致
+    """
+    SUPPORTED_MODELS = ("DecisionTreeRegressor", "ExtraTreeRegressor", "RandomForestRegressor",
+                        "ExtraTreesRegressor")
+
+    def __init__(self, nodes, roots, n_features, max_depth):
+        """
+        输入：
+            nodes:(numpy.ndarray of NODE_DTYPE) - 所有树的节点
+            roots:(numpy.ndarray of int32) - 每棵树的根节点位置
+            n_features:(int) - 输入特征个数
+            max_depth:(int) - 所有树中的最大深度
+        """
+        self.nodes = nodes
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.n_features = n_features
+        self.max_depth = max_depth
+
+    @classmethod
+    def from_model(cls, model):
+        """
+        说明：
+            从训练好的 scikit-Learn 回归树 / 随机森林转换
+        输入：
+            model:(sklearn.regressor) - 见 SUPPORTED_MODELS, 只支持单输出
+        输出:
+            CompactForest
+        """
+        if type(model).__name__ not in cls.SUPPORTED_MODELS:
+            raise ValueError("Model %s is not supported, only %s." % (type(model).__name__,
+                                                                      ", ".join(cls.SUPPORTED_MODELS)))
+        estimators = getattr(model, "estimators_", [model])
+        trees = [estimator.tree_ for estimator in estimators]
+        if trees[0].n_outputs != 1:
+            raise ValueError("Only single output regressor is supported.")
+
+        nodes = np.empty(sum(tree.node_count for tree in trees), dtype=NODE_DTYPE)
+        roots = []
+        offset = 0
+        for tree in trees:
+            count = tree.node_count
+            index = np.arange(offset, offset + count, dtype=np.int32)
+            is_leaf = tree.children_left < 0
+            block = nodes[offset:offset + count]
+
+            block["feature"] = np.where(is_leaf, 0, tree.feature)
+            block["left"] = np.where(is_leaf, index, tree.children_left + offset)
+            block["right"] = np.where(is_leaf, index, tree.children_right + offset)
+            block["value"] = tree.value[:, 0, 0]
+
+            # 阈值向下取整到 float32: 对 float32 的 x, x <= threshold(float64) 等价于 x <= threshold(float32)
+            threshold = tree.threshold.astype(np.float32)
+            rounded_up = threshold.astype(np.float64) > tree.threshold
+            threshold[rounded_up] = np.nextafter(threshold[rounded_up], np.float32(-np.inf))
+            threshold[is_leaf] = np.inf
+            block["threshold"] = threshold
+
+            roots.append(offset)
+            offset += count
+
+        max_depth = max(tree.max_depth for tree in trees)
+        return cls(nodes, roots, trees[0].n_features, max_depth)
+
+    @property
+    def nbytes(self):
+        return self.nodes.nbytes + self.roots.nbytes
+
+    def predict(self, X, block_size=4096):
+        """
+        说明：
+            批量预测，每次处理 block_size 行，所有树同时遍历，内存占用为 block_size x 树的个数
+        输入：
+            X:(numpy.ndarray) - 特征矩阵，与训练时的 train_prepared 列相同
+        输出:
+            predictions:(numpy.ndarray) - 所有树预测值的平均值
+        """
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError("X should have %d features." % self.n_features)
+
+        feature = self.nodes["feature"]
+        threshold = self.nodes["threshold"]
+        left = self.nodes["left"]
+        right = self.nodes["right"]
+        value = self.nodes["value"]
+
+        predictions = np.empty(X.shape[0], dtype=np.float64)
+        for start in range(0, X.shape[0], block_size):
+            block = np.ascontiguousarray(X[start:start + block_size]).ravel()
+            n_rows = len(block) // self.n_features
+            # 每一行在展平后的 block 中的起始位置，用一维索引取值比二维花式索引快
+            row_offset = (np.arange(n_rows, dtype=np.int64) * self.n_features)[:, np.newaxis]
+            index = np.repeat(self.roots[np.newaxis, :], n_rows, axis=0)
+            for _ in range(self.max_depth):
+                go_left = block[row_offset + feature[index]] <= threshold[index]
+                next_index = np.where(go_left, left[index], right[index])
+                if np.array_equal(next_index, index):
+                    break  # 所有样本都已到达叶子节点
+                index = next_index
+            predictions[start:start + n_rows] = value[index].mean(axis=1, dtype=np.float64)
+        return predictions
+
+    def save(self, filename):
+        """
+        说明：
+            保存为 <filename>.npy 及 <filename>.json
+        """
+        path = os.path.dirname(filename)
+        if path != "" and not os.path.exists(path):
+            os.makedirs(path)
+        np.save(filename + ".npy", self.nodes)
+        with open(filename + ".json", "w", encoding="utf-8") as f:
+            json.dump({"roots": [int(r) for r in self.roots], "n_features": int(self.n_features),
+                       "max_depth": int(self.max_depth), "node_count": int(len(self.nodes))}, f)
+
+    @classmethod
+    def load(cls, filename, mmap_mode="r"):
+        """
+        说明：
+            装载紧凑格式模型，缺省以只读内存映射方式打开节点数组，不需要反序列化，
+            多个进程装载同一文件时共享同一份物理内存
+        """
+        with open(filename + ".json", "r", encoding="utf-8") as f:
+            header = json.load(f)
+        nodes = np.load(filename + ".npy", mmap_mode=mmap_mode)
+        if len(nodes) != header["node_count"] or nodes.dtype != NODE_DTYPE:
+            raise ValueError(filename + ".npy does not match its header.")
+        return cls(nodes, header["roots"], header["n_features"], header["max_depth"])
+
+
+def check_parity(model, compact, X):
+    """
+    说明：
+        比较紧凑格式与原 scikit-Learn 模型在 X 上的预测结果
+    输出:
+        max_abs_diff:(float) - 最大绝对误差，只来自节点值的 float32 舍入
+    """
+    return float(np.max(np.abs(model.predict(X) - compact.predict(X))))
+
+
+def export_registered_model(registry, entry, check_data=None):
+    """
+    说明：
+        将登记的模型转换为紧凑格式，保存在该版本目录中(forest.npy / forest.json)，并记录到清单
+    输入：
+        registry:(ModelRegistry) - 模型版本管理
+        entry:(dict) - 清单中的模型记录
+        check_data:(numpy.ndarray) - 若提供，转换后在该数据上比较预测结果
+    输出:
+        entry:(dict) - 更新后的清单记录
+    """
+    model, _ = registry.load_entry(entry, mmap_mode=None)
+    compact = CompactForest.from_model(model)
+    filename = os.path.join(os.path.dirname(entry["model_file"]), "forest")
+    compact.save(filename)
+
+    myprint("%20s : Compact model size = %d bytes, pickle size = %d bytes" %
+            (entry["name"], compact.nbytes, os.path.getsize(entry["model_file"])))
+    if check_data is not None:
+        myprint("%20s : Compact model max abs diff = %f" % (entry["name"], check_parity(model, compact, check_data)))
+    return registry.update_entry(entry["name"], entry["version"], compact_file=filename)
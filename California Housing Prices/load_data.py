@@ -3,15 +3,20 @@
 # ******************************************************************************
 # 模块说明 ：获得数据集
 #            主要类 ： DataLoader()    -- 功能类，处理数据集的获取和装载
-#                     FetchFileData() -- 工具类
+#                     FetchFileData() -- 工具类，支持断点续传，分段下载及 SHA-256 校验
+#                     DataCache()     -- 工具类，CSV 数据集的列式二进制缓存
 #            
 # 开发人员 ：Edwin.Zhang
 # 开发时间 : 2018-5-18
 # ******************************************************************************
 
 import os
-import urllib
+import json
+import urllib.error
+import urllib.request
+import hashlib
 import tarfile
+import numpy as np
 import pandas as pd
 
 
@@ -23,11 +28,53 @@ def myprint(message):
     print(time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time())) + " : " + message)
 
 
+class ProgressReporter:
+    """
+    说明: 节流的下载进度显示，最多每 interval 秒输出一次，避免每个数据块都打印一行
+    """
+    def __init__(self, totalsize, interval=2.0, downloaded=0):
+        """
+        输入值:
+            totalsize  : 文件总字节数，未知时为 0 或 None
+            interval   : 两次输出之间的最小间隔秒数
+            downloaded : 已下载的字节数 (断点续传时不为 0)
+        """
+        import threading
+        self.totalsize = totalsize or 0
+        self.interval = interval
+        self.downloaded = downloaded
+        self.last_time = 0.0
+        self.lock = threading.Lock()
+
+    def update(self, nbytes):
+        import time
+        with self.lock:
+            self.downloaded += nbytes
+            now = time.time()
+            if now - self.last_time < self.interval:
+                return
+            self.last_time = now
+            self.show()
+
+    def show(self):
+        if self.totalsize > 0:
+            per = min(100.0, 100.0 * self.downloaded / self.totalsize)
+            myprint("Current download percentage : %.2f%% (%d / %d bytes)" % (per, self.downloaded, self.totalsize))
+        else:
+            myprint("Current download size : %d bytes" % self.downloaded)
+
+
 class FetchFileData:
     """
     说明: 用于下载指定url的具体文件内容
+          1. 支持 HTTP Range 断点续传，中断后重新运行只下载剩余部分
+          2. 支持多连接分段下载 (connections > 1，且服务器支持 Range)
+          3. 下载及释放完成后写入 SHA-256 清单文件，本地文件有效时跳过下载和释放
     """
-    def __init__(self, url, localpath=".", filename="", extractfile=True):
+    BLOCKSIZE = 64 * 1024
+
+    def __init__(self, url, localpath=".", filename="", extractfile=True, connections=1, sha256=None,
+                 progress_interval=2.0):
         """
         输入值:
             url         : 完整的文件下载url, 含文件名, 本例只支持释放.tgz 文件，
@@ -35,6 +82,9 @@ class FetchFileData:
             localpath   : 文件下载以及释放后的文件存放的本地目录，可以是相对目录名,若为"" 或 ".", 则为当前目录
             filename    : 本地保存的 .tgz 文件名，若为空，则为url中的文件名
             extractfile : True : 执行释放文件的操作，目前只支持tgz ; False : 不执行释放文件的操作; 缺省为Fasle
+            connections : 分段下载的连接数，缺省为 1, 即单连接下载
+            sha256      : 文件的 SHA-256 校验值，若提供，下载完成后进行校验; 为 None 则不校验
+            progress_interval : 下载进度的输出间隔秒数
         """
         self.url = url
 
@@ -50,34 +100,219 @@ class FetchFileData:
 
         self.extractfile = extractfile
         self.local_filename = os.path.join(self.localpath, self.filename)
+        self.manifest_filename = self.local_filename + ".manifest.json"
+
+        self.connections = max(1, connections)
+        self.sha256 = sha256
+        self.progress_interval = progress_interval
+        self.progress = None
 
     def schedule(self, blocknum, blocksize, totalsize):
-        per = 100.0 * blocknum * blocksize / totalsize
-        if per > 100:
-            per = 100
-        myprint("Current download percentage : %.2f%%" % per)
+        """
+        说明: 兼容 urllib.request.urlretrieve 的进度回调，输出经过节流
+        """
+        if self.progress is None:
+            self.progress = ProgressReporter(totalsize, self.progress_interval)
+        self.progress.update(blocksize)
+
+    def read_manifest(self):
+        if not os.path.exists(self.manifest_filename):
+            return {}
+        try:
+            with open(self.manifest_filename, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def write_manifest(self, manifest):
+        with open(self.manifest_filename, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    def is_local_file_valid(self):
+        """
+        说明: 本地文件存在，且 SHA-256 与清单 (及指定的校验值) 一致，则认为不需要重新下载
+        """
+        manifest = self.read_manifest()
+        if not os.path.exists(self.local_filename) or manifest.get("url") != self.url:
+            return False
+        local_sha256 = DataCache.file_hash(self.local_filename)
+        if self.sha256 is not None and local_sha256 != self.sha256:
+            return False
+        return local_sha256 == manifest.get("sha256")
+
+    def get_remote_info(self):
+        """
+        说明: 用 HEAD 请求获得文件大小，以及服务器是否支持 Range 请求
+
+        输出: (totalsize, accept_ranges), 获取失败时为 (0, False)
+        """
+        try:
+            request = urllib.request.Request(self.url, method="HEAD")
+            with urllib.request.urlopen(request) as response:
+                totalsize = int(response.headers.get("Content-Length", 0))
+                accept_ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+                return totalsize, accept_ranges
+        except Exception as e:
+            myprint("Get remote file info failed : " + str(e))
+            return 0, False
+
+    def download_range(self, partname, start=0, end=None, totalsize=0):
+        """
+        说明:
+            下载文件的一段内容到 partname, partname 已存在时从已有长度处续传
+            已有内容已完整时不再请求; 比应有长度大，或服务器返回 416 时，删除 partname 重新下载
+
+        输入:
+            partname  : 本地的分段临时文件名
+            start     : 该段在文件中的起始字节位置
+            end       : 该段的结束字节位置(含)，为 None 时下载到文件末尾
+            totalsize : 文件总字节数，未知时为 0
+        """
+        downloaded = os.path.getsize(partname) if os.path.exists(partname) else 0
+        length = end - start + 1 if end is not None else totalsize - start
+        if length > 0 and downloaded > length:
+            myprint("%s is larger than the remote file, download it again." % partname)
+            self.restart_part(partname, downloaded)
+            downloaded = 0
+        if length > 0 and downloaded == length:
+            return
+
+        request = urllib.request.Request(self.url)
+        if start + downloaded > 0 or end is not None:
+            request.add_header("Range", "bytes=%d-%s" % (start + downloaded, "" if end is None else end))
+
+        try:
+            response = urllib.request.urlopen(request)
+        except urllib.error.HTTPError as e:
+            if e.code != 416 or downloaded == 0:
+                raise
+            # 已有内容与远程文件不符(如远程文件变小)，删除后从头下载该段
+            myprint("Range of %s is not satisfiable, download it again." % partname)
+            self.restart_part(partname, downloaded)
+            return self.download_range(partname, start, end, totalsize)
+
+        with response:
+            if response.status != 206 and end is not None:
+                raise IOError("Server does not support range request for segmented download.")
+            if response.status != 206 and downloaded > 0:
+                # 服务器不支持断点续传，从头开始下载
+                myprint("Server does not support resume, download from the beginning.")
+                self.progress.update(-downloaded)
+                downloaded = 0
+            with open(partname, "ab" if downloaded > 0 else "wb") as f:
+                for block in iter(lambda: response.read(self.BLOCKSIZE), b""):
+                    f.write(block)
+                    self.progress.update(len(block))
+
+    def restart_part(self, partname, downloaded):
+        """
+        说明: 删除无效的临时文件，并从下载进度中扣除其长度
+        """
+        os.remove(partname)
+        if self.progress is not None:
+            self.progress.update(-downloaded)
+
+    def download_segmented(self, totalsize):
+        """
+        说明: 多连接分段下载，每段一个临时文件，全部完成后按顺序合并
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        segment_size = -(-totalsize // self.connections)
+        segments = [(self.local_filename + ".part%d" % i, start, min(start + segment_size, totalsize) - 1)
+                    for i, start in enumerate(range(0, totalsize, segment_size))]
+        with ThreadPoolExecutor(max_workers=len(segments)) as executor:
+            for future in [executor.submit(self.download_range, *segment, totalsize) for segment in segments]:
+                future.result()
+
+        partname = self.local_filename + ".part"
+        with open(partname, "wb") as f:
+            for segment_name, _, _ in segments:
+                with open(segment_name, "rb") as segment_file:
+                    for block in iter(lambda: segment_file.read(self.BLOCKSIZE), b""):
+                        f.write(block)
+        for segment_name, _, _ in segments:
+            os.remove(segment_name)
 
     def download_file_to_local(self):
         """
         单独使用，可实现下载指定文件内容
+        下载内容先写入 .part 临时文件，完成并校验后再改为正式文件名
         """
         if not os.path.exists(self.localpath):
             os.makedirs(self.localpath)
+
+        if self.is_local_file_valid():
+            myprint(self.local_filename + " is already downloaded and verified.")
+            return True
+
+        partname = self.local_filename + ".part"
         try:
-            urllib.request.urlretrieve(self.url, self.local_filename, self.schedule)
+            totalsize, accept_ranges = self.get_remote_info()
+            # 下载后长度与远程文件不符时，删除临时文件重新下载一次
+            for attempt in range(2):
+                if self.connections > 1 and accept_ranges and totalsize > 0:
+                    downloaded = sum(os.path.getsize(self.local_filename + ".part%d" % i)
+                                     for i in range(self.connections)
+                                     if os.path.exists(self.local_filename + ".part%d" % i))
+                    self.progress = ProgressReporter(totalsize, self.progress_interval, downloaded)
+                    self.download_segmented(totalsize)
+                else:
+                    downloaded = os.path.getsize(partname) if os.path.exists(partname) else 0
+                    if 0 < downloaded < totalsize or (downloaded > 0 and totalsize == 0):
+                        myprint("Resume download from byte %d" % downloaded)
+                    self.progress = ProgressReporter(totalsize, self.progress_interval, downloaded)
+                    self.download_range(partname, totalsize=totalsize)
+                self.progress.show()
+
+                size = os.path.getsize(partname)
+                if totalsize == 0 or size == totalsize:
+                    break
+                os.remove(partname)
+                myprint("%s has %d bytes, but the remote file has %d bytes." % (partname, size, totalsize))
+            else:
+                return False
+
+            local_sha256 = DataCache.file_hash(partname)
+            if self.sha256 is not None and local_sha256 != self.sha256:
+                os.remove(partname)
+                myprint(self.local_filename + " SHA-256 check failed : " + local_sha256)
+                return False
+
+            os.replace(partname, self.local_filename)
+            self.write_manifest({"url": self.url, "sha256": local_sha256, "size": os.path.getsize(self.local_filename)})
             return True
         except Exception as e:
-            myprint(e)
+            myprint(str(e))
             return False
 
+    def is_extracted(self):
+        """
+        说明: 清单中记录了本次下载文件的释放结果，且释放出的文件仍然存在，则不需要重新释放
+        """
+        manifest = self.read_manifest()
+        members = manifest.get("extracted")
+        if not members:
+            return False
+        return all(os.path.exists(os.path.join(self.localpath, name)) for name in members)
+
     def extract_tgz_file(self):
         """
         单独使用，可实现释放指定的 .tgz 文件
         """
         if os.path.exists(self.local_filename):
+            if self.is_extracted():
+                myprint(self.local_filename + " is already extracted.")
+                return
             tgzresult = tarfile.open(self.local_filename)
             tgzresult.extractall(path=self.localpath)
+            members = [member.name for member in tgzresult.getmembers() if member.isfile()]
             tgzresult.close()
+
+            manifest = self.read_manifest()
+            if manifest:
+                manifest["extracted"] = members
+                self.write_manifest(manifest)
         else:
             myprint(self.local_filename + " is not exists !")
 
@@ -96,16 +331,318 @@ class FetchFileData:
         return self.local_filename
 
 
+class DataCache:
+    """
+    说明:
+        CSV 数据集的列式二进制缓存，避免每次运行都用 pd.read_csv 重新解析文本
+        1. 每一列保存为一个 .npy 文件，文本列保存为整数编码，类别表记录在 schema.json 中，
+           保存时为 category 类型的列，装载时还原为 category 类型
+        2. 缓存目录名由 源文件的 SHA-256 + 拆分参数 计算得出，源文件内容或参数变化后自动失效
+        3. 读取时使用内存映射 (mmap_mode="r")，不需要任何解析过程
+        4. 源文件的 SHA-256 按 文件大小 + 修改时间 记录在 source_hashes.json 中，两者都不变时不重新计算;
+           同一进程中还会记住计算结果，一次装载中多次用到同一源文件时只计算一次
+    """
+    SCHEMA_FILENAME = "schema.json"
+    HASH_INDEX_FILENAME = "source_hashes.json"
+    _source_hashes = {}   # 进程内的记录: (绝对路径, 大小, 修改时间) -> SHA-256
+
+    def __init__(self, cachepath):
+        """
+        输入值:
+            cachepath : 缓存文件存放的根目录
+        """
+        self.cachepath = cachepath
+
+    @staticmethod
+    def file_hash(filename, blocksize=1024 * 1024):
+        """
+        说明：
+            分块计算文件的 SHA-256，大文件也不需要全部读入内存
+        """
+        sha256 = hashlib.sha256()
+        with open(filename, "rb") as f:
+            for block in iter(lambda: f.read(blocksize), b""):
+                sha256.update(block)
+        return sha256.hexdigest()
+
+    def source_hash(self, filename):
+        """
+        说明：
+            源文件的 SHA-256, 文件大小和修改时间与记录一致时直接使用记录的值，否则重新计算并记录
+        """
+        stat = os.stat(filename)
+        path = os.path.abspath(filename)
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        source_sha256 = DataCache._source_hashes.get(key)
+        if source_sha256 is not None:
+            return source_sha256
+
+        index_filename = os.path.join(self.cachepath, self.HASH_INDEX_FILENAME)
+        index = {}
+        if os.path.exists(index_filename):
+            try:
+                with open(index_filename, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+            except (OSError, ValueError):
+                index = {}
+        record = index.get(path)
+        if record and record.get("size") == stat.st_size and record.get("mtime_ns") == stat.st_mtime_ns:
+            source_sha256 = record["sha256"]
+        else:
+            source_sha256 = self.file_hash(filename)
+            index[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": source_sha256}
+            if not os.path.exists(self.cachepath):
+                os.makedirs(self.cachepath)
+            # 先写临时文件再改名，避免写入中断导致记录文件损坏
+            with open(index_filename + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(index, f, ensure_ascii=False, indent=2)
+            os.replace(index_filename + ".tmp", index_filename)
+        DataCache._source_hashes[key] = source_sha256
+        return source_sha256
+
+    def cache_dir(self, filename, **params):
+        """
+        说明：
+            根据 源文件内容 及 拆分参数，获得对应的缓存目录
+
+        输入：
+            filename :(string) 源 CSV 文件名
+            params   :拆分参数，如 split="train", test_ratio=0.2, seed=42
+
+        输出:
+            (cache_dir, source_sha256)
+        """
+        source_sha256 = self.source_hash(filename)
+        key = json.dumps({"source_sha256": source_sha256, "params": params}, sort_keys=True)
+        name = os.path.splitext(os.path.basename(filename))[0]
+        return os.path.join(self.cachepath, name + "_" + hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]), \
+            source_sha256
+
+    def load(self, filename, **params):
+        """
+        说明：
+            从缓存中装载数据集，缓存不存在或校验失败时返回 None
+
+        输入：
+            filename :(string) 源 CSV 文件名
+            params   :拆分参数，必须与保存时一致
+
+        输出:
+            数据集: (pandas.DataFrame) 或 None
+        """
+        if not os.path.exists(filename):
+            return None
+
+        cache_dir, source_sha256 = self.cache_dir(filename, **params)
+        schema_filename = os.path.join(cache_dir, self.SCHEMA_FILENAME)
+        if not os.path.exists(schema_filename):
+            return None
+
+        try:
+            with open(schema_filename, "r", encoding="utf-8") as f:
+                schema = json.load(f)
+            if schema["source_sha256"] != source_sha256:
+                return None
+
+            columns = {}
+            for i, column in enumerate(schema["columns"]):
+                values = np.load(os.path.join(cache_dir, "%03d.npy" % i), mmap_mode="r")
+                if len(values) != schema["rows"]:
+                    return None
+                if column["kind"] == "category" and column.get("categorical"):
+                    values = pd.Categorical.from_codes(values, categories=column["categories"])
+                elif column["kind"] == "category":
+                    # 文本列由编码还原，-1 表示缺失值
+                    categories = np.asarray(column["categories"] + [np.nan], dtype=object)
+                    values = categories[values]
+                columns[column["name"]] = values
+            return pd.DataFrame(columns, columns=[c["name"] for c in schema["columns"]], copy=False)
+        except (OSError, ValueError, KeyError, IndexError) as e:
+            myprint("Cache of " + filename + " is invalid : " + str(e))
+            return None
+
+    def save(self, data, filename, **params):
+        """
+        说明：
+            将数据集按列写入缓存，schema.json 最后写入，作为缓存完整的标志
+
+        输入：
+            data     :(pandas.DataFrame) 由 filename 解析得到的数据集
+            filename :(string) 源 CSV 文件名
+            params   :拆分参数
+        """
+        cache_dir, source_sha256 = self.cache_dir(filename, **params)
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+        columns = []
+        for i, name in enumerate(data.columns):
+            series = data[name]
+            if not pd.api.types.is_numeric_dtype(series):
+                codes, categories = pd.factorize(series, sort=True)
+                values = codes.astype(np.int32)
+                columns.append({"name": name, "kind": "category", "dtype": str(values.dtype),
+                                "categories": [str(c) for c in categories],
+                                "categorical": isinstance(series.dtype, pd.CategoricalDtype)})
+            else:
+                values = series.values
+                columns.append({"name": name, "kind": "numeric", "dtype": str(values.dtype)})
+            np.save(os.path.join(cache_dir, "%03d.npy" % i), values)
+
+        schema = {"source": filename, "source_sha256": source_sha256, "params": params,
+                  "rows": len(data), "columns": columns}
+        with open(os.path.join(cache_dir, self.SCHEMA_FILENAME), "w", encoding="utf-8") as f:
+            json.dump(schema, f, ensure_ascii=False, indent=2)
+
+    def read_csv(self, filename, parser=None, **params):
+        """
+        说明：
+            带缓存的 pd.read_csv, 缓存命中时直接内存映射读取，否则解析 CSV 并写入缓存
+            parser 为解析 CSV 的函数，缺省为 pd.read_csv; 解析结果不同时，params 中应包含区分的参数
+        """
+        data = self.load(filename, **params)
+        if data is None:
+            data = parser(filename) if parser is not None else pd.read_csv(filename)
+            self.save(data, filename, **params)
+        return data
+
+
 class DataLoader:
     URL = "https://raw.githubusercontent.com/ageron/handson-ml/master/datasets/housing/housing.tgz"
     LOCALPATH = "datasets"
-    FILENAME_ALL_SET = "datasets\\housing.csv"
-    FILENAME_TRAIN_SET = "datasets\\train_set.csv"
-    FILENAME_TEST_SET = "datasets\\test_set.csv"
-
-    def __init__(self):
+    FILENAME_ALL_SET = os.path.join("datasets", "housing.csv")
+    FILENAME_TRAIN_SET = os.path.join("datasets", "train_set.csv")
+    FILENAME_TEST_SET = os.path.join("datasets", "test_set.csv")
+    CACHE_PATH = os.path.join("datasets", "cache")
+    SPLIT_INDEX_PATH = os.path.join("datasets", "splits")
+    TEST_RATIO = 0.2
+    SEED = 42
+
+    # 紧凑类型: "float32"  - 测量值
+    #           "integer"  - 取值全部为整数时，用能精确表示的最小整数类型，有缺失值或小数时为 float32
+    #           "category" - 文本列
+    # 未列出的列保持 pd.read_csv 推断的类型
+    COMPACT_SCHEMA = {
+        "longitude": "float32",
+        "latitude": "float32",
+        "housing_median_age": "integer",
+        "total_rooms": "integer",
+        "total_bedrooms": "integer",
+        "population": "integer",
+        "households": "integer",
+        "median_income": "float32",
+        "median_house_value": "integer",
+        "ocean_proximity": "category",
+    }
+
+    def __init__(self, use_cache=True, streaming=False, chunksize=100000, compact_dtypes=True, split_mode="index",
+                 stratify=False):
+        """
+        输入值:
+            use_cache : True : 使用列式二进制缓存装载数据集(缺省); False : 每次都解析 CSV 文件
+            streaming : True : 分块读取原始数据集，按哈希值拆分并逐块写出训练集，测试集，
+                               适用于超过内存大小的数据集; False : 整体装载后随机拆分(缺省)
+            chunksize : 流式模式下每次读取的行数
+            compact_dtypes : True : 按 COMPACT_SCHEMA 使用紧凑的数据类型，内存占用约减半(缺省);
+                             False : 使用 pd.read_csv 推断的类型 (float64 / object)
+            split_mode : "index" : 只保存训练集，测试集的行号(.npy)，装载时从原始数据集(缓存)中取出(缺省);
+                         "csv"   : 将训练集，测试集分别保存为 CSV 文件
+            stratify   : True : 按收入分层(income_cat)拆分，测试集的收入分布与总体一致;
+                         False : 随机拆分，与 split_data() 的结果相同(缺省)
+        """
         self.train_set = None
         self.test_set = None
+        self.cache = DataCache(self.CACHE_PATH) if use_cache else None
+        self.streaming = streaming
+        self.chunksize = chunksize
+        self.compact_dtypes = compact_dtypes
+        self.split_mode = split_mode
+        self.stratify = stratify
+
+    @staticmethod
+    def parsed_memory_usage(data):
+        """
+        说明:
+            估算 pd.read_csv 按缺省类型解析时的内存占用(字节): 数值列为 float64 / int64, 文本列为 Python 字符串对象
+        """
+        import sys
+        total = data.index.memory_usage()
+        for name in data.columns:
+            series = data[name]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                counts = series.value_counts(sort=False)
+                total += 8 * len(series) + sum(int(n) * sys.getsizeof(str(c)) for c, n in counts.items())
+            elif pd.api.types.is_numeric_dtype(series):
+                total += 8 * len(series)
+            else:
+                total += series.memory_usage(index=False, deep=True)
+        return total
+
+    @classmethod
+    def apply_compact_schema(cls, data):
+        """
+        说明:
+            按 COMPACT_SCHEMA 转换数据集的列类型，整数列只有在转换后取值不变时才使用整数类型
+
+        输入:
+            data:(pandas.DataFrame) - 数据集，按 COMPACT_SCHEMA 中 float32 / category 类型解析的列不再转换
+        输出:
+            data:(pandas.DataFrame)
+        """
+        for name, kind in cls.COMPACT_SCHEMA.items():
+            if name not in data:
+                continue
+            series = data[name]
+            if kind == "category":
+                if not isinstance(series.dtype, pd.CategoricalDtype):
+                    data[name] = series.astype("category")
+            elif kind == "integer" and pd.api.types.is_numeric_dtype(series):
+                values = series.values
+                if not np.isnan(values).any() and np.array_equal(values, np.round(values)):
+                    data[name] = pd.to_numeric(series, downcast="integer")
+                else:
+                    data[name] = series.astype(np.float32)
+            elif kind == "float32" and series.dtype != np.float32:
+                data[name] = series.astype(np.float32)
+        return data
+
+    def parse_csv(self, filename):
+        """
+        说明:
+            解析 CSV 数据集; 使用紧凑类型时，float32 和 category 列在解析时直接生成，
+            整数列先解析为 float64, 确认取值为整数后再转换，并显示节省的内存
+        """
+        if not self.compact_dtypes:
+            return pd.read_csv(filename)
+
+        dtype = {name: ("category" if kind == "category" else np.float32 if kind == "float32" else np.float64)
+                 for name, kind in self.COMPACT_SCHEMA.items()}
+        data = self.apply_compact_schema(pd.read_csv(filename, dtype=dtype))
+        parsed_bytes = self.parsed_memory_usage(data)
+        compact_bytes = data.memory_usage(index=True, deep=True).sum()
+        myprint("Compact dtypes of %s : %.1f MB -> %.1f MB, saved %.1f%%" %
+                (filename, parsed_bytes / 1024.0 / 1024.0, compact_bytes / 1024.0 / 1024.0,
+                 100.0 * (1 - compact_bytes / float(parsed_bytes)) if parsed_bytes else 0.0))
+        return data
+
+    def read_csv(self, filename, split):
+        """
+        说明:
+            装载 CSV 数据集，启用缓存时由 DataCache 处理
+
+        输入:
+            filename :(string) 数据集文件名
+            split    :(string) 数据集类型，"all", "train" 或 "test", 与拆分参数一起作为缓存的键
+        """
+        if self.cache is None:
+            return self.parse_csv(filename)
+        # 紧凑类型与缺省类型的缓存分开保存
+        params = {"split": split}
+        if split != "all":
+            params.update(test_ratio=self.TEST_RATIO, seed=self.SEED)
+        if self.compact_dtypes:
+            params["dtypes"] = "compact"
+        return self.cache.read_csv(filename, parser=self.parse_csv, **params)
 
     def load_all_set(self):
         """
@@ -120,7 +657,7 @@ class DataLoader:
 
         # 有可能没有下载成功，因此打开文件前，仍需要再判断一次
         if os.path.exists(self.FILENAME_ALL_SET):
-            return pd.read_csv(self.FILENAME_ALL_SET)
+            return self.read_csv(self.FILENAME_ALL_SET, "all")
         else:
             return None
 
@@ -132,7 +669,7 @@ class DataLoader:
         返回值：
             训练数据集: pandas.DataFrame
         """
-        return self.load_train_or_test_set(self.FILENAME_TRAIN_SET)
+        return self.load_train_or_test_set(self.FILENAME_TRAIN_SET, "train")
 
     def load_test_set(self):
         """
@@ -142,7 +679,7 @@ class DataLoader:
         返回值：
             测试数据集: pandas.DataFrame
         """
-        return self.load_train_or_test_set(self.FILENAME_TEST_SET)
+        return self.load_train_or_test_set(self.FILENAME_TEST_SET, "test")
 
     def load_actual_set(self):
         pass
@@ -165,30 +702,172 @@ class DataLoader:
         self.train_set, self.test_set = train_test_split(data, test_size=test_ratio, random_state=seed)
         return self.train_set, self.test_set
 
-    def load_train_or_test_set(self, filename):
+    @staticmethod
+    def income_category(data):
+        """
+        说明:
+            收入分层: median_income / 1.5 向上取整，大于 5 的合并为 5, 共 5 层
+        """
+        income_cat = np.ceil(np.asarray(data["median_income"], dtype=np.float64) / 1.5)
+        return np.where(income_cat < 5, income_cat, 5.0)
+
+    def split_index(self, data, test_ratio, seed, stratify=False):
+        """
+        说明:
+            拆分数据集的行号; stratify 为 False 时，与 split_data() 对同一数据集的拆分结果完全相同
+
+        输出:
+            train_index:(numpy.ndarray of int32)
+            test_index :(numpy.ndarray of int32)
+        """
+        from sklearn.model_selection import train_test_split
+        index = np.arange(len(data), dtype=np.int32 if len(data) < 2 ** 31 else np.int64)
+        return train_test_split(index, test_size=test_ratio, random_state=seed,
+                                stratify=self.income_category(data) if stratify else None)
+
+    def load_split_index(self, data, test_ratio, seed):
+        """
+        说明:
+            装载保存的拆分行号，不存在时拆分并保存为 train_index.npy / test_index.npy
+            保存目录由 原始数据集的 SHA-256 + 拆分参数 计算得出，原始数据集变化后重新拆分
+
+        输入:
+            data      :(pandas.DataFrame) - 原始数据集
+            test_ratio:(float) - 测试集的拆分比例
+            seed      :(int) - 随机种子
+
+        输出:
+            (train_index, test_index)
+        """
+        split_dir, _ = DataCache(self.SPLIT_INDEX_PATH).cache_dir(self.FILENAME_ALL_SET, test_ratio=test_ratio,
+                                                                   seed=seed, stratify=self.stratify)
+        train_filename = os.path.join(split_dir, "train_index.npy")
+        test_filename = os.path.join(split_dir, "test_index.npy")
+        if os.path.exists(train_filename) and os.path.exists(test_filename):
+            train_index, test_index = np.load(train_filename), np.load(test_filename)
+            if len(train_index) + len(test_index) == len(data):
+                return train_index, test_index
+            myprint("Split index in " + split_dir + " does not match the data set, split again.")
+
+        train_index, test_index = self.split_index(data, test_ratio, seed, self.stratify)
+        if not os.path.exists(split_dir):
+            os.makedirs(split_dir)
+        # test_index 最后写入，两个文件都存在时才视为完整
+        np.save(train_filename, train_index)
+        np.save(test_filename, test_index)
+        return train_index, test_index
+
+    def load_split_from_index(self, split):
+        """
+        说明:
+            从原始数据集中按保存的行号取出训练集或测试集，只取出需要的一个，不保存数据副本
+
+        输入:
+            split:(string) "train" 或 "test"
+
+        输出:
+            数据集: (pandas.DataFrame), 行号重新从 0 开始，与从 CSV 文件装载的结果一致
+        """
+        all_set = self.load_all_set()
+        if all_set is None:
+            return None
+        train_index, test_index = self.load_split_index(all_set, self.TEST_RATIO, self.SEED)
+        data = all_set.take(train_index if split == "train" else test_index).reset_index(drop=True)
+        if split == "train":
+            self.train_set = data
+        else:
+            self.test_set = data
+        return data
+
+    @staticmethod
+    def hash_split_mask(chunk, test_ratio, seed):
+        """
+        说明:
+            根据每行数据内容的哈希值，决定该行是否属于测试集
+            同一行数据，无论在哪个数据块中，无论文件是否追加了新数据，结果都一致
+
+        输入:
+            chunk     :(pandas.DataFrame) - 数据块
+            test_ratio:(float) - 测试集的拆分比例
+            seed      :(int) - 作为哈希的 key, 不同的 seed 得到不同的拆分
+
+        输出:
+            is_test:(numpy.ndarray of bool)
+        """
+        # 统一类型后再计算哈希，避免同一数值在不同数据块中被推断为 int 或 float 而得到不同结果
+        normalized = pd.DataFrame({name: chunk[name].astype(np.float64)
+                                   if pd.api.types.is_numeric_dtype(chunk[name]) else chunk[name].astype(str)
+                                   for name in chunk.columns})
+        row_hash = pd.util.hash_pandas_object(normalized, index=False, hash_key="%016d" % seed).values
+        return row_hash % np.uint64(1 << 32) < test_ratio * (1 << 32)
+
+    def split_data_streaming(self, filename, test_ratio, seed):
+        """
+        说明:
+            流式拆分: 分块读取原始数据集，按哈希值拆分，并逐块追加写入训练集，测试集文件
+            内存占用只与 chunksize 有关，与数据集大小无关
+
+        输入:
+            filename  :(string) - 原始数据集文件名
+            test_ratio:(float) - 测试集的拆分比例
+            seed      :(int) - 哈希拆分的 key
+
+        输出:
+            (训练集行数, 测试集行数)
+        """
+        # 先写入临时文件，全部完成后再改名，避免中断后留下不完整的数据集文件
+        train_tmpname = self.FILENAME_TRAIN_SET + ".tmp"
+        test_tmpname = self.FILENAME_TEST_SET + ".tmp"
+        train_rows, test_rows = 0, 0
+        with open(train_tmpname, "w", newline="") as train_file, open(test_tmpname, "w", newline="") as test_file:
+            for i, chunk in enumerate(pd.read_csv(filename, chunksize=self.chunksize)):
+                is_test = self.hash_split_mask(chunk, test_ratio, seed)
+                chunk[~is_test].to_csv(train_file, header=(i == 0), index=False, sep=',')
+                chunk[is_test].to_csv(test_file, header=(i == 0), index=False, sep=',')
+                train_rows += int((~is_test).sum())
+                test_rows += int(is_test.sum())
+                myprint("Split chunk %d : train rows = %d, test rows = %d" % (i + 1, train_rows, test_rows))
+
+        os.replace(train_tmpname, self.FILENAME_TRAIN_SET)
+        os.replace(test_tmpname, self.FILENAME_TEST_SET)
+        return train_rows, test_rows
+
+    def load_train_or_test_set(self, filename, split):
         """
         说明：
             中间工具函数，用于装载 训练数据集 或 测试数据集.
             本项目采用的拆分参数为: test_ratio = 0.2, seed = 42
+            split_mode 为 "index" 时只保存行号，从原始数据集中取出; 流式模式仍写出 CSV 文件
 
         输入：
             filename :(string) 数据集文件名
+            split    :(string) "train" 或 "test"
 
         输出:
             内存数据集: (pandas.DataFrame)
         """
 
+        if self.split_mode == "index" and not self.streaming:
+            return self.load_split_from_index(split)
+
+        if not os.path.exists(filename) and self.streaming:
+            # 流式模式: 不整体装载原始数据集，分块拆分并写出训练集，测试集
+            if not os.path.exists(self.FILENAME_ALL_SET):
+                FetchFileData(self.URL, self.LOCALPATH).fetch_data()
+            if os.path.exists(self.FILENAME_ALL_SET):
+                self.split_data_streaming(self.FILENAME_ALL_SET, self.TEST_RATIO, self.SEED)
+
         if not os.path.exists(filename):
             # 获得数据集
             all_set = self.load_all_set()
 
             if all_set is not None:
                 # 拆分，并保存训练集，测试集数据到文件，以便后续重复使用
-                self.train_set, self.test_set = self.split_data(all_set, 0.2, 42)
+                self.train_set, self.test_set = self.split_data(all_set, self.TEST_RATIO, self.SEED)
                 self.train_set.to_csv(self.FILENAME_TRAIN_SET, index=False, sep=',')
                 self.test_set.to_csv(self.FILENAME_TEST_SET, index=False, sep=',')
 
         if os.path.exists(filename):
-            return pd.read_csv(filename)
+            return self.read_csv(filename, split)
         else:
             return None
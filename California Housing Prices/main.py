@@ -4,11 +4,13 @@
 # 模块说明 ：应用程序的主调用程序
 #            执行 process_training_model() 进行模型训练
 #            执行 process_predict()        进行实际预测
+#            执行 process_update_model()   用新增的数据增量更新已登记的模型
 #
 # 开发人员 ：Edwin.Zhang
 # 开发时间 : 2018-5-18
 # ******************************************************************************
 
+import os
 import numpy as np
 
 from sklearn.linear_model import LinearRegression
@@ -18,6 +20,11 @@ from sklearn.ensemble import RandomForestRegressor
 import load_data as myload
 import prepare_data as myprepare
 import train_model as mytrain
+from model_registry import ModelRegistry
+from compact_forest import CompactForest, export_registered_model
+from profiler import PipelineProfiler
+
+PROFILE_REPORT_FILENAME = os.path.join("trainmodels", "training_profile.json")
 
 
 def myprint(message):
@@ -49,95 +56,163 @@ def get_default_model(modeltype):
     return reg_model
 
 
-def process_training_model():
+def process_training_model(profile_dir=None, report_filename=PROFILE_REPORT_FILENAME):
     """
     说明：
         执行模型的训练，需要反复调试，以获得最好的训练模型
+        每个阶段的耗时，内存峰值，处理速度记录在性能报告中，训练结束后显示汇总表格
+    输入：
+        profile_dir:(string) - 若提供，每个阶段的 cProfile 分析结果保存在该目录中
+        report_filename:(string) - JSON 格式的性能报告文件名，为 None 则不保存
     """
+    profiler = PipelineProfiler(profile_dir)
+
     # step 1 : 获取，并装载训练数据集
     myprint("Ready to load train data set ...")
-    dataloader = myload.DataLoader()
-    train_set = dataloader.load_train_set()
+    with profiler.stage("load_data") as record:
+        dataloader = myload.DataLoader()
+        train_set = dataloader.load_train_set()
+        record["rows"] = len(train_set)
     myprint("Load train data complete.")
 
     # step 2 : 清理数据 （基于特征分析的结果，并将根据性能做相应调整）
     myprint("Ready to prepare Data ... ")
-    preparer = myprepare.PrepareData(train_set)
-    preparer.prepare_data()
+    with profiler.stage("prepare_data", rows=len(train_set)):
+        preparer = myprepare.PrepareData(train_set)
+        preparer.prepare_data()
+        preparer.save_pipeline()  # 保存拟合好的处理流程，预测时只做转换
     train_prepared = preparer.train_prepared
     train_label = preparer.train_label
+    full_pipeline = preparer.full_pipeline        # 与每个模型一起登记，预测时只做转换
+    feature_schema = preparer.feature_names()
     myprint("Prepare data complete.")
 
     # step 3 : 反复调整参数，训练模型，并记录模型的性能评分，以获得最好的训练模型
     myprint("Ready to training models and compare performance score ... ")
+    trainers = []
 
     # 基本模型利用缺省参数进行训练，并进行交叉验证
-    trainer = mytrain.TrainModel("lin_model_1", get_default_model("linear"), train_prepared, train_label)
-    trainer.train_model()
-
-    trainer = mytrain.TrainModel("decision_model_1", get_default_model("decisiontree"), train_prepared, train_label)
-    trainer.train_model()
-
-    trainer = mytrain.TrainModel("random_model_1", get_default_model("randomforest"), train_prepared, train_label)
-    trainer.train_model()
+    trainers.append(mytrain.TrainModel("lin_model_1", get_default_model("linear"), train_prepared, train_label,
+                                       full_pipeline=full_pipeline, feature_schema=feature_schema))
+    trainers.append(mytrain.TrainModel("decision_model_1", get_default_model("decisiontree"), train_prepared,
+                                       train_label, full_pipeline=full_pipeline, feature_schema=feature_schema))
+    trainers.append(mytrain.TrainModel("random_model_1", get_default_model("randomforest"), train_prepared,
+                                       train_label, full_pipeline=full_pipeline, feature_schema=feature_schema))
 
     # 自定义参数的训练模型，训练并进行交叉验证
     reg_model = RandomForestRegressor(n_estimators=10, max_features=4, bootstrap=False)
-    trainer = mytrain.TrainModel("random_model_s1", reg_model, train_prepared, train_label)
-    trainer.train_model()
+    trainers.append(mytrain.TrainModel("random_model_s1", reg_model, train_prepared, train_label,
+                                       full_pipeline=full_pipeline, feature_schema=feature_schema))
 
-    # GridSearchCV 训练 （耗时1,2分钟）
+    # GridSearchCV 训练 （参数组合及交叉验证在所有CPU核上并行执行）
     param_grid = [
         {'n_estimators': [3, 10, 30], 'max_features':[2, 4, 6, 8]},
         {'bootstrap': [False], 'n_estimators':[3, 10], 'max_features':[2, 3, 4]}
     ]
-    trainer = mytrain.GridSearchModel("random_grid_1", get_default_model("randomforest"),
-                                      param_grid, train_prepared, train_label)
-    trainer.train_model()  # 若传入参数 True, 将显示所有参数组合的性能评分
+    trainers.append(mytrain.GridSearchModel("random_grid_1", get_default_model("randomforest"),
+                                            param_grid, train_prepared, train_label,
+                                            full_pipeline=full_pipeline, feature_schema=feature_schema))
+
+    # 逐次减半搜索：参数组合较多时，先用少量的树淘汰大部分组合，只有最好的组合才用全部资源训练
+    param_grid = [
+        {'n_estimators': [90], 'max_features': [2, 4, 6, 8], 'min_samples_leaf': [1, 3, 5], 'bootstrap': [True, False]}
+    ]
+    trainers.append(mytrain.HalvingSearchModel("random_halving_1", get_default_model("randomforest"),
+                                               param_grid, train_prepared, train_label, resource="n_estimators",
+                                               full_pipeline=full_pipeline, feature_schema=feature_schema))
+
+    for trainer in trainers:
+        with profiler.stage("train_" + trainer.modelname, rows=len(train_label)) as record:
+            trainer.train_model()  # GridSearchModel 若传入参数 True, 将显示所有参数组合的性能评分
+            # 交叉验证每折(或每个参数组合)的耗时
+            record["cv_fit_time"] = [float(t) for t in trainer.cv_fit_time]
+            if trainer.cv_score_time is not None:
+                record["cv_score_time"] = [float(t) for t in trainer.cv_score_time]
+
+    # 评分最好的树模型导出为紧凑格式，文件更小，装载更快，多个进程可共享
+    registry = ModelRegistry()
+    entry = registry.best_entry()
+    if entry is not None and entry["model_class"] in CompactForest.SUPPORTED_MODELS:
+        with profiler.stage("export_compact_model"):
+            export_registered_model(registry, entry, check_data=train_prepared)
 
     myprint("")
     myprint("Training and compare models complete. ")
-    myprint("All trained models are saved in folder 'trainmodels' with the same name you provided. ")
-    myprint("Please choose the best model for actual predict. Thanks ! ")
+    myprint("All trained models are registered in folder 'trainmodels' with the same name you provided. ")
+    myprint("The best scored model will be used for actual predict. Thanks ! ")
     myprint("")
 
+    # 显示各阶段的性能数据，并保存性能报告
+    print(profiler.summary_table())
+    if report_filename is not None:
+        profiler.save_json(report_filename)
+        myprint("Training profile report is saved to " + report_filename)
+
 
 def process_predict():
     """
     说明：
         当已经训练好模型后， 利用最佳模型进行预测
     """
-    # step 1 : 获取，并装载原始测试数据集 或实际待预测的数据
+    # step 1 : 装载评分最好的登记模型，及其拟合好的处理流程 (已导出紧凑格式的树模型以内存映射方式装载)
+    registry = ModelRegistry()
+    best_model, full_pipeline, entry = registry.load_best(use_compact=True)
+
+    # step 2 : 获取，并装载原始测试数据集 或实际待预测的数据
     myprint("Ready to load test data set ...")
     dataloader = myload.DataLoader()
     test_set = dataloader.load_test_set()
-
-    # 有一个问题要解决：若测试文本字段的分类数量跟训练集不一致，则会造成特征列个数不同的情况，需要考虑如何处理
-    # 在大数据情况下没有关系，若只取几十条，或单条进行预测，会引起报错（待解决）
     myprint("Load test data complete.")
 
-    # step 2 : 清理数据
+    # step 3 : 清理数据
+    # 使用训练时保存的处理流程只做转换，不在测试数据上重新拟合，
+    # 这样即使只取几十条，或单条进行预测，特征列也与训练集一致
     myprint("Ready to prepare Data ... ")
     preparer = myprepare.PrepareData(test_set)
-    preparer.prepare_data()
+    preparer.full_pipeline = full_pipeline
+    preparer.transform_data()
     test_prepared = preparer.train_prepared
     test_label = preparer.train_label
     myprint("Prepare data complete.")
 
-    # step 3 : 用最好的训练模型进行预测
+    # step 4 : 用最好的训练模型进行预测
     myprint("Ready to predict.")
-    best_model_name = 'random_grid_1'
-    trainer = mytrain.TrainModel(best_model_name)
+    trainer = mytrain.TrainModel(entry["name"], best_model)
     test_pred, test_rmse_score = trainer.predict(test_prepared, test_label)
     myprint("Predict complete.")
     myprint("")
 
     myprint("Show or use predict result : ")
-    # step 4 : 使用预测结果，供后续系统使用
+    # step 5 : 使用预测结果，供后续系统使用
     print(np.c_[test_label[:20], test_pred[:20]])
     print(np.c_[test_prepared[:5], test_label[:5], test_pred[:5]])
 
 
+def process_update_model(modelname, new_set):
+    """
+    说明：
+        用新增的数据增量更新已登记的模型(线性模型 / 随机森林)，登记为新版本，并报告 RMSE 的变化
+    输入：
+        modelname:(string) - 已登记的模型名称，如 "lin_model_1", "random_model_1"
+        new_set:(pandas.DataFrame) - 新增的数据，含标签列
+    输出:
+        entry:(dict) - 清单中新版本的记录
+    """
+    registry = ModelRegistry()
+    entry = registry.latest_entry(modelname)
+    if entry is None:
+        raise ValueError("Model %s is not registered, please train it first." % modelname)
+
+    # 使用该模型登记的处理流程转换新数据，特征列与训练时一致
+    _, full_pipeline = registry.load_entry(entry)
+    preparer = myprepare.PrepareData(new_set)
+    preparer.full_pipeline = full_pipeline
+    preparer.transform_data()
+
+    trainer = mytrain.TrainModel(modelname, registry=registry)
+    return trainer.update_model(preparer.train_prepared, preparer.train_label)
+
+
 if __name__ == "__main__":
     # 训练模型
     process_training_model()
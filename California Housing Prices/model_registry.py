@@ -0,0 +1,278 @@
+# -*- coding:utf-8 -*-
+
+# ******************************************************************************
+# 模块说明 ：训练模型的版本管理
+#            ModelRegistry() - 每次保存模型都生成一个新版本，不覆盖已有模型，
+#                              并在清单文件 trainmodels/manifest.json 中记录模型的评分及训练信息
+#
+#            目录结构:
+#                trainmodels/manifest.json
+#                trainmodels/<模型名称>/v0001/model.pkl
+#                trainmodels/<模型名称>/v0001/pipeline.pkl
+#                trainmodels/manifest.json.lock  - 修改清单期间存在的锁文件
+#
+# 开发人员 ：Edwin.Zhang
+# 开发时间 : 2018-5-18
+# ******************************************************************************
+
+import os
+import json
+import time
+import hashlib
+from contextlib import contextmanager
+import numpy as np
+
+from compact_forest import CompactForest
+
+try:
+    import joblib
+except ImportError:  # scikit-learn 0.21 之前的版本自带 joblib
+    from sklearn.externals import joblib
+
+
+def myprint(message):
+    """
+    说明：一个小函数，为了缩减文件，使重点突出，没有加共用函数库，冗余了这段代码
+    """
+    import time
+    print(time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time())) + " : " + message)
+
+
+class ModelRegistry:
+    """
+    说明:
+        1. register() 保存模型及其拟合好的处理流程，版本号自动递增
+        2. 清单中记录: 交叉验证评分，训练耗时，训练数据指纹，特征列表
+        3. load_best() 按评分(RMSE 最小)选择模型; 已导出紧凑格式的树模型可用 use_compact=True
+           以内存映射方式装载节点数组，多个进程共享同一份物理内存
+        4. 多个进程同时登记时，版本目录用 os.makedirs 原子地占用，清单的 读取-修改-写入 在锁文件保护下进行，
+           版本号不重复，记录不丢失
+    """
+    MANIFEST_FILENAME = "manifest.json"
+    LOCK_TIMEOUT = 60           # 等待清单锁的最长时间(秒)
+    STALE_LOCK_SECONDS = 600    # 锁文件超过该时间未释放，视为持有锁的进程已异常退出
+
+    def __init__(self, path="trainmodels"):
+        """
+        输入：
+            path:(string) - 模型存放的目录
+        """
+        self.path = path
+        self.manifest_filename = os.path.join(self.path, self.MANIFEST_FILENAME)
+
+    @staticmethod
+    def data_fingerprint(train_prepared, train_label=None):
+        """
+        说明：
+            训练数据的指纹(SHA-256)，用于判断两个模型是否用相同的数据训练
+        """
+        sha256 = hashlib.sha256()
+        for data in (train_prepared, train_label):
+            if data is not None:
+                # 已是 C 连续的数组不复制，直接把内存交给摘要计算
+                data = np.ascontiguousarray(np.asarray(data))
+                sha256.update(str(data.shape).encode("utf-8"))
+                sha256.update(memoryview(data).cast("B"))
+        return sha256.hexdigest()
+
+    @staticmethod
+    def model_fingerprint(model):
+        """
+        说明：
+            模型内容的指纹(SHA-256)，未登记的模型(没有版本号)用它作为预测缓存的版本标识
+            序列化的内容直接写入摘要，不生成完整的 pickle 字节串
+        """
+        import pickle
+
+        class HashWriter:
+            def __init__(self):
+                self.sha256 = hashlib.sha256()
+
+            def write(self, data):
+                self.sha256.update(data)
+
+        writer = HashWriter()
+        pickle.Pickler(writer, protocol=4).dump(model)
+        return writer.sha256.hexdigest()
+
+    def read_manifest(self):
+        if not os.path.exists(self.manifest_filename):
+            return []
+        with open(self.manifest_filename, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def write_manifest(self, entries):
+        # 先写临时文件再改名，避免写入中断导致清单文件损坏
+        tmpname = self.manifest_filename + ".tmp"
+        with open(tmpname, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmpname, self.manifest_filename)
+
+    @contextmanager
+    def manifest_lock(self):
+        """
+        说明：
+            清单的 读取-修改-写入 期间持有的锁: 用 O_CREAT | O_EXCL 创建锁文件，Windows / Linux 都可用
+        """
+        os.makedirs(self.path, exist_ok=True)
+        lockname = self.manifest_filename + ".lock"
+        start = time.time()
+        while True:
+            try:
+                fd = os.open(lockname, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lockname) > self.STALE_LOCK_SECONDS:
+                        os.remove(lockname)
+                        continue
+                except OSError:
+                    continue  # 锁刚被释放
+                if time.time() - start > self.LOCK_TIMEOUT:
+                    raise TimeoutError("Manifest %s is locked by another process, remove %s if it is stale."
+                                       % (self.manifest_filename, lockname))
+                time.sleep(0.01)
+        try:
+            yield
+        finally:
+            os.close(fd)
+            os.remove(lockname)
+
+    def reserve_version(self, modelname):
+        """
+        说明：
+            占用一个新的版本号: 从清单中的最大版本号加 1 开始，创建版本目录，目录已存在时(其它进程正在登记)取下一个
+        输出:
+            (version, version_path)
+        """
+        version = 1 + max([e["version"] for e in self.read_manifest() if e["name"] == modelname] or [0])
+        while True:
+            version_path = os.path.join(self.path, modelname, "v%04d" % version)
+            try:
+                os.makedirs(version_path)
+                return version, version_path
+            except FileExistsError:
+                version += 1
+
+    def register(self, modelname, model, full_pipeline=None, cv_rmse=None, train_time=None,
+                 data_fingerprint=None, feature_schema=None):
+        """
+        说明：
+            保存模型的一个新版本，并登记到清单中
+        输入：
+            modelname:(string) - 模型名称
+            model:(sklearn.regressor) - 训练好的模型
+            full_pipeline:(sklearn.pipeline.FeatureUnion) - 拟合好的处理流程，预测时使用
+            cv_rmse:(float or numpy.ndarray) - 交叉验证的 RMSE 评分(每折一个值，或平均值)
+            train_time:(float) - 训练耗时(秒)
+            data_fingerprint:(string) - 训练数据指纹，见 data_fingerprint()
+            feature_schema:(list) - 模型输入的特征名称列表
+        输出:
+            entry:(dict) - 清单中该版本的记录
+        """
+        version, version_path = self.reserve_version(modelname)
+
+        # 不压缩保存，模型中普通的 numpy 数组(如线性模型的系数)装载时可以使用内存映射
+        model_file = os.path.join(version_path, "model.pkl")
+        joblib.dump(model, model_file)
+        pipeline_file = None
+        if full_pipeline is not None:
+            pipeline_file = os.path.join(version_path, "pipeline.pkl")
+            joblib.dump(full_pipeline, pipeline_file)
+
+        cv_rmse = None if cv_rmse is None else np.atleast_1d(np.asarray(cv_rmse, dtype=np.float64))
+        entry = {
+            "name": modelname,
+            "version": version,
+            "model_file": model_file,
+            "pipeline_file": pipeline_file,
+            "model_class": type(model).__name__,
+            "model_params": {k: repr(v) for k, v in model.get_params().items()} if hasattr(model, "get_params")
+            else {},
+            "cv_rmse": None if cv_rmse is None else [float(v) for v in cv_rmse],
+            "cv_rmse_mean": None if cv_rmse is None else float(cv_rmse.mean()),
+            "train_time": train_time,
+            "data_fingerprint": data_fingerprint,
+            "feature_schema": feature_schema,
+            "created": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time())),
+        }
+        # 保存模型文件后再登记，清单中的记录总是对应完整的模型文件; 保存期间不持有锁
+        with self.manifest_lock():
+            self.write_manifest(self.read_manifest() + [entry])
+        return entry
+
+    def update_entry(self, modelname, version, **fields):
+        """
+        说明：
+            更新清单中某个版本的记录，如附加的紧凑格式模型文件
+        输出:
+            entry:(dict) - 更新后的记录
+        """
+        with self.manifest_lock():
+            entries = self.read_manifest()
+            for entry in entries:
+                if entry["name"] == modelname and entry["version"] == version:
+                    entry.update(fields)
+                    self.write_manifest(entries)
+                    return entry
+        raise ValueError("Model %s v%d is not registered." % (modelname, version))
+
+    def list_versions(self, modelname=None):
+        """
+        说明：
+            列出已登记的模型版本，modelname 为 None 时列出所有模型
+        """
+        return [e for e in self.read_manifest() if modelname is None or e["name"] == modelname]
+
+    def latest_entry(self, modelname):
+        """
+        说明：
+            指定名称模型的最新版本，没有登记时返回 None
+        """
+        entries = self.list_versions(modelname)
+        return max(entries, key=lambda e: e["version"]) if entries else None
+
+    def best_entry(self, modelname=None):
+        """
+        说明：
+            交叉验证 RMSE 最小的模型版本，没有评分的版本不参与比较
+            增量更新的版本只有评估数据集上的 holdout_rmse, 与交叉验证评分不可比，也不参与比较
+        """
+        entries = [e for e in self.list_versions(modelname) if e["cv_rmse_mean"] is not None]
+        return min(entries, key=lambda e: e["cv_rmse_mean"]) if entries else None
+
+    @staticmethod
+    def load_entry(entry, mmap_mode="r", use_compact=False):
+        """
+        说明：
+            装载清单记录对应的模型及处理流程
+            mmap_mode 只对 pickle 中普通的 numpy 数组起作用; scikit-Learn 的树在反序列化时会复制
+            节点数组，随机森林 / 决策树不会被内存映射，每个进程各有一份
+            use_compact=True 且已导出紧凑格式(compact_file)时，装载 CompactForest, 节点数组按 mmap_mode
+            内存映射，多个进程装载同一文件时共享操作系统的页面缓存
+        输出:
+            (model, full_pipeline), 没有保存处理流程时 full_pipeline 为 None
+        """
+        if use_compact and entry.get("compact_file"):
+            model = CompactForest.load(entry["compact_file"], mmap_mode=mmap_mode)
+        else:
+            model = joblib.load(entry["model_file"], mmap_mode=mmap_mode)
+        full_pipeline = None
+        if entry.get("pipeline_file"):
+            full_pipeline = joblib.load(entry["pipeline_file"])
+        return model, full_pipeline
+
+    def load_best(self, modelname=None, mmap_mode="r", use_compact=False):
+        """
+        说明：
+            装载评分最好的模型，mmap_mode 及 use_compact 见 load_entry()
+        输出:
+            (model, full_pipeline, entry), 没有已登记的模型时抛出 ValueError
+        """
+        entry = self.best_entry(modelname)
+        if entry is None:
+            raise ValueError("There is no registered model in folder '%s', please train models first." % self.path)
+        model, full_pipeline = self.load_entry(entry, mmap_mode, use_compact)
+        myprint("Load best model %s v%d : Mean RMSE Score = %f" % (entry["name"], entry["version"],
+                                                                   entry["cv_rmse_mean"]))
+        return model, full_pipeline, entry
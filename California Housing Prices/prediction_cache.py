@@ -0,0 +1,169 @@
+# -*- coding:utf-8 -*-
+
+# ******************************************************************************
+# 模块说明 ：预测结果缓存
+#            PredictionCache() - 以转换后特征行的哈希值为键，缓存模型的预测结果 (LRU + TTL)，
+#                                相同的特征行再次预测时不再调用 model.predict()
+#
+#            用法:
+#                cache = PredictionCache(max_bytes=64 * 1024 * 1024, ttl=3600)
+#                trainer.predict(test_prepared, cache=cache)
+#                Predictor(cache=cache).predict_many(records)
+#                cache.stats()
+#
+# 开发人员 ：Edwin.Zhang
+# 开发时间 : 2018-5-18
+# ******************************************************************************
+
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+def myprint(message):
+    """
+    说明：一个小函数，为了缩减文件，使重点突出，没有加共用函数库，冗余了这段代码
+    """
+    import time
+    print(time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time())) + " : " + message)
+
+
+class PredictionCache:
+    """
+    说明:
+        1. 键为特征行(float64)字节内容的 BLAKE2b 摘要，与进程，运行次数无关
+        2. 超过 max_bytes 时淘汰最久未使用的记录，超过 ttl 秒的记录视为过期
+        3. 缓存记录所属的模型版本改变时(重新训练，增量更新)，清空缓存;
+           版本标识必须能区分模型内容，如 (模型名称, 登记的版本号)，未登记的模型用 ModelRegistry.model_fingerprint()
+        4. 预测可能在线程池中执行(ScoringServer)，所有操作加锁，
+           版本检查与查找，版本检查与写入分别在同一次加锁中完成，不会把旧版本模型的结果写入新版本的缓存
+    """
+    # 每条记录的内存估算(字节): 16 字节摘要的 bytes 对象，结果及过期时间，OrderedDict 的链表节点和哈希表槽位
+    ENTRY_BYTES = 256
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=None, clock=time.time):
+        """
+        输入：
+            max_bytes:(int) - 缓存占用内存的上限(估算值)
+            ttl:(float) - 记录的有效时间(秒)，None 为不过期
+            clock:(callable) - 返回当前时间(秒)的函数，计算过期时间时使用，测试时可替换
+        """
+        self.max_entries = max(1, max_bytes // self.ENTRY_BYTES)
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.version = None
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def row_keys(prepared):
+        """
+        说明：
+            每个特征行的哈希键，-0.0 与 0.0 视为相同
+        """
+        prepared = np.ascontiguousarray(prepared, dtype=np.float64) + 0.0
+        return [hashlib.blake2b(row.tobytes(), digest_size=16).digest() for row in prepared]
+
+    def check_version(self, version):
+        """
+        说明：
+            模型版本与缓存记录的版本不同时清空缓存
+        输入：
+            version - 模型版本标识，如 (模型名称, 版本号)，不能为 None, 版本号部分也不能为 None
+        """
+        with self.lock:
+            self._check_version(version)
+
+    def _check_version(self, version):
+        # 调用者已持有 self.lock
+        if version is None or (isinstance(version, tuple) and version[-1] is None):
+            raise ValueError("A model version is required for the prediction cache, got %r. "
+                             "Use the registered version or ModelRegistry.model_fingerprint()." % (version,))
+        if version != self.version:
+            if self.entries:
+                self.invalidations += 1
+                myprint("Prediction cache is cleared, model version %s -> %s" % (self.version, version))
+            self.entries.clear()
+            self.version = version
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def predict(self, model, prepared, version):
+        """
+        说明：
+            先查缓存，未命中的行合并后只调用一次 model.predict()，结果写入缓存
+        输入：
+            model - 有 predict() 方法的模型
+            prepared:(numpy.ndarray) - 转换后的特征矩阵
+            version - 模型版本标识，见 check_version()，不能为 None
+        输出:
+            predictions:(numpy.ndarray)
+        """
+        prepared = np.asarray(prepared)
+        if prepared.ndim == 1:
+            prepared = prepared.reshape(1, -1)
+        keys = self.row_keys(prepared)
+        predictions = np.empty(len(keys), dtype=np.float64)
+        missing = []
+
+        now = self.clock()
+        with self.lock:
+            self._check_version(version)
+            for i, key in enumerate(keys):
+                entry = self.entries.get(key)
+                if entry is not None and entry[1] is not None and entry[1] < now:
+                    del self.entries[key]
+                    self.expirations += 1
+                    entry = None
+                if entry is None:
+                    missing.append(i)
+                else:
+                    self.entries.move_to_end(key)
+                    predictions[i] = entry[0]
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            predictions[missing] = model.predict(prepared[missing])
+            expires = None if self.ttl is None else self.clock() + self.ttl
+            with self.lock:
+                if version != self.version:
+                    # 预测期间已切换到其它版本的模型，这些结果不再写入缓存
+                    return predictions
+                for i in missing:
+                    self.entries[keys[i]] = (float(predictions[i]), expires)
+                    self.entries.move_to_end(keys[i])
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+                    self.evictions += 1
+        return predictions
+
+    def stats(self):
+        """
+        输出:
+            stats:(dict) - 命中 / 未命中次数，命中率，记录数，估算的内存占用等
+        """
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else None,
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "approx_bytes": len(self.entries) * self.ENTRY_BYTES,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "version": None if self.version is None else str(self.version),
+            }
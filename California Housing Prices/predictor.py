@@ -0,0 +1,206 @@
+# -*- coding:utf-8 -*-
+
+# ******************************************************************************
+# 模块说明 ：常驻内存的低延迟预测接口
+#            Predictor() - 一次装载模型和拟合好的处理流程，提供单条 / 多条记录的预测
+#
+#            用法:
+#                predictor = Predictor()     # 或 Predictor("random_grid_1"), 缺省使用评分最好的登记模型
+#                predictor.predict_one({"longitude": -122.23, "latitude": 37.88, ..., "ocean_proximity": "NEAR BAY"})
+#                predictor.predict_many([record1, record2, ...])
+#                Predictor(cache=PredictionCache())  # 重复的记录直接返回缓存的预测结果
+#
+# 开发人员 ：Edwin.Zhang
+# 开发时间 : 2018-5-18
+# ******************************************************************************
+
+import numpy as np
+
+try:
+    import joblib
+except ImportError:  # scikit-learn 0.21 之前的版本自带 joblib
+    from sklearn.externals import joblib
+
+import prepare_data as myprepare
+import train_model as mytrain
+from model_registry import ModelRegistry
+
+
+def myprint(message):
+    """
+    说明：一个小函数，为了缩减文件，使重点突出，没有加共用函数库，冗余了这段代码
+    """
+    import time
+    print(time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time())) + " : " + message)
+
+
+class Predictor:
+    """
+    说明:
+        1. 初始化时装载一次模型和处理流程，之后常驻内存，每次调用不再读取 pickle 文件
+        2. 从拟合好的 full_pipeline 中取出 中位数，缩放参数，分类列表，直接用 numpy 完成转换，
+           不构造 pandas.DataFrame, 与 full_pipeline.transform() 的结果一致
+        3. 多条记录一次性组成矩阵，只调用一次 model.predict()
+    """
+    def __init__(self, modelname=None, pipeline_filename=None, model=None, full_pipeline=None, registry=None,
+                 use_compact=True, entry=None, cache=None):
+        """
+        输入：
+            modelname:(string) - 训练时保存的模型名称，装载其最新版本; 为 None 时装载评分最好的登记模型
+            pipeline_filename:(string) - 模型没有登记处理流程时使用的文件，缺省为 PrepareData.PIPELINE_FILENAME
+            model:(sklearn.regressor) - 已装载的模型，若提供，则不再从文件装载
+            full_pipeline:(sklearn.pipeline.FeatureUnion) - 已拟合的处理流程，若提供，则不再从文件装载
+            registry:(ModelRegistry) - 模型版本管理，缺省为 trainmodels 目录
+            use_compact:(bool) - 登记的模型已导出紧凑格式(CompactForest)时，使用紧凑格式预测
+            entry:(dict) - 清单中的模型记录，若提供，则装载该版本，忽略 modelname
+            cache:(PredictionCache) - 预测结果缓存，相同的特征行不再调用 model.predict()
+        """
+        registry = registry if registry is not None else ModelRegistry()
+        self.version = None
+        if model is None:
+            if entry is None:
+                entry = registry.best_entry() if modelname is None else registry.latest_entry(modelname)
+            registered_pipeline = None
+            if entry is not None:
+                modelname, self.version = entry["name"], entry["version"]
+                # 紧凑格式以内存映射方式打开，不需要反序列化整个模型
+                model, registered_pipeline = registry.load_entry(entry, use_compact=use_compact)
+            elif modelname is not None:
+                # 未登记的旧格式模型文件
+                trainer = mytrain.TrainModel(modelname, registry=registry)
+                trainer.load_model()
+                model = trainer.model
+            if full_pipeline is None:
+                full_pipeline = registered_pipeline
+        if model is None:
+            raise ValueError("Model '%s' is not found, please train it first." % modelname)
+        self.modelname = modelname
+        self.model = model
+        self.cache = cache
+        # 预测缓存的版本标识，直接传入的未登记模型用模型内容的指纹，见 TrainModel.cache_version()
+        self.cache_version = None
+        if cache is not None:
+            self.cache_version = (modelname, self.version if self.version is not None else
+                                  "sha256:" + ModelRegistry.model_fingerprint(model))
+
+        if full_pipeline is None:
+            if pipeline_filename is None:
+                pipeline_filename = myprepare.PrepareData.PIPELINE_FILENAME
+            full_pipeline = joblib.load(pipeline_filename)
+        self.full_pipeline = full_pipeline
+
+        self.load_pipeline_params()
+
+    def load_pipeline_params(self):
+        """
+        说明：
+            从 full_pipeline 中取出转换所需的参数，结构与 PrepareData.build_pipeline() 一致
+        """
+        transformers = dict(self.full_pipeline.transformer_list)
+        num_steps = transformers["num_pipeline"].named_steps
+        cat_steps = transformers["cat_pipeline"].named_steps
+
+        self.num_attribs = list(num_steps["selector"].attribute_names)
+        self.statistics = np.asarray(num_steps["imputer"].statistics_, dtype=np.float64)
+        self.attribs_adder = num_steps["attribs_adder"]
+        scaler = num_steps["std_scaler"]
+        self.scale_mean = scaler.mean_ if scaler.with_mean else None
+        self.scale_std = scaler.scale_ if scaler.with_std else None
+
+        self.cat_attrib = cat_steps["selector"].attribute_names[0]
+        classes = list(cat_steps["label_binarizer"].classes_)
+        self.cat_index = {c: i for i, c in enumerate(classes)}
+        # LabelBinarizer 对 2 个分类只输出 1 列
+        self.cat_columns = 1 if len(classes) == 2 else len(classes)
+
+    def validate(self, records):
+        """
+        说明：
+            检查并转换记录中的属性值，服务端在记录进入批次之前调用，一条错误的记录不影响同一批次的其它请求
+        输入：
+            records:(list of dict)
+        输出:
+            records:(list of dict) - 数值属性转换为 float (None 为缺失值), 分类属性为字符串或缺失
+            不能转换时抛出 ValueError
+        """
+        checked = []
+        for i, record in enumerate(records):
+            record = dict(record)
+            for name in self.num_attribs:
+                value = record.get(name)
+                if value is None:
+                    record.pop(name, None)
+                    continue
+                if isinstance(value, bool):
+                    raise ValueError("record %d : '%s' must be a number, got %r" % (i, name, value))
+                try:
+                    record[name] = float(value)
+                except (TypeError, ValueError):
+                    raise ValueError("record %d : '%s' must be a number, got %r" % (i, name, value))
+            value = record.get(self.cat_attrib)
+            if value is not None and not isinstance(value, str):
+                raise ValueError("record %d : '%s' must be a string, got %r" % (i, self.cat_attrib, value))
+            checked.append(record)
+        return checked
+
+    def prepare(self, records):
+        """
+        说明：
+            将多条记录转换为模型输入的特征矩阵
+        输入：
+            records:(list of dict) - 每条记录为 {属性名: 值}, 缺失的数值属性用训练集中位数填充
+        输出:
+            prepared:(numpy.ndarray) - 与 full_pipeline.transform() 结果相同的特征矩阵
+        """
+        n = len(records)
+
+        # 数值型特征: 缺失值填充 -> 组合特征 -> 缩放 (原地计算)
+        num = np.array([[record.get(name, np.nan) for name in self.num_attribs] for record in records],
+                       dtype=np.float64).reshape(n, len(self.num_attribs))
+        missing = np.isnan(num)
+        if missing.any():
+            num[missing] = self.statistics[np.nonzero(missing)[1]]
+        num = self.attribs_adder.transform(num)
+        if self.scale_mean is not None:
+            num -= self.scale_mean
+        if self.scale_std is not None:
+            num /= self.scale_std
+
+        # 分类型特征: one-hot, 未出现过的分类全部为 0 (与 LabelBinarizer 一致)
+        prepared = np.zeros((n, num.shape[1] + self.cat_columns), dtype=np.float64)
+        prepared[:, :num.shape[1]] = num
+        for i, record in enumerate(records):
+            j = self.cat_index.get(record.get(self.cat_attrib))
+            if j is None:
+                continue
+            if self.cat_columns == 1:
+                prepared[i, -1] = j
+            else:
+                prepared[i, num.shape[1] + j] = 1.0
+        return prepared
+
+    def predict_many(self, records):
+        """
+        说明：
+            多条记录一次性预测
+        输入：
+            records:(list of dict)
+        输出:
+            predictions:(numpy.ndarray)
+        """
+        if len(records) == 0:
+            return np.empty(0, dtype=np.float64)
+        if self.cache is not None:
+            return self.cache.predict(self.model, self.prepare(records), self.cache_version)
+        return self.model.predict(self.prepare(records))
+
+    def predict_one(self, record):
+        """
+        说明：
+            单条记录预测
+        输入：
+            record:(dict)
+        输出:
+            prediction:(float)
+        """
+        return float(self.predict_many([record])[0])
@@ -2,6 +2,9 @@
 
 # ******************************************************************************
 # 模块说明 ：清理数据
+#            PrepareData()            - 在内存中拟合处理流程，并清理数据集
+#            IncrementalPrepareData() - 分块读取数据集，两遍扫描拟合相同的处理流程，适用于超过内存大小的数据集
+#            QuantileSketch()         - 可合并的分位数摘要，分块估计中位数
 #
 # 开发人员 ：Edwin.Zhang
 # 开发时间 : 2018-5-18
@@ -14,6 +17,14 @@ from sklearn.preprocessing import LabelBinarizer
 from sklearn.preprocessing import StandardScaler
 from sklearn.base import BaseEstimator, TransformerMixin
 import numpy as np
+import scipy.sparse
+import copy
+import os
+
+try:
+    import joblib
+except ImportError:  # scikit-learn 0.21 之前的版本自带 joblib
+    from sklearn.externals import joblib
 
 
 def myprint(message):
@@ -48,6 +59,7 @@ class LabelBinarizer_ForPipeline(LabelBinarizer):
     """
     def fit(self, X, y=None):
         super(LabelBinarizer_ForPipeline, self).fit(X)
+        return self
 
     def transform(self, X, y=None):
         return super(LabelBinarizer_ForPipeline, self).transform(X)
@@ -55,6 +67,15 @@ class LabelBinarizer_ForPipeline(LabelBinarizer):
     def fit_transform(self, X, y=None):
         return super(LabelBinarizer_ForPipeline, self).fit(X).transform(X)
 
+    def transform_as(self, X, sparse_output):
+        """
+        说明：
+            按指定的输出格式转换，不修改自身的 sparse_output, 多个线程共用同一个已拟合的对象时也是安全的
+        """
+        binarizer = copy.copy(self)
+        binarizer.sparse_output = sparse_output
+        return binarizer.transform(X)
+
 
 class FeatureAdder(BaseEstimator, TransformerMixin):
     """
@@ -62,6 +83,7 @@ class FeatureAdder(BaseEstimator, TransformerMixin):
         自定义增加特征属性的转换器，用于在 DataFrame 数据集中，增加，删除字段
         在DataFrame类型下进行处理，可使用列名。
         这里只做演示用，没有实际意义
+        已不在 build_pipeline() 中使用，保留该类是为了能装载旧版本保存的处理流程
     """
     def __init__(self):
         pass
@@ -81,6 +103,7 @@ class FeatureDeleter(BaseEstimator, TransformerMixin):
         自定义增加特征属性的转换器，用于在 DataFrame 数据集中，增加，删除字段
         在DataFrame类型下进行处理，可使用列名。
         这里只做演示用，没有实际意义
+        已不在 build_pipeline() 中使用，保留该类是为了能装载旧版本保存的处理流程
     """
     def __init__(self):
         pass
@@ -99,45 +122,150 @@ class CombinedAttributesAdder(BaseEstimator, TransformerMixin):
     说明：
         自定义增加特征属性的转换器，因为在 DataFrameSelector 后，上一步骤传过来的已经是 ndarray
         因此，需要用 index, 已经没有 column name 了
+        输出矩阵一次分配，组合特征用 out= 直接写入输出矩阵的列，不再用 np.c_ 复制整个矩阵;
+        分母为 0 时组合特征取 0, 不产生 inf
     """
     rooms_ix = 3
     bedrooms_ix = 4
     population_ix = 5
     household_ix = 6
 
-    def __init__(self, add_bedrooms_per_room=True):
+    def __init__(self, add_bedrooms_per_room=True, dtype=np.float64):
+        """
+        输入：
+            add_bedrooms_per_room:(bool) - 是否增加 bedrooms_per_room 特征
+            dtype:(numpy.dtype) - 输出矩阵的类型，np.float32 可使内存占用减半
+        """
         self.add_bedrooms_per_room = add_bedrooms_per_room
+        self.dtype = dtype
 
     def fit(self, X, y=None):
         return self
 
     def transform(self, X, y=None):
-        rooms_per_household = X[:, self.rooms_ix] / X[:, self.household_ix]
-        population_per_household = X[:, self.population_ix] / X[:, self.household_ix]
+        ratios = [(self.rooms_ix, self.household_ix), (self.population_ix, self.household_ix)]
         if self.add_bedrooms_per_room:
-            bedrooms_per_room = X[:, self.bedrooms_ix] / X[:, self.rooms_ix]
-            return np.c_[X, rooms_per_household, population_per_household, bedrooms_per_room]
-        else:
-            return np.c_[X, rooms_per_household, population_per_household]
+            ratios.append((self.bedrooms_ix, self.rooms_ix))
+
+        n_rows, n_cols = X.shape
+        # 旧版本保存的处理流程中没有 dtype 属性
+        out = np.empty((n_rows, n_cols + len(ratios)), dtype=getattr(self, "dtype", np.float64))
+        out[:, :n_cols] = X
+        for j, (numerator_ix, denominator_ix) in enumerate(ratios):
+            column = out[:, n_cols + j]
+            column.fill(0)
+            np.divide(out[:, numerator_ix], out[:, denominator_ix], out=column, where=out[:, denominator_ix] != 0)
+        return out
+
+
+class QuantileSketch:
+    """
+    说明：
+        可合并的分位数摘要，用于分块估计中位数
+        1. 保存 (取值, 权重) 序列，相同的取值合并为一个，权重为出现次数
+        2. 不同取值超过 max_size 个时，按累计权重分为 max_size 段，每段用加权平均值代替，权重为该段的总和
+        3. 没有发生压缩时，quantile() 与 numpy.median / numpy.percentile(线性插值) 的结果完全一致
+    """
+    DEFAULT_SIZE = 50000
+
+    def __init__(self, max_size=DEFAULT_SIZE):
+        self.max_size = max_size
+        self.values = np.empty(0, dtype=np.float64)
+        self.weights = np.empty(0, dtype=np.float64)
+
+    @property
+    def count(self):
+        return float(self.weights.sum())
+
+    def update(self, values):
+        """
+        说明：
+            加入一批数据，缺失值(NaN)被忽略，与 Imputer 计算中位数时一致
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values, weights = np.unique(values[~np.isnan(values)], return_counts=True)
+        self._merge(values, weights.astype(np.float64))
+        return self
+
+    def merge(self, other):
+        """
+        说明：
+            合并另一个摘要，如在其它进程中处理的数据块的摘要
+        """
+        self._merge(other.values, other.weights)
+        return self
+
+    def _merge(self, values, weights):
+        values = np.concatenate([self.values, values])
+        weights = np.concatenate([self.weights, weights])
+        values, inverse = np.unique(values, return_inverse=True)
+        weights = np.bincount(inverse.ravel(), weights=weights, minlength=len(values))
+
+        if len(values) > self.max_size:
+            # 按累计权重的中点分段，每段的取值在排序后连续
+            cumulative = np.cumsum(weights)
+            bucket = np.minimum((cumulative - weights / 2) / cumulative[-1] * self.max_size,
+                                self.max_size - 1).astype(np.int64)
+            starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+            bucket_weights = np.add.reduceat(weights, starts)
+            values = np.add.reduceat(values * weights, starts) / bucket_weights
+            weights = bucket_weights
+        self.values, self.weights = values, weights
+
+    def quantile(self, q):
+        """
+        说明：
+            分位数，按排序后的位置 q * (n - 1) 线性插值，没有数据时返回 NaN
+        """
+        if len(self.values) == 0:
+            return np.nan
+        cumulative = np.cumsum(self.weights)
+        position = q * (cumulative[-1] - 1)
+        lower, upper = np.floor(position), np.ceil(position)
+        # 排序后第 k 个位置(从 0 开始)的取值，是第一个累计权重大于 k 的取值
+        index = np.searchsorted(cumulative, [lower, upper], side="right")
+        index = np.minimum(index, len(self.values) - 1)
+        value_lower, value_upper = self.values[index]
+        return float(value_lower + (value_upper - value_lower) * (position - lower))
+
+    def median(self):
+        return self.quantile(0.5)
 
 
 class PrepareData:
     """
     说明:
         利用 scikit-Learn 提供的 Pipeline机制 ，将数据清理过程流程化
+        训练时 prepare_data() 拟合并保存 full_pipeline; 预测时 load_pipeline() + transform_data() 只做转换，
+        保证预测数据与训练数据的特征列完全一致
+        num_pipeline 与 cat_pipeline 在线程中并行执行，结果直接写入一次分配的输出矩阵;
+        分类型特征可输出稀疏矩阵，只在最后合并时展开
+        full_pipeline 本身总是输出 numpy.ndarray (保存的文件，登记的模型，Predictor 直接调用 transform() 时),
+        稀疏矩阵只在 run_pipeline() 内部使用
     """
-    def __init__(self, train_set):
+    PIPELINE_FILENAME = os.path.join("trainmodels", "full_pipeline.pkl")
+
+    def __init__(self, train_set, dtype=np.float64, n_jobs=-1, sparse_output=True):
         """
         输入：
-            train_set:(pandas.DataFrame)
+            train_set:(pandas.DataFrame) - 可以不含标签列(实际待预测的数据)，此时 train_label 为 None
+            dtype:(numpy.dtype) - train_prepared 的类型，np.float32 可使内存占用减半
+            n_jobs:(int) - num_pipeline 与 cat_pipeline 并行执行的线程数，1 为顺序执行
+            sparse_output:(bool) - run_pipeline() 内部分类型特征的 one-hot 编码输出稀疏矩阵，分类很多时节省内存和时间;
+                                   保存的 full_pipeline 不受影响，transform() 总是输出 numpy.ndarray
         """
         self.train_set = train_set.copy()
+        self.dtype = dtype
+        self.n_jobs = n_jobs
+        self.sparse_output = sparse_output
 
         # train_label 标签列，是向量，pandas.Series
-        self.train_label = self.train_set["median_house_value"]
+        self.train_label = None
+        if "median_house_value" in self.train_set:
+            self.train_label = self.train_set["median_house_value"]
 
         # train 训练集不含标签列, pandas.DataFrame
-        self.train = self.train_set.drop("median_house_value", axis=1)
+        self.train = self.train_set.drop("median_house_value", axis=1, errors="ignore")
 
         # train_cat 为字符型特征集，pandas.DataFrame, 属性名必须以列表形式提供
         self.train_cat = self.train[["ocean_proximity"]]
@@ -145,27 +273,26 @@ class PrepareData:
         # train_num 为数值性特征集，是 pandas.DataFrame
         self.train_num = self.train.drop("ocean_proximity", axis=1)
 
+        self.full_pipeline = None
         self.train_prepared = None
 
-    def prepare_data(self):
+    def build_pipeline(self):
         """
         说明：
-            将所有清理操作按pipeline串起来进行流程化处理
+            将所有清理操作按pipeline串起来
             必须很清楚它的上一步骤传入的数据内容和类型，因为整个流程是我们自己设计的
         输出:
-            返回清理好的数据集 train_prepared : (numpy.ndarray), 将输入给模型进行训练
+            full_pipeline:(sklearn.pipeline.FeatureUnion) - 未拟合的处理流程
         """
         num_attribs = list(self.train_num)  # 需要输入模型的特征值列表，用在 DataFrameSelector() 中，
         cat_attribs = list(self.train_cat)
 
         # 数值型特征属性的处理流程
         num_pipeline = Pipeline([
-            ('adder', FeatureAdder()),                     # process_add_newfeature (just for demo)
-            ('deleter', FeatureDeleter()),                 # process_deleter_notusedfeature (just for demo)
             ('selector', DataFrameSelector(num_attribs)),  # change from pandas.DataFrame to numpy.ndarry
             ('imputer', Imputer(strategy="median")),       # process_missing_feature
-            ('attribs_adder', CombinedAttributesAdder()),  # process_combined_feature
-            ('std_scaler', StandardScaler()),              # process_scaling_feature
+            ('attribs_adder', CombinedAttributesAdder(dtype=self.dtype)),  # process_combined_feature
+            ('std_scaler', StandardScaler(copy=False)),    # process_scaling_feature (in place)
         ])
 
         # 分类型特征属性的处理流程
@@ -175,12 +302,255 @@ class PrepareData:
         ])
 
         # 总的处理流程
+        # 保存后预测时直接调用 full_pipeline.transform(), 不设 n_jobs, 避免每次转换都启动进程池;
+        # 训练时的并行由 run_pipeline() 在线程中执行
         full_pipeline = FeatureUnion(transformer_list=[
             ("num_pipeline", num_pipeline),
             ("cat_pipeline", cat_pipeline),
-        ])
+        ], n_jobs=None)
+        return full_pipeline
 
+    def run_pipeline(self, X, fit=False, dense=True):
+        """
+        说明：
+            在线程中并行执行 full_pipeline 的各个分支，并合并结果
+            不使用 FeatureUnion 的 hstack: 分类型特征为稀疏矩阵时，hstack 会把数值型特征也转换为稀疏矩阵
+        输入：
+            X:(pandas.DataFrame) - 不含标签列的数据集
+            fit:(bool) - True : 拟合并转换; False : 只做转换
+            dense:(bool) - True : 返回 numpy.ndarray; False : 返回 scipy.sparse.csr_matrix
+        输出:
+            prepared:(numpy.ndarray or scipy.sparse.csr_matrix)
+        """
+        def run(name, transformer):
+            if name == "cat_pipeline":
+                return self.run_cat_pipeline(transformer, X, fit)
+            return transformer.fit_transform(X) if fit else transformer.transform(X)
+
+        blocks = joblib.Parallel(n_jobs=self.n_jobs, backend="threading")(
+            joblib.delayed(run)(name, transformer) for name, transformer in self.full_pipeline.transformer_list)
+        return self.stack_features(blocks, dense)
+
+    def run_cat_pipeline(self, cat_pipeline, X, fit=False):
+        """
+        说明：
+            执行分类型特征的处理流程，按 self.sparse_output 输出稀疏矩阵或 numpy.ndarray,
+            不改变 full_pipeline 中保存的输出格式
+        """
+        steps = cat_pipeline.named_steps
+        values = steps["selector"].transform(X)
+        if fit:
+            steps["label_binarizer"].fit(values)
+        return steps["label_binarizer"].transform_as(values, self.sparse_output)
+
+    def stack_features(self, blocks, dense=True):
+        """
+        说明：
+            按列合并各分支的结果，dense 时只分配一次输出矩阵，稀疏块直接按非零元素写入
+        """
+        if not dense:
+            return scipy.sparse.hstack([scipy.sparse.csr_matrix(block) for block in blocks], format="csr",
+                                       dtype=self.dtype)
+
+        n_rows = blocks[0].shape[0]
+        prepared = np.empty((n_rows, sum(block.shape[1] for block in blocks)), dtype=self.dtype)
+        start = 0
+        for block in blocks:
+            end = start + block.shape[1]
+            if scipy.sparse.issparse(block):
+                block = block.tocoo()
+                prepared[:, start:end] = 0
+                prepared[block.row, start + block.col] = block.data
+            else:
+                prepared[:, start:end] = block
+            start = end
+        return prepared
+
+    def prepare_data(self, dense=True):
+        """
+        说明：
+            拟合处理流程，并对训练数据集进行清理
+        输入：
+            dense:(bool) - False 时返回稀疏矩阵，供支持稀疏输入的模型使用
+        输出:
+            返回清理好的数据集 train_prepared : (numpy.ndarray), 将输入给模型进行训练
+        """
         # 执行操作，对传入的数据集按流程依次进行清理，返回清理后的数据集
         # 初始传入的数据为 self.train : (pandas.DataFrame)
-        self.train_prepared = full_pipeline.fit_transform(self.train)
+        self.full_pipeline = self.build_pipeline()
+        self.train_prepared = self.run_pipeline(self.train, fit=True, dense=dense)
+        return self.train_prepared
+
+    def transform_data(self, dense=True):
+        """
+        说明：
+            用已拟合的处理流程(训练集上的中位数，缩放参数，分类列表)转换数据，不重新拟合，
+            单条或少量数据预测时，特征列与训练时保持一致
+        输出:
+            返回清理好的数据集 train_prepared : (numpy.ndarray)
+        """
+        if self.full_pipeline is None:
+            self.load_pipeline()
+        self.train_prepared = self.run_pipeline(self.train, dense=dense)
+        return self.train_prepared
+
+    def feature_names(self):
+        """
+        说明：
+            拟合后的处理流程输出的特征名称列表，与 train_prepared 的列一一对应，随模型一起登记
+        """
+        transformers = dict(self.full_pipeline.transformer_list)
+        num_steps = transformers["num_pipeline"].named_steps
+        names = list(num_steps["selector"].attribute_names)
+        names += ["rooms_per_household", "population_per_household"]
+        if num_steps["attribs_adder"].add_bedrooms_per_room:
+            names += ["bedrooms_per_room"]
+
+        cat_steps = transformers["cat_pipeline"].named_steps
+        cat_attrib = cat_steps["selector"].attribute_names[0]
+        classes = list(cat_steps["label_binarizer"].classes_)
+        if len(classes) == 2:
+            names += [cat_attrib + "=" + str(classes[1])]
+        else:
+            names += [cat_attrib + "=" + str(c) for c in classes]
+        return names
+
+    def save_pipeline(self, filename=None):
+        """
+        说明：
+            保存拟合好的处理流程，与训练模型一起存放在 trainmodels 目录中
+        """
+        if filename is None:
+            filename = self.PIPELINE_FILENAME
+        path = os.path.dirname(filename)
+        if path != "" and not os.path.exists(path):
+            os.makedirs(path)
+        joblib.dump(self.full_pipeline, filename)
+
+    def load_pipeline(self, filename=None):
+        """
+        说明：
+            装载训练时保存的处理流程
+        """
+        if filename is None:
+            filename = self.PIPELINE_FILENAME
+        self.full_pipeline = joblib.load(filename)
+        return self.full_pipeline
+
+
+class IncrementalPrepareData(PrepareData):
+    """
+    说明:
+        分块读取数据集，拟合与 PrepareData.prepare_data() 相同结构的处理流程，内存占用只与块大小有关
+        第 1 遍: 用 QuantileSketch 估计数值型特征的中位数，收集分类型特征的所有分类
+        第 2 遍: 用中位数填充缺失值，增加组合特征后，用 StandardScaler.partial_fit() 累计缩放参数
+        拟合好的 full_pipeline 可以像 PrepareData 的一样保存，登记，用于预测
+
+        用法:
+            preparer = IncrementalPrepareData.from_csv(os.path.join("datasets", "train_set.csv"), chunksize=100000)
+            preparer.fit_pipeline()
+            preparer.save_pipeline()
+            for prepared, label in preparer.transform_chunks():
+                ...
+    """
+    def __init__(self, chunks, dtype=np.float64, sketch_size=QuantileSketch.DEFAULT_SIZE, **kwargs):
+        """
+        输入：
+            chunks:(callable) - 每次调用返回一个新的数据块迭代器(pandas.DataFrame)，
+                                如 lambda: pandas.read_csv(filename, chunksize=100000), 每遍扫描调用一次
+            dtype:(numpy.dtype) - 数值型特征的输出类型，见 PrepareData
+            sketch_size:(int) - 每个数值型特征的分位数摘要大小，见 QuantileSketch
+            kwargs - n_jobs, sparse_output, 见 PrepareData
+        """
+        self.chunks = chunks
+        self.sketch_size = sketch_size
+        # 只用第一个数据块的列名初始化，不保存数据
+        first_chunk = next(iter(self.chunks()))
+        super(IncrementalPrepareData, self).__init__(first_chunk.iloc[:0], dtype=dtype, **kwargs)
+
+    @classmethod
+    def from_csv(cls, filename, chunksize=100000, **kwargs):
+        """
+        说明：
+            分块读取 CSV 数据集
+        """
+        import pandas as pd
+        return cls(lambda: pd.read_csv(filename, chunksize=chunksize), **kwargs)
+
+    def fit_pipeline(self):
+        """
+        说明：
+            两遍扫描数据集，拟合处理流程
+        输出:
+            full_pipeline:(sklearn.pipeline.FeatureUnion) - 拟合好的处理流程
+        """
+        full_pipeline = self.build_pipeline()
+        transformers = dict(full_pipeline.transformer_list)
+        num_steps = transformers["num_pipeline"].named_steps
+        cat_steps = transformers["cat_pipeline"].named_steps
+        num_attribs = num_steps["selector"].attribute_names
+        cat_attrib = cat_steps["selector"].attribute_names[0]
+
+        # 第 1 遍: 中位数，分类列表
+        sketches = [QuantileSketch(self.sketch_size) for _ in num_attribs]
+        classes = set()
+        n_chunks, n_rows = 0, 0
+        for chunk in self.chunks():
+            num = chunk[num_attribs].values
+            for j, sketch in enumerate(sketches):
+                sketch.update(num[:, j])
+            classes.update(chunk[cat_attrib].dropna().unique())
+            n_chunks += 1
+            n_rows += len(chunk)
+        myprint("Pass 1 complete : %d chunks, %d rows" % (n_chunks, n_rows))
+
+        # 用只有一行(中位数)的数据拟合 Imputer, 其 statistics_ 即为中位数
+        medians = np.array([[sketch.median() for sketch in sketches]])
+        num_steps["selector"].fit(None)
+        num_steps["imputer"].fit(medians)
+        num_steps["attribs_adder"].fit(None)
+        cat_steps["selector"].fit(None)
+        cat_steps["label_binarizer"].fit(np.array(sorted(classes), dtype=object))
+
+        # 第 2 遍: 缩放参数
+        scaler = num_steps["std_scaler"]
+        for chunk in self.chunks():
+            num = num_steps["selector"].transform(chunk)
+            num = num_steps["attribs_adder"].transform(num_steps["imputer"].transform(num))
+            scaler.partial_fit(num)
+        myprint("Pass 2 complete : %d rows" % scaler.n_samples_seen_)
+
+        self.full_pipeline = full_pipeline
+        return self.full_pipeline
+
+    def transform_chunks(self, dense=True):
+        """
+        说明：
+            用拟合好的处理流程逐块转换数据集
+        输出:
+            迭代器，每次返回 (prepared:(numpy.ndarray), label:(numpy.ndarray or None))
+        """
+        if self.full_pipeline is None:
+            self.fit_pipeline()
+        for chunk in self.chunks():
+            label = None
+            if "median_house_value" in chunk:
+                label = chunk["median_house_value"].values
+            yield self.run_pipeline(chunk.drop("median_house_value", axis=1, errors="ignore"), dense=dense), label
+
+    def prepare_data(self):
+        """
+        说明：
+            拟合处理流程，并将所有数据块的转换结果合并为 train_prepared, 与 PrepareData.prepare_data() 的用法一致，
+            适用于原始数据超过内存大小，而转换后的特征矩阵可以放入内存的情况
+        输出:
+            train_prepared:(numpy.ndarray)
+        """
+        self.fit_pipeline()
+        prepared, labels = [], []
+        for chunk_prepared, chunk_label in self.transform_chunks():
+            prepared.append(chunk_prepared)
+            labels.append(chunk_label)
+        self.train_prepared = np.vstack(prepared)
+        self.train_label = None if labels[0] is None else np.concatenate(labels)
         return self.train_prepared
@@ -0,0 +1,223 @@
+# -*- coding:utf-8 -*-
+
+# ******************************************************************************
+# 模块说明 ：训练流程的性能分析
+#            PipelineProfiler() - 记录每个阶段的耗时(墙钟时间 / CPU时间, 含 joblib 工作进程)，内存峰值及本阶段使峰值增加的量，
+#                                 处理速度(行/秒)，
+#                                 输出 JSON 格式的报告和汇总表格，可选为每个阶段保存 cProfile 结果
+#
+#            用法:
+#                profiler = PipelineProfiler(profile_dir="profiles")
+#                with profiler.stage("load_data") as record:
+#                    ...
+#                    record["rows"] = len(train_set)
+#                profiler.save_json("training_profile.json")
+#                print(profiler.summary_table())
+#
+# 开发人员 ：Edwin.Zhang
+# 开发时间 : 2018-5-18
+# ******************************************************************************
+
+import os
+import sys
+import json
+import time
+from contextlib import contextmanager
+
+
+def myprint(message):
+    """
+    说明：一个小函数，为了缩减文件，使重点突出，没有加共用函数库，冗余了这段代码
+    """
+    import time
+    print(time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time())) + " : " + message)
+
+
+def peak_rss_bytes():
+    """
+    说明：
+        当前进程到目前为止的内存峰值(字节)，无法获得时返回 None
+        Linux / Mac 用 resource 模块; Windows 需要安装 psutil
+    """
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024  # Linux 的单位为 KB
+    except ImportError:
+        pass
+    try:
+        import psutil
+        memory_info = psutil.Process().memory_info()
+        return getattr(memory_info, "peak_wset", memory_info.rss)
+    except ImportError:
+        return None
+
+
+def children_cpu_seconds():
+    """
+    说明：
+        所有子进程(joblib / loky 的工作进程等)累计使用的 CPU 时间(秒)，无法获得时返回 None
+        loky 的工作进程在多次并行调用之间常驻，不会结束，RUSAGE_CHILDREN 只包含已结束并回收的子进程，
+        因此再加上运行中的子进程的 CPU 时间: 有 psutil 时用 psutil, 否则在 Linux 上读取 /proc
+    """
+    reaped = 0.0
+    try:
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        reaped = usage.ru_utime + usage.ru_stime
+    except ImportError:
+        pass
+
+    try:
+        import psutil
+        running = 0.0
+        for child in psutil.Process().children(recursive=True):
+            try:
+                times = child.cpu_times()
+                running += times.user + times.system
+            except psutil.Error:
+                pass  # 子进程已结束
+        return reaped + running
+    except ImportError:
+        pass
+
+    try:
+        ticks = os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, AttributeError):
+        return None
+    pid = os.getpid()
+    if not os.path.exists("/proc/%d/task/%d/children" % (pid, pid)):
+        return None  # 不是 Linux, 或内核不提供 children 文件
+
+    running, pids = 0, [pid]
+    while pids:
+        pid = pids.pop()
+        # 遍历期间子进程随时可能结束，只跳过读取失败的进程，不影响其它进程的统计
+        try:
+            tasks = os.listdir("/proc/%d/task" % pid)
+        except OSError:
+            continue
+        for task in tasks:
+            try:
+                with open("/proc/%d/task/%s/children" % (pid, task)) as f:
+                    children = f.read().split()
+            except OSError:
+                continue
+            for child in children:
+                pids.append(int(child))
+                try:
+                    with open("/proc/%s/stat" % child) as stat:
+                        # 进程名之后的第 12, 13 个字段为 utime, stime (单位: 时钟周期)
+                        fields = stat.read().rsplit(")", 1)[1].split()
+                    running += int(fields[11]) + int(fields[12])
+                except (OSError, IndexError, ValueError):
+                    pass  # 子进程已结束
+    return reaped + running / float(ticks)
+
+
+class PipelineProfiler:
+    """
+    说明:
+        按阶段记录性能数据，每个阶段一条记录(dict), 调用方可以在记录中补充
+        处理行数(rows)，交叉验证每折的耗时等信息
+        CPU 时间: parent_cpu_time 为本进程，worker_cpu_time 为子进程(joblib 工作进程)，cpu_time 为两者之和;
+                  无法获得子进程的 CPU 时间时 worker_cpu_time 为 None, cpu_time 只含本进程
+        内存: process_peak_rss 为阶段结束时本进程从启动到目前为止的峰值(不是本阶段自己的峰值);
+              peak_rss_growth 为本阶段使该峰值增加的量，为 0 表示本阶段没有超过之前阶段的峰值
+    """
+    def __init__(self, profile_dir=None):
+        """
+        输入：
+            profile_dir:(string) - 若提供，每个阶段用 cProfile 分析，结果保存为 <profile_dir>/<阶段名>.prof,
+                                   可用 python -m pstats 或 snakeviz 查看; 缺省为 None, 不做 cProfile 分析
+        """
+        self.profile_dir = profile_dir
+        self.stages = []
+        self.start_time = time.time()
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """
+        说明：
+            记录一个阶段的性能数据
+        输入：
+            name:(string) - 阶段名称
+            rows:(int) - 处理的行数，也可以在 with 语句中设置 record["rows"]
+        输出:
+            record:(dict) - 该阶段的记录
+        """
+        import cProfile
+
+        record = {"stage": name, "rows": rows}
+        profile = None
+        if self.profile_dir is not None:
+            profile = cProfile.Profile()
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        worker_start = children_cpu_seconds()
+        peak_start = peak_rss_bytes()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield record
+        finally:
+            if profile is not None:
+                profile.disable()
+            record["wall_time"] = time.perf_counter() - wall_start
+            record["parent_cpu_time"] = time.process_time() - cpu_start
+            worker_end = children_cpu_seconds() if worker_start is not None else None
+            record["worker_cpu_time"] = None if worker_end is None else max(0.0, worker_end - worker_start)
+            record["cpu_time"] = record["parent_cpu_time"] + (record["worker_cpu_time"] or 0.0)
+            record["process_peak_rss"] = peak_rss_bytes()
+            record["peak_rss_growth"] = None if peak_start is None or record["process_peak_rss"] is None \
+                else record["process_peak_rss"] - peak_start
+            if record["rows"] and record["wall_time"] > 0:
+                record["rows_per_sec"] = record["rows"] / record["wall_time"]
+            if profile is not None:
+                if not os.path.exists(self.profile_dir):
+                    os.makedirs(self.profile_dir)
+                record["profile_file"] = os.path.join(self.profile_dir, name + ".prof")
+                profile.dump_stats(record["profile_file"])
+            self.stages.append(record)
+
+    def report(self):
+        """
+        输出:
+            report:(dict) - 完整的性能报告
+        """
+        return {
+            "started": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.start_time)),
+            "total_wall_time": sum(r["wall_time"] for r in self.stages),
+            "total_cpu_time": sum(r["cpu_time"] for r in self.stages),
+            "total_parent_cpu_time": sum(r["parent_cpu_time"] for r in self.stages),
+            "total_worker_cpu_time": None if any(r["worker_cpu_time"] is None for r in self.stages)
+            else sum(r["worker_cpu_time"] for r in self.stages),
+            "process_peak_rss": peak_rss_bytes(),
+            "stages": self.stages,
+        }
+
+    def save_json(self, filename):
+        path = os.path.dirname(filename)
+        if path != "" and not os.path.exists(path):
+            os.makedirs(path)
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2, default=float)
+
+    def summary_table(self):
+        """
+        输出:
+            table:(string) - 各阶段性能数据的汇总表格
+        """
+        lines = ["%-32s %10s %10s %13s %8s %15s %13s %14s" % ("stage", "wall(s)", "cpu(s)", "worker cpu(s)", "wall%",
+                                                                "proc peak(MB)", "peak +(MB)", "rows/sec")]
+        total = sum(r["wall_time"] for r in self.stages) or 1.0
+        for r in self.stages:
+            peak_rss = "-" if r["process_peak_rss"] is None else "%.1f" % (r["process_peak_rss"] / 1024.0 / 1024.0)
+            growth = "-" if r["peak_rss_growth"] is None else "%.1f" % (r["peak_rss_growth"] / 1024.0 / 1024.0)
+            rows_per_sec = "%.0f" % r["rows_per_sec"] if r.get("rows_per_sec") else "-"
+            worker_cpu = "-" if r["worker_cpu_time"] is None else "%.3f" % r["worker_cpu_time"]
+            lines.append("%-32s %10.3f %10.3f %13s %7.1f%% %15s %13s %14s" % (
+                r["stage"], r["wall_time"], r["cpu_time"], worker_cpu, 100.0 * r["wall_time"] / total,
+                peak_rss, growth, rows_per_sec))
+        return "\n".join(lines)
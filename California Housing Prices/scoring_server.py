@@ -0,0 +1,298 @@
+# -*- coding:utf-8 -*-
+
+# ******************************************************************************
+# 模块说明 ：本地 HTTP 预测服务，将并发请求合并为小批量后统一预测
+#            MicroBatcher()  - 在时间窗口内收集请求，合并后只调用一次 model.predict()
+#            ScoringServer() - 基于 asyncio 的 HTTP 服务 (只用标准库)
+#
+#            启动: python scoring_server.py --port 8000 --window-ms 5    (--model 缺省为评分最好的登记模型)
+#                  --cache-mb 64 启用预测结果缓存，GET /health 返回缓存的命中统计
+#            请求: POST /predict, 内容为一条记录 {...} 或多条记录 [{...}, {...}]
+#                  返回 {"predictions": [...]}
+#
+# 开发人员 ：Edwin.Zhang
+# 开发时间 : 2018-5-18
+# ******************************************************************************
+
+import json
+import asyncio
+
+from predictor import Predictor
+from prediction_cache import PredictionCache
+
+
+def myprint(message):
+    """
+    说明：一个小函数，为了缩减文件，使重点突出，没有加共用函数库，冗余了这段代码
+    """
+    import time
+    print(time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time())) + " : " + message)
+
+
+class MicroBatcher:
+    """
+    说明:
+        scikit-Learn 模型逐条预测的开销很大，批量预测的单条成本要低得多。
+        第一个请求到达后，最多再等待 window_ms 毫秒(或凑满 max_batch_size 条记录)，
+        将这段时间内的所有请求合并为一个批次，调用一次 predict_fn, 再把结果分发回各个请求
+    """
+    def __init__(self, predict_fn, window_ms=5.0, max_batch_size=256):
+        """
+        输入：
+            predict_fn:(callable) - 输入记录列表，返回预测结果数组，如 Predictor.predict_many
+            window_ms:(float) - 合并批次的时间窗口(毫秒)
+            max_batch_size:(int) - 每个批次的最大记录数
+        """
+        self.predict_fn = predict_fn
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.queue = None
+        self.worker = None
+
+        self.batches = 0
+        self.records = 0
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.worker = asyncio.ensure_future(self.run())
+
+    async def stop(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+            self.worker = None
+
+    async def submit(self, records):
+        """
+        说明：
+            提交一个请求中的记录，等待所在批次预测完成后返回该请求的预测结果
+        """
+        future = asyncio.get_event_loop().create_future()
+        await self.queue.put((records, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            # 等待第一个请求，然后在时间窗口内继续收集
+            batch = [await self.queue.get()]
+            size = len(batch[0][0])
+            deadline = loop.time() + self.window
+            while size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            records = [record for item_records, _ in batch for record in item_records]
+            try:
+                # 预测在线程池中执行，不阻塞事件循环，期间可继续接收下一批请求
+                predictions = await loop.run_in_executor(None, self.predict_fn, records)
+            except Exception:
+                # 批次预测失败时逐个请求重试，只有出错的请求返回错误
+                await self.run_items(loop, batch)
+                continue
+
+            self.batches += 1
+            self.records += len(records)
+            start = 0
+            for item_records, future in batch:
+                if not future.done():
+                    future.set_result([float(p) for p in predictions[start:start + len(item_records)]])
+                start += len(item_records)
+
+    async def run_items(self, loop, batch):
+        for item_records, future in batch:
+            try:
+                predictions = await loop.run_in_executor(None, self.predict_fn, item_records)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.records += len(item_records)
+            if not future.done():
+                future.set_result([float(p) for p in predictions])
+
+
+class ScoringServer:
+    """
+    说明:
+        最小化的 HTTP/1.1 服务，支持 keep-alive
+            POST /predict - 预测，内容为 JSON 格式的一条或多条记录
+            GET  /health  - 服务状态及批次统计
+        请求内容超过 max_body_bytes 时返回 413, 不读取内容，并关闭连接
+    """
+    MAX_BODY_BYTES = 4 * 1024 * 1024
+
+    def __init__(self, predictor, host="127.0.0.1", port=8000, window_ms=5.0, max_batch_size=256,
+                 max_body_bytes=MAX_BODY_BYTES):
+        """
+        输入：
+            predictor:(Predictor) - 已装载模型的预测器
+            host, port - 监听地址，缺省只监听本机
+            window_ms, max_batch_size - 见 MicroBatcher
+            max_body_bytes:(int) - 请求内容的最大字节数
+        """
+        self.predictor = predictor
+        self.host = host
+        self.port = port
+        self.max_body_bytes = max_body_bytes
+        self.batcher = MicroBatcher(predictor.predict_many, window_ms, max_batch_size)
+        self.server = None
+
+    async def start(self):
+        self.batcher.start()
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        myprint("Scoring server is listening on http://%s:%d" % (self.host, self.port))
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        await self.batcher.stop()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                parts = request_line.decode("latin-1").split()
+                if len(parts) != 3:
+                    # 请求行格式错误，无法确定请求的边界，返回 400 后关闭连接
+                    self.write_response(writer, 400, {"error": "malformed request line"}, False)
+                    await writer.drain()
+                    break
+                method, path, version = parts
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get("content-length", 0))
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    self.write_response(writer, 400, {"error": "invalid content-length"}, False)
+                    await writer.drain()
+                    break
+                if length > self.max_body_bytes:
+                    # 不读取过大的请求内容，连接中剩余的数据无法跳过，返回 413 后关闭连接
+                    self.write_response(writer, 413, {"error": "request body is larger than %d bytes" %
+                                                               self.max_body_bytes}, False)
+                    await writer.drain()
+                    break
+                body = b""
+                if length > 0:
+                    body = await reader.readexactly(length)
+
+                status, result = await self.handle_request(method, path, body)
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                self.write_response(writer, status, result, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, method, path, body):
+        """
+        输出:
+            (HTTP 状态码, 返回的 JSON 对象)
+        """
+        if method == "GET" and path == "/health":
+            result = {"status": "ok", "model": self.predictor.modelname,
+                      "batches": self.batcher.batches, "records": self.batcher.records}
+            if self.predictor.cache is not None:
+                result["cache"] = self.predictor.cache.stats()
+            return 200, result
+        if method != "POST" or path != "/predict":
+            return 404, {"error": "not found"}
+
+        try:
+            records = json.loads(body.decode("utf-8"))
+        except ValueError as e:
+            return 400, {"error": "invalid json : " + str(e)}
+        if isinstance(records, dict):
+            records = [records]
+        if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+            return 400, {"error": "request body must be a record or a list of records"}
+        if len(records) == 0:
+            return 200, {"predictions": []}
+        try:
+            records = self.predictor.validate(records)
+        except ValueError as e:
+            return 400, {"error": str(e)}
+
+        try:
+            predictions = await self.batcher.submit(records)
+        except Exception as e:
+            return 500, {"error": str(e)}
+        return 200, {"predictions": predictions}
+
+    @staticmethod
+    def write_response(writer, status, result, keep_alive):
+        reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large", 500: "Internal Server Error"}
+        content = json.dumps(result).encode("utf-8")
+        writer.write(("HTTP/1.1 %d %s\r\n"
+                      "Content-Type: application/json\r\n"
+                      "Content-Length: %d\r\n"
+                      "Connection: %s\r\n\r\n" % (status, reasons[status], len(content),
+                                                  "keep-alive" if keep_alive else "close")).encode("latin-1"))
+        writer.write(content)
+
+    def run(self):
+        """
+        说明：
+            启动服务并一直运行，按 Ctrl+C 退出
+        """
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(self.start())
+        try:
+            loop.run_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            loop.run_until_complete(self.stop())
+            loop.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="California housing prices scoring server")
+    parser.add_argument("--model", default=None,
+                        help="registered model name, default is the best scored model in folder 'trainmodels'")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--window-ms", type=float, default=5.0, help="micro-batch collecting window")
+    parser.add_argument("--max-batch-size", type=int, default=256)
+    parser.add_argument("--max-body-bytes", type=int, default=ScoringServer.MAX_BODY_BYTES,
+                        help="largest accepted request body, larger requests get 413")
+    parser.add_argument("--cache-mb", type=float, default=0, help="prediction cache size in MB, 0 to disable")
+    parser.add_argument("--cache-ttl", type=float, default=None, help="prediction cache entry lifetime in seconds")
+    args = parser.parse_args()
+
+    cache = None
+    if args.cache_mb > 0:
+        cache = PredictionCache(int(args.cache_mb * 1024 * 1024), args.cache_ttl)
+    ScoringServer(Predictor(args.model, cache=cache), args.host, args.port, args.window_ms, args.max_batch_size,
+                  args.max_body_bytes).run()
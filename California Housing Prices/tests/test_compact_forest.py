@@ -0,0 +1,94 @@
+# -*- coding:utf-8 -*-
+
+# ******************************************************************************
+# 模块说明 ：CompactForest 的测试，预测结果与 scikit-Learn 模型比较
+#            节点值保存为 float32, 预测结果允许 float32 舍入误差
+# ******************************************************************************
+
+import numpy as np
+import pytest
+from sklearn.tree import DecisionTreeRegressor
+from sklearn.ensemble import RandomForestRegressor, ExtraTreesRegressor
+from sklearn.linear_model import LinearRegression
+
+from compact_forest import CompactForest
+
+RTOL = 1e-6
+
+
+@pytest.fixture(scope="module")
+def data():
+    # 与房价数据相近的规模: 标签数量级 10^5, 含重复的特征值(阈值恰好落在样本值之间)
+    rng = np.random.RandomState(42)
+    X = rng.normal(size=(2000, 8))
+    X[:, 0] = np.round(X[:, 0], 1)
+    y = 2e5 + 5e4 * X[:, 0] - 3e4 * X[:, 1] * X[:, 2] + 1e4 * rng.normal(size=2000)
+    return X[:1500], y[:1500], X[1500:]
+
+
+def assert_parity(model, X):
+    compact = CompactForest.from_model(model)
+    np.testing.assert_allclose(compact.predict(X), model.predict(X), rtol=RTOL)
+    return compact
+
+
+def test_single_tree(data):
+    X_train, y_train, X_test = data
+    model = DecisionTreeRegressor(random_state=42).fit(X_train, y_train)
+    assert_parity(model, X_test)
+    # 训练数据上每个样本都落在自己的叶子节点，判断分支的任何误差都会表现出来
+    assert_parity(model, X_train)
+
+
+def test_random_forest(data):
+    X_train, y_train, X_test = data
+    model = RandomForestRegressor(n_estimators=20, random_state=42).fit(X_train, y_train)
+    assert_parity(model, X_test)
+    assert_parity(model, X_train)
+
+
+def test_extra_trees_with_limited_depth(data):
+    X_train, y_train, X_test = data
+    model = ExtraTreesRegressor(n_estimators=10, max_depth=6, random_state=42).fit(X_train, y_train)
+    assert_parity(model, X_test)
+
+
+def test_float32_input_matches_exactly(data):
+    # 阈值向下取整到 float32 后，float32 输入的分支判断与 scikit-Learn 完全一致
+    X_train, y_train, X_test = data
+    model = RandomForestRegressor(n_estimators=5, random_state=42).fit(X_train, y_train)
+    X = X_test.astype(np.float32)
+    compact = CompactForest.from_model(model)
+    expected = np.mean([tree.tree_.value[tree.apply(X), 0, 0].astype(np.float32) for tree in model.estimators_],
+                       axis=0, dtype=np.float64)
+    np.testing.assert_allclose(compact.predict(X), expected, rtol=1e-12)
+
+
+def test_small_blocks(data):
+    X_train, y_train, X_test = data
+    model = RandomForestRegressor(n_estimators=5, random_state=42).fit(X_train, y_train)
+    compact = CompactForest.from_model(model)
+    np.testing.assert_array_equal(compact.predict(X_test, block_size=7), compact.predict(X_test))
+
+
+def test_save_and_load(data, tmp_path):
+    X_train, y_train, X_test = data
+    model = RandomForestRegressor(n_estimators=5, random_state=42).fit(X_train, y_train)
+    compact = CompactForest.from_model(model)
+    filename = str(tmp_path / "forest")
+    compact.save(filename)
+    loaded = CompactForest.load(filename)
+    np.testing.assert_array_equal(loaded.predict(X_test), compact.predict(X_test))
+
+
+def test_unsupported_model(data):
+    X_train, y_train, _ = data
+    with pytest.raises(ValueError):
+        CompactForest.from_model(LinearRegression().fit(X_train, y_train))
+
+
+def test_wrong_feature_count(data):
+    X_train, y_train, X_test = data
+    compact = CompactForest.from_model(DecisionTreeRegressor(max_depth=3).fit(X_train, y_train))
+    with pytest.raises(ValueError):
+        compact.predict(X_test[:, :5])
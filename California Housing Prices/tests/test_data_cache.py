@@ -0,0 +1,120 @@
+# -*- coding:utf-8 -*-
+
+# ******************************************************************************
+# 模块说明 ：DataCache 及 DataLoader 行号拆分的测试
+#            源文件的 SHA-256 在大小和修改时间不变时复用记录; 源文件改写后缓存和拆分行号重新生成;
+#            行号拆分与 train_test_split(random_state=42) 的结果相同
+# ******************************************************************************
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.model_selection import train_test_split
+
+from load_data import DataCache, DataLoader
+
+
+def housing_frame(n_rows=200, seed=42):
+    rng = np.random.RandomState(seed)
+    return pd.DataFrame({
+        "longitude": np.round(rng.uniform(-124.3, -114.3, n_rows), 2),
+        "latitude": np.round(rng.uniform(32.5, 42.0, n_rows), 2),
+        "housing_median_age": rng.randint(1, 53, n_rows),
+        "total_rooms": rng.randint(100, 5000, n_rows),
+        "total_bedrooms": rng.randint(20, 1000, n_rows),
+        "population": rng.randint(50, 3000, n_rows),
+        "households": rng.randint(20, 1000, n_rows),
+        "median_income": np.round(rng.uniform(0.5, 15, n_rows), 4),
+        "median_house_value": rng.randint(15000, 500001, n_rows),
+        "ocean_proximity": rng.choice(["<1H OCEAN", "INLAND", "NEAR OCEAN", "NEAR BAY"], n_rows),
+    })
+
+
+@pytest.fixture
+def csv_filename(tmp_path, monkeypatch):
+    # 数据集，缓存，拆分行号都放在临时目录中; 进程内的哈希记录每个测试重新开始
+    filename = str(tmp_path / "housing.csv")
+    housing_frame().to_csv(filename, index=False)
+    monkeypatch.setattr(DataLoader, "FILENAME_ALL_SET", filename)
+    monkeypatch.setattr(DataLoader, "CACHE_PATH", str(tmp_path / "cache"))
+    monkeypatch.setattr(DataLoader, "SPLIT_INDEX_PATH", str(tmp_path / "splits"))
+    monkeypatch.setattr(DataCache, "_source_hashes", {})
+    return filename
+
+
+def subdirs(path):
+    return sorted(name for name in os.listdir(path) if os.path.isdir(os.path.join(path, name)))
+
+
+def test_warm_load_reuses_stored_hash(csv_filename, tmp_path, monkeypatch):
+    cache = DataCache(str(tmp_path / "cache"))
+    expected = cache.source_hash(csv_filename)
+    assert expected == DataCache.file_hash(csv_filename)
+
+    # 新进程: 没有进程内的记录，大小和修改时间不变时使用 source_hashes.json 中的记录，不读源文件
+    monkeypatch.setattr(DataCache, "_source_hashes", {})
+
+    def fail(*args, **kwargs):
+        raise AssertionError("source file should not be hashed again")
+
+    monkeypatch.setattr(DataCache, "file_hash", staticmethod(fail))
+    assert DataCache(str(tmp_path / "cache")).source_hash(csv_filename) == expected
+
+
+def test_hash_recomputed_when_mtime_changes(csv_filename, tmp_path, monkeypatch):
+    cache = DataCache(str(tmp_path / "cache"))
+    expected = cache.source_hash(csv_filename)
+    monkeypatch.setattr(DataCache, "_source_hashes", {})
+    calls = []
+    monkeypatch.setattr(DataCache, "file_hash", staticmethod(lambda filename: calls.append(filename) or "changed"))
+
+    stat = os.stat(csv_filename)
+    os.utime(csv_filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert cache.source_hash(csv_filename) == "changed" != expected
+    assert calls == [csv_filename]
+
+
+def test_index_split_matches_train_test_split(csv_filename):
+    loader = DataLoader(split_mode="index", compact_dtypes=False)
+    train_set, test_set = loader.load_train_set(), loader.load_test_set()
+
+    expected_train, expected_test = train_test_split(pd.read_csv(csv_filename), test_size=0.2, random_state=42)
+    pd.testing.assert_frame_equal(train_set, expected_train.reset_index(drop=True), check_dtype=False)
+    pd.testing.assert_frame_equal(test_set, expected_test.reset_index(drop=True), check_dtype=False)
+
+
+def test_index_split_is_reused(csv_filename, tmp_path, monkeypatch):
+    DataLoader(split_mode="index").load_train_set()
+    split_dirs = subdirs(str(tmp_path / "splits"))
+    assert len(split_dirs) == 1
+
+    # 第二次装载直接读取保存的行号，不再拆分
+    monkeypatch.setattr(DataLoader, "split_index", lambda *args, **kwargs: pytest.fail("split again"))
+    monkeypatch.setattr(DataCache, "_source_hashes", {})
+    assert len(DataLoader(split_mode="index").load_test_set()) == 40
+    assert subdirs(str(tmp_path / "splits")) == split_dirs
+
+
+def test_rewritten_csv_rebuilds_cache_and_split(csv_filename, tmp_path):
+    first = DataLoader(split_mode="index").load_train_set()
+    cache_dirs = subdirs(str(tmp_path / "cache"))
+    split_dirs = subdirs(str(tmp_path / "splits"))
+
+    # 改写源文件(行数，内容都不同)，修改时间也明确改变
+    new_frame = housing_frame(n_rows=300, seed=7)
+    new_frame.to_csv(csv_filename, index=False)
+    stat = os.stat(csv_filename)
+    os.utime(csv_filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    # 与第一次装载的参数相同，只有源文件变化
+    train_set = DataLoader(split_mode="index").load_train_set()
+    assert len(train_set) == 240 != len(first)
+    assert len(subdirs(str(tmp_path / "cache"))) == len(cache_dirs) + 1
+    assert len(subdirs(str(tmp_path / "splits"))) == len(split_dirs) + 1
+
+    expected_train, _ = train_test_split(new_frame, test_size=0.2, random_state=42)
+    for name in ("median_house_value", "households"):
+        np.testing.assert_array_equal(train_set[name].values, expected_train[name].values)
+    assert list(train_set["ocean_proximity"].astype(str)) == list(expected_train["ocean_proximity"])
@@ -0,0 +1,139 @@
+# -*- coding:utf-8 -*-
+
+# ******************************************************************************
+# 模块说明 ：FetchFileData 的测试，用本地 http.server 代替远程服务器
+#            断点续传，已完整 / 超长的临时文件，分段下载，SHA-256 清单有效时跳过下载
+# ******************************************************************************
+
+import os
+import hashlib
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from load_data import FetchFileData
+
+CONTENT = bytes(range(256)) * 1000      # 256000 字节
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """ 支持 HEAD 和 Range 请求的最小服务器，记录收到的 GET 请求的 Range 头 """
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(CONTENT)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+    def do_GET(self):
+        byte_range = self.headers.get("Range")
+        RangeHandler.requests.append(byte_range)
+        if byte_range is None:
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(CONTENT)))
+            self.end_headers()
+            self.wfile.write(CONTENT)
+            return
+        start, end = byte_range.split("=")[1].split("-")
+        start, end = int(start), int(end) if end else len(CONTENT) - 1
+        if start >= len(CONTENT):
+            self.send_response(416)
+            self.send_header("Content-Range", "bytes */%d" % len(CONTENT))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = CONTENT[start:end + 1]
+        self.send_response(206)
+        self.send_header("Content-Range", "bytes %d-%d/%d" % (start, start + len(body) - 1, len(CONTENT)))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def url():
+    server = HTTPServer(("127.0.0.1", 0), RangeHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    RangeHandler.requests = []
+    yield "http://127.0.0.1:%d/data.bin" % server.server_port
+    server.shutdown()
+    server.server_close()
+
+
+def fetcher(url, path, **kwargs):
+    return FetchFileData(url, str(path), extractfile=False, sha256=hashlib.sha256(CONTENT).hexdigest(), **kwargs)
+
+
+def read(filename):
+    with open(filename, "rb") as f:
+        return f.read()
+
+
+def test_download(url, tmp_path):
+    assert fetcher(url, tmp_path).fetch_data() == os.path.join(str(tmp_path), "data.bin")
+    assert read(tmp_path / "data.bin") == CONTENT
+    assert not os.path.exists(str(tmp_path / "data.bin.part"))
+
+
+def test_resume_from_partial_file(url, tmp_path):
+    (tmp_path / "data.bin.part").write_bytes(CONTENT[:1000])
+    assert fetcher(url, tmp_path).fetch_data()
+    assert read(tmp_path / "data.bin") == CONTENT
+    assert RangeHandler.requests == ["bytes=1000-"]
+
+
+def test_complete_part_file_is_not_requested_again(url, tmp_path):
+    (tmp_path / "data.bin.part").write_bytes(CONTENT)
+    assert fetcher(url, tmp_path).fetch_data()
+    assert read(tmp_path / "data.bin") == CONTENT
+    assert RangeHandler.requests == []
+
+
+def test_oversized_part_file_is_downloaded_again(url, tmp_path):
+    (tmp_path / "data.bin.part").write_bytes(CONTENT + b"stale")
+    assert fetcher(url, tmp_path).fetch_data()
+    assert read(tmp_path / "data.bin") == CONTENT
+    assert RangeHandler.requests == [None]
+
+
+def test_range_not_satisfiable_restarts(url, tmp_path, monkeypatch):
+    # 远程文件大小未知时，无法事先判断临时文件已完整，服务器返回 416 后重新下载
+    monkeypatch.setattr(FetchFileData, "get_remote_info", lambda self: (0, False))
+    (tmp_path / "data.bin.part").write_bytes(CONTENT + b"stale")
+    assert fetcher(url, tmp_path).fetch_data()
+    assert read(tmp_path / "data.bin") == CONTENT
+    assert RangeHandler.requests == ["bytes=%d-" % (len(CONTENT) + 5), None]
+
+
+def test_segmented_download(url, tmp_path):
+    # 第 2 段已下载了一部分，只续传剩余部分
+    (tmp_path / "data.bin.part1").write_bytes(CONTENT[64000:64100])
+    assert fetcher(url, tmp_path, connections=4).fetch_data()
+    assert read(tmp_path / "data.bin") == CONTENT
+    assert sorted(RangeHandler.requests) == sorted(["bytes=0-63999", "bytes=64100-127999",
+                                                    "bytes=128000-191999", "bytes=192000-255999"])
+    assert not any(name.startswith("data.bin.part") for name in os.listdir(str(tmp_path)))
+
+
+def test_checksum_mismatch_fails(url, tmp_path):
+    assert FetchFileData(url, str(tmp_path), extractfile=False, sha256="0" * 64).fetch_data() is None
+    assert not os.path.exists(str(tmp_path / "data.bin"))
+
+
+def test_valid_local_copy_skips_download(url, tmp_path):
+    assert fetcher(url, tmp_path).fetch_data()
+    RangeHandler.requests = []
+    assert fetcher(url, tmp_path).fetch_data()
+    assert RangeHandler.requests == []
+
+    # 本地文件被修改后，清单校验失败，重新下载
+    (tmp_path / "data.bin").write_bytes(b"changed")
+    assert fetcher(url, tmp_path).fetch_data()
+    assert read(tmp_path / "data.bin") == CONTENT
+    assert RangeHandler.requests == [None]
@@ -0,0 +1,97 @@
+# -*- coding:utf-8 -*-
+
+# ******************************************************************************
+# 模块说明 ：IncrementalPrepareData 及 QuantileSketch 的测试
+#            分块两遍扫描拟合的处理流程，转换结果与 PrepareData 在内存中拟合的结果一致
+# ******************************************************************************
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from prepare_data import PrepareData, IncrementalPrepareData, QuantileSketch
+
+ATOL = 1e-12
+CHUNKSIZE = 100
+
+
+def housing_frame(n_rows=700, seed=42):
+    # 与 housing.csv 相同的列，少量缺失的 total_bedrooms, 含重复取值(中位数落在重复值上)
+    rng = np.random.RandomState(seed)
+    households = rng.randint(50, 2000, n_rows).astype(np.float64)
+    frame = pd.DataFrame({
+        "longitude": np.round(rng.uniform(-124.3, -114.3, n_rows), 2),
+        "latitude": np.round(rng.uniform(32.5, 42.0, n_rows), 2),
+        "housing_median_age": rng.randint(1, 53, n_rows).astype(np.float64),
+        "total_rooms": households * rng.uniform(3, 8, n_rows),
+        "total_bedrooms": np.round(households * rng.uniform(0.8, 1.5, n_rows)),
+        "population": households * rng.uniform(1.5, 4, n_rows),
+        "households": households,
+        "median_income": np.round(rng.uniform(0.5, 15, n_rows), 4),
+        "median_house_value": np.round(rng.uniform(15000, 500001, n_rows)),
+        "ocean_proximity": rng.choice(["<1H OCEAN", "INLAND", "NEAR OCEAN", "NEAR BAY", "ISLAND"], n_rows),
+    })
+    frame.loc[rng.rand(n_rows) < 0.05, "total_bedrooms"] = np.nan
+    return frame
+
+
+def assert_same_as_in_memory(frame, csv_filename):
+    frame.to_csv(csv_filename, index=False)
+    expected = PrepareData(pd.read_csv(csv_filename)).prepare_data()
+
+    preparer = IncrementalPrepareData.from_csv(csv_filename, chunksize=CHUNKSIZE)
+    prepared = preparer.prepare_data()
+    assert prepared.shape == expected.shape
+    np.testing.assert_allclose(prepared, expected, rtol=0, atol=ATOL)
+    np.testing.assert_array_equal(preparer.train_label, frame["median_house_value"].values)
+    # 保存的处理流程直接转换，与分块转换的结果相同
+    np.testing.assert_allclose(preparer.full_pipeline.transform(frame.drop("median_house_value", axis=1)),
+                               prepared, rtol=0, atol=ATOL)
+
+
+def test_incremental_matches_in_memory(tmp_path):
+    assert_same_as_in_memory(housing_frame(), str(tmp_path / "housing.csv"))
+
+
+def test_chunk_with_all_missing_bedrooms(tmp_path):
+    # 一整块 total_bedrooms 都是缺失值: 该块不影响中位数，缺失值用其它块的中位数填充
+    frame = housing_frame()
+    frame.loc[CHUNKSIZE:2 * CHUNKSIZE - 1, "total_bedrooms"] = np.nan
+    assert_same_as_in_memory(frame, str(tmp_path / "housing.csv"))
+
+
+@pytest.mark.parametrize("q", [0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0])
+def test_sketch_quantile_without_compression(q):
+    rng = np.random.RandomState(0)
+    values = np.round(rng.normal(size=1001), 2)   # 含重复取值
+    sketch = QuantileSketch()
+    for block in np.array_split(values, 7):
+        sketch.update(block)
+    assert sketch.quantile(q) == pytest.approx(np.percentile(values, 100 * q), abs=1e-12)
+
+
+def test_sketch_known_values():
+    sketch = QuantileSketch().update([3.0, 1.0, np.nan, 2.0, 4.0])
+    assert sketch.count == 4
+    assert sketch.median() == 2.5
+    assert sketch.quantile(0.0) == 1.0
+    assert sketch.quantile(1.0) == 4.0
+    assert np.isnan(QuantileSketch().median())
+
+
+def test_sketch_merge_equals_single_update():
+    values = np.arange(100, dtype=np.float64)
+    merged = QuantileSketch().update(values[:30]).merge(QuantileSketch().update(values[30:]))
+    assert merged.median() == np.median(values)
+    assert merged.count == 100
+
+
+def test_sketch_compressed_median_close():
+    # 压缩后每段用加权平均值代替，中位数的误差不超过一段的宽度
+    values = np.arange(10000, dtype=np.float64)
+    sketch = QuantileSketch(max_size=100)
+    for block in np.array_split(values, 10):
+        sketch.update(block)
+    assert len(sketch.values) <= 100
+    assert sketch.count == 10000
+    assert abs(sketch.median() - np.median(values)) <= 100
@@ -0,0 +1,59 @@
+# -*- coding:utf-8 -*-
+
+# ******************************************************************************
+# 模块说明 ：ModelRegistry 的测试
+#            多个线程同时登记同一模型时，版本号不重复，清单中的记录不丢失
+# ******************************************************************************
+
+import os
+import threading
+
+import numpy as np
+import pytest
+from sklearn.linear_model import LinearRegression
+
+from model_registry import ModelRegistry
+
+
+def fitted_model(i):
+    # 系数为 i + 1, 从装载的模型可以看出是哪个线程登记的
+    X = np.random.RandomState(i).normal(size=(50, 3))
+    return LinearRegression().fit(X, (i + 1) * X.sum(axis=1))
+
+
+def test_concurrent_register(tmp_path):
+    path = str(tmp_path / "trainmodels")
+    n_threads = 8
+    barrier = threading.Barrier(n_threads)
+    entries, errors = [], []
+
+    def register(i):
+        try:
+            barrier.wait()
+            entries.append(ModelRegistry(path).register("lin_model", fitted_model(i), cv_rmse=[float(i)]))
+        except Exception as e:  # pragma: no cover - 失败时在主线程中报告
+            errors.append(e)
+
+    threads = [threading.Thread(target=register, args=(i,)) for i in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert sorted(e["version"] for e in entries) == list(range(1, n_threads + 1))
+    manifest = ModelRegistry(path).list_versions("lin_model")
+    assert sorted(e["version"] for e in manifest) == list(range(1, n_threads + 1))
+    assert not os.path.exists(os.path.join(path, "manifest.json.lock"))
+    # 每个版本的模型文件与清单记录一致
+    for entry in manifest:
+        model, _ = ModelRegistry.load_entry(entry)
+        assert model.coef_[0] == pytest.approx(entry["cv_rmse_mean"] + 1)
+
+
+def test_version_after_existing_directory(tmp_path):
+    # 清单中没有记录，但版本目录已存在(如登记中途退出)，不覆盖该目录
+    path = str(tmp_path / "trainmodels")
+    os.makedirs(os.path.join(path, "lin_model", "v0001"))
+    entry = ModelRegistry(path).register("lin_model", fitted_model(0))
+    assert entry["version"] == 2
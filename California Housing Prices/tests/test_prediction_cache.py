@@ -0,0 +1,123 @@
+# -*- coding:utf-8 -*-
+
+# ******************************************************************************
+# 模块说明 ：PredictionCache 的测试
+#            命中 / 未命中统计，超过 max_bytes 时的淘汰顺序，TTL 过期(替换时钟)，模型版本变化时清空
+# ******************************************************************************
+
+import numpy as np
+import pytest
+
+from prediction_cache import PredictionCache
+
+
+class CountingModel:
+    """ 预测值为特征之和，记录每次 predict() 收到的行 """
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, X):
+        self.calls.append(np.array(X))
+        return np.asarray(X).sum(axis=1)
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def rows(*values):
+    return np.array([[v, 2.0 * v] for v in values], dtype=np.float64)
+
+
+def cache_with_entries(n_entries, **kwargs):
+    return PredictionCache(max_bytes=n_entries * PredictionCache.ENTRY_BYTES, **kwargs)
+
+
+def test_hits_and_misses():
+    cache = cache_with_entries(100)
+    model = CountingModel()
+    np.testing.assert_array_equal(cache.predict(model, rows(1, 2, 3), ("m", 1)), [3, 6, 9])
+    np.testing.assert_array_equal(cache.predict(model, rows(2, 3, 4), ("m", 1)), [6, 9, 12])
+
+    # 第二次只有未命中的一行调用模型
+    assert len(model.calls) == 2
+    np.testing.assert_array_equal(model.calls[1], rows(4))
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 4, 4)
+    assert stats["hit_rate"] == pytest.approx(2 / 6.0)
+    assert stats["approx_bytes"] == 4 * PredictionCache.ENTRY_BYTES
+
+
+def test_negative_zero_is_same_row():
+    cache = cache_with_entries(10)
+    model = CountingModel()
+    cache.predict(model, np.array([[0.0, 1.0]]), ("m", 1))
+    cache.predict(model, np.array([[-0.0, 1.0]]), ("m", 1))
+    assert len(model.calls) == 1
+
+
+def test_evicts_least_recently_used():
+    cache = cache_with_entries(3)
+    model = CountingModel()
+    cache.predict(model, rows(1, 2, 3), ("m", 1))
+    cache.predict(model, rows(1), ("m", 1))        # 1 最近使用过，2 成为最久未使用的
+    cache.predict(model, rows(4), ("m", 1))        # 超过 3 条，淘汰 2
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["entries"] == 3
+
+    model.calls = []
+    cache.predict(model, rows(1, 3, 4), ("m", 1))
+    assert model.calls == []
+    cache.predict(model, rows(2), ("m", 1))
+    np.testing.assert_array_equal(model.calls[0], rows(2))
+
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    cache = cache_with_entries(10, ttl=60, clock=clock)
+    model = CountingModel()
+    cache.predict(model, rows(1), ("m", 1))
+
+    clock.now += 59
+    cache.predict(model, rows(1), ("m", 1))
+    assert len(model.calls) == 1
+
+    clock.now += 2
+    cache.predict(model, rows(1), ("m", 1))
+    assert len(model.calls) == 2
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"]) == (1, 2, 1)
+
+
+def test_no_ttl_never_expires():
+    clock = FakeClock()
+    cache = cache_with_entries(10, clock=clock)
+    model = CountingModel()
+    cache.predict(model, rows(1), ("m", 1))
+    clock.now += 10 ** 9
+    cache.predict(model, rows(1), ("m", 1))
+    assert len(model.calls) == 1
+
+
+def test_version_bump_clears_cache():
+    cache = cache_with_entries(10)
+    model = CountingModel()
+    cache.predict(model, rows(1, 2), ("m", 1))
+    cache.predict(model, rows(1, 2), ("m", 2))
+    assert len(model.calls) == 2
+    stats = cache.stats()
+    assert (stats["invalidations"], stats["entries"], stats["version"]) == (1, 2, str(("m", 2)))
+
+    cache.check_version(("m", 3))
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.mark.parametrize("version", [None, ("m", None)])
+def test_version_required(version):
+    with pytest.raises(ValueError):
+        cache_with_entries(10).predict(CountingModel(), rows(1), version)
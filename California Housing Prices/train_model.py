@@ -4,6 +4,11 @@
 # 模块说明 ：训练模型
 #            TrainModel()      - 训练指定的一个模型，并可用模型进行预测
 #            GridSearchModel() - 利用 GridSearch ，进行参数组合的自动训练，返回最佳训练结果
+#            HalvingSearchModel() - 逐次减半的参数搜索，适用于参数组合很多的情况，返回最佳训练结果
+#            TrainModel.update_model() - 用新增的数据增量更新已登记的模型，不重新全量训练
+#            交叉验证的各折，以及 GridSearch 的参数组合，通过 joblib 进程池(loky)分发到所有CPU核并行执行，
+#            训练数据集通过内存映射文件共享给各个进程，不再每个进程复制一份
+#            训练好的模型通过 ModelRegistry 按版本保存，不覆盖已有的模型
 #
 # 开发人员 ：Edwin.Zhang
 # 开发时间 : 2018-5-18
@@ -11,6 +16,17 @@
 
 import numpy as np
 import os
+import time
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import joblib
+except ImportError:  # scikit-learn 0.21 之前的版本自带 joblib
+    from sklearn.externals import joblib
+
+from model_registry import ModelRegistry
 
 
 def myprint(message):
@@ -21,19 +37,54 @@ def myprint(message):
     print(time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time())) + " : " + message)
 
 
+@contextmanager
+def shared_train_data(train_prepared, train_label):
+    """
+    说明：
+        将训练数据集写入临时文件，并以只读内存映射方式重新打开。
+        joblib 向子进程传递内存映射数组时只传递文件名和偏移量，各个进程共享同一份物理内存，
+        不需要每个任务都序列化一份完整的训练数据
+    输入：
+        train_prepared:(numpy.ndarray) - 训练数据的特征集
+        train_label   :(numpy.ndarray or pandas.Series) - 训练数据的标签集
+    输出:
+        (train_prepared, train_label) 的内存映射版本，退出 with 语句后删除临时文件
+    """
+    folder = tempfile.mkdtemp(prefix="train_memmap_")
+    try:
+        shared = []
+        for name, data in (("train_prepared", train_prepared), ("train_label", train_label)):
+            filename = os.path.join(folder, name + ".pkl")
+            joblib.dump(np.ascontiguousarray(np.asarray(data)), filename)
+            shared.append(joblib.load(filename, mmap_mode="r"))
+        yield tuple(shared)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
 class TrainModel:
     """
     说明:
         1. 根据输入的训练数据集，训练模型，保存模型，显示性能评分
         2. 利用已经训练好的模型，进行预测
+        3. 用新增的数据增量更新已登记的模型，登记为新版本
     """
-    def __init__(self, modelname, model=None, train_prepared=None, train_label=None):
+    # 线性模型增量更新时使用的 SGDRegressor 参数，特征已标准化，标签为房价(数量级 10^5)，学习率需要较小
+    SGD_PARAMS = {"eta0": 1e-5, "max_iter": 5, "tol": None, "random_state": 42}
+
+    def __init__(self, modelname, model=None, train_prepared=None, train_label=None, n_jobs=-1, backend="loky",
+                 full_pipeline=None, feature_schema=None, registry=None):
         """
         输入：
             modelname:(string) - 模型的名称，用于模型保存的文件名标识
             model:(sklearn.regressor) - scikit-Learn的一种回归模型
             train_prepared:(numpy.ndarray) - 训练数据的特征集
             train_label   :(numpy.ndarray or pandas.Series) - 训练数据的标签集
+            n_jobs :(int) - 交叉验证的并行任务数，-1 为使用所有CPU核，1 为串行执行
+            backend:(string) - joblib 的并行方式，缺省为进程池 "loky"
+            full_pipeline :(sklearn.pipeline.FeatureUnion) - 拟合好的处理流程，与模型一起登记
+            feature_schema:(list) - 模型输入的特征名称列表，与模型一起登记
+            registry:(ModelRegistry) - 模型版本管理，缺省为 trainmodels 目录
         """
         self.model = model
         if modelname == "":
@@ -43,43 +94,160 @@ class TrainModel:
 
         self.train_prepared = train_prepared
         self.train_label = train_label
+        self.n_jobs = n_jobs
+        self.backend = backend
+        self.full_pipeline = full_pipeline
+        self.feature_schema = feature_schema
+        self.registry = registry if registry is not None else ModelRegistry()
 
         self.mse_score = None
         self.rmse_score = None
+        self.train_time = None
+        self.fit_time = None
+        self.cv_fit_time = None
+        self.cv_score_time = None
+        self.version = None
 
     def train_model(self):
         """
         说明：
             利用交叉训练的方法，训练并测试模型，获得性能评分，保存训练模型
+            10 折交叉验证并行执行，训练数据通过内存映射共享
+            训练耗时记录在 train_time(总耗时), fit_time(全量训练), cv_fit_time / cv_score_time(每折)
         """
-        from sklearn.model_selection import cross_val_score
+        from sklearn.model_selection import cross_validate
 
-        self.model.fit(self.train_prepared, self.train_label)
-        self.mse_score = cross_val_score(self.model, self.train_prepared, self.train_label,
-                                         scoring="neg_mean_squared_error", cv=10)
+        start_time = time.time()
+        with shared_train_data(self.train_prepared, self.train_label) as (train_prepared, train_label):
+            self.model.fit(train_prepared, train_label)
+            self.fit_time = time.time() - start_time
+            with joblib.parallel_backend(self.backend, n_jobs=self.n_jobs):
+                cv_results = cross_validate(self.model, train_prepared, train_label,
+                                            scoring="neg_mean_squared_error", cv=10, n_jobs=self.n_jobs)
+        self.train_time = time.time() - start_time
+        self.mse_score = cv_results["test_score"]
+        self.cv_fit_time = cv_results["fit_time"]
+        self.cv_score_time = cv_results["score_time"]
         self.rmse_score = np.sqrt(-self.mse_score)
         self.save_model()
         myprint("%20s : Mean RMSE Score = %f " % (self.modelname, self.rmse_score.mean()))
 
     def save_model(self):
-        from sklearn.externals import joblib
+        """
+        说明：
+            将模型登记为一个新版本，同时记录处理流程，评分，训练耗时，数据指纹和特征列表
+        """
         if self.modelname != "":
-            if not os.path.exists("trainmodels"):
-                os.makedirs("trainmodels")
-            joblib.dump(self.model, self.modelfilename)
+            entry = self.registry.register(self.modelname, self.model, self.full_pipeline, self.rmse_score,
+                                           self.train_time,
+                                           ModelRegistry.data_fingerprint(self.train_prepared, self.train_label),
+                                           self.feature_schema)
+            self.version = entry["version"]
 
-    def load_model(self):
-        from sklearn.externals import joblib
-        if self.modelname != "" and os.path.exists(self.modelfilename):
-            self.model = joblib.load(self.modelfilename)
+    def load_model(self, mmap_mode="r"):
+        """
+        说明：
+            装载该名称模型的最新版本; 若未登记过，则装载旧格式的 trainmodels\\<模型名称>.pkl
+        """
+        if self.modelname == "":
+            return
+        entry = self.registry.latest_entry(self.modelname)
+        if entry is not None:
+            self.model, self.full_pipeline = ModelRegistry.load_entry(entry, mmap_mode)
+            self.version = entry["version"]
+        elif os.path.exists(self.modelfilename):
+            self.model = joblib.load(self.modelfilename, mmap_mode=mmap_mode)
 
-    def predict(self, test_prepared, test_label=None):
+    def update_model(self, new_prepared, new_label, n_new_estimators=10, n_epochs=1, eval_prepared=None,
+                     eval_label=None, eval_ratio=0.2):
+        """
+        说明：
+            用新增的数据增量更新该名称模型的最新版本，并登记为新版本
+            1. LinearRegression: 转换为 SGDRegressor, 以原模型的系数为初始值，在新数据上训练
+               SGDRegressor: 在新数据上 partial_fit()
+            2. RandomForestRegressor / ExtraTreesRegressor: warm_start, 在新数据上增加 n_new_estimators 棵树，
+               原有的树保持不变
+            更新前后的模型在同一评估数据集上计算 RMSE, 报告两者的差值(drift)
+            评估数据集上的 RMSE 记录为 holdout_rmse, 与交叉验证评分不可比，新版本不登记 cv_rmse, 不参与 best_entry() 的比较
+        输入：
+            new_prepared:(numpy.ndarray) - 新增数据的特征集，用登记的处理流程转换
+            new_label   :(numpy.ndarray or pandas.Series) - 新增数据的标签集
+            n_new_estimators:(int) - 随机森林增加的树的个数
+            n_epochs:(int) - SGDRegressor 在新数据上 partial_fit() 的遍数
+            eval_prepared, eval_label - 评估数据集，为 None 时从新增数据中按 eval_ratio 留出一部分，不参与更新
+        输出:
+            entry:(dict) - 清单中新版本的记录
+        """
+        from sklearn.linear_model import LinearRegression, SGDRegressor
+        from sklearn.ensemble import RandomForestRegressor, ExtraTreesRegressor
+
+        previous = self.registry.latest_entry(self.modelname)
+        if previous is None:
+            raise ValueError("Model %s is not registered, please train it first." % self.modelname)
+        # 更新会修改模型，不使用内存映射
+        self.model, self.full_pipeline = ModelRegistry.load_entry(previous, mmap_mode=None)
+        self.feature_schema = previous.get("feature_schema")
+
+        new_prepared = np.asarray(new_prepared)
+        new_label = np.asarray(new_label)
+        if eval_prepared is None:
+            n_eval = int(len(new_label) * eval_ratio)
+            if n_eval == 0:
+                raise ValueError("Too few new records to hold out an evaluation set, please provide eval_prepared.")
+            eval_prepared, eval_label = new_prepared[-n_eval:], new_label[-n_eval:]
+            new_prepared, new_label = new_prepared[:-n_eval], new_label[:-n_eval]
+        previous_rmse = np.sqrt(np.mean((self.model.predict(eval_prepared) - eval_label) ** 2))
+
+        start_time = time.time()
+        if isinstance(self.model, LinearRegression):
+            model = SGDRegressor(**self.SGD_PARAMS)
+            model.fit(new_prepared, new_label, coef_init=self.model.coef_, intercept_init=self.model.intercept_)
+            self.model = model
+        elif isinstance(self.model, SGDRegressor):
+            for _ in range(n_epochs):
+                self.model.partial_fit(new_prepared, new_label)
+        elif isinstance(self.model, (RandomForestRegressor, ExtraTreesRegressor)):
+            self.model.set_params(warm_start=True, n_estimators=self.model.n_estimators + n_new_estimators)
+            self.model.fit(new_prepared, new_label)
+        else:
+            raise ValueError("Model %s does not support incremental update, please retrain it." %
+                             type(self.model).__name__)
+        self.fit_time = time.time() - start_time
+        self.train_time = self.fit_time
+        self.cv_fit_time = np.array([self.fit_time])
+        self.cv_score_time = None
+        self.rmse_score = None
+        self.mse_score = None
+        self.train_prepared, self.train_label = new_prepared, new_label
+        self.save_model()
+
+        holdout_rmse = float(np.sqrt(np.mean((self.model.predict(eval_prepared) - eval_label) ** 2)))
+        drift = holdout_rmse - float(previous_rmse)
+        myprint("%20s : v%d -> v%d, holdout RMSE %f -> %f, drift = %+f (%d new records)" %
+                (self.modelname, previous["version"], self.version, previous_rmse, holdout_rmse, drift,
+                 len(new_label)))
+        return self.registry.update_entry(self.modelname, self.version, base_version=previous["version"],
+                                          holdout_rmse=holdout_rmse, previous_rmse=float(previous_rmse),
+                                          rmse_drift=drift, update_rows=int(len(new_label)))
+
+    def cache_version(self):
+        """
+        说明：
+            预测缓存的版本标识: 登记过的模型为 (模型名称, 版本号);
+            直接传入的未登记模型为 (模型名称, 模型内容的指纹)，同名模型重新训练后指纹不同，缓存随之失效
+        """
+        if self.version is not None:
+            return self.modelname, self.version
+        return self.modelname, "sha256:" + ModelRegistry.model_fingerprint(self.model)
+
+    def predict(self, test_prepared, test_label=None, cache=None):
         """
         说明：
             转载已经训练好的模型，进行预测分析
         输入：
             test_prepared:(numpy.ndarray) - 待预测的数据集特征值
             test_label   :(numpy.ndarray) - 待预测的数据集标签值，可以为空，若为空，则不计算性能指标
+            cache:(PredictionCache) - 预测结果缓存，相同的特征行不再调用 model.predict()
         输出：
             test_prediction:(numpy.ndarray) - 预测标签结果值
             test_rmse_score:(float)         - 预测性能评分值
@@ -93,7 +261,10 @@ class TrainModel:
         # 进行预测
         test_pred = None
         if self.model is not None:
-            test_pred = self.model.predict(test_prepared)
+            if cache is not None:
+                test_pred = cache.predict(self.model, test_prepared, self.cache_version())
+            else:
+                test_pred = self.model.predict(test_prepared)
 
         # 计算性能评分
         test_rmse_score = None
@@ -106,7 +277,8 @@ class TrainModel:
 
 
 class GridSearchModel:
-    def __init__(self, modelname, model, param_grid, train_prepared, train_label):
+    def __init__(self, modelname, model, param_grid, train_prepared, train_label, n_jobs=-1, backend="loky",
+                 full_pipeline=None, feature_schema=None, registry=None):
         """
         输入:
             modelname:(string) - 模型的名称，用于模型保存的文件名标识
@@ -114,6 +286,9 @@ class GridSearchModel:
             param_grid:(list) - 参数组合列表
             train_prepared:(numpy.ndarray) - 训练数据特征集
             train_label   :(numpy.ndarray) - 训练数据标签集
+            n_jobs :(int) - 参数组合 x 交叉验证折数 的并行任务数，-1 为使用所有CPU核，1 为串行执行
+            backend:(string) - joblib 的并行方式，缺省为进程池 "loky"
+            full_pipeline, feature_schema, registry - 同 TrainModel
         """
         self.model = model
         self.param_grid = param_grid
@@ -124,11 +299,21 @@ class GridSearchModel:
 
         self.train_prepared = train_prepared
         self.train_label = train_label
+        self.n_jobs = n_jobs
+        self.backend = backend
+        self.full_pipeline = full_pipeline
+        self.feature_schema = feature_schema
+        self.registry = registry if registry is not None else ModelRegistry()
 
         self.best_params = None
         self.best_model = None
         self.mse_score = None
         self.rmse_score = None
+        self.cv_rmse = None
+        self.train_time = None
+        self.cv_fit_time = None
+        self.cv_score_time = None
+        self.version = None
 
     def train_model(self, showdetail=False):
         """
@@ -141,15 +326,25 @@ class GridSearchModel:
         """
         from sklearn.model_selection import GridSearchCV
 
-        # 执行训练
-        grid_search = GridSearchCV(self.model, self.param_grid, cv=5, scoring='neg_mean_squared_error')
-        grid_search.fit(self.train_prepared, self.train_label)
+        # 执行训练, 所有 参数组合 x 交叉验证折数 的任务并行执行
+        grid_search = GridSearchCV(self.model, self.param_grid, cv=5, scoring='neg_mean_squared_error',
+                                   n_jobs=self.n_jobs, pre_dispatch="2*n_jobs")
+        start_time = time.time()
+        with shared_train_data(self.train_prepared, self.train_label) as (train_prepared, train_label):
+            with joblib.parallel_backend(self.backend, n_jobs=self.n_jobs):
+                grid_search.fit(train_prepared, train_label)
+        self.train_time = time.time() - start_time
 
         # 显示训练性能评分，并保存最佳训练模型
         self.best_params = grid_search.best_params_
         self.best_model = grid_search.best_estimator_
         self.mse_score = grid_search.best_score_
         self.rmse_score = np.sqrt(-self.mse_score)
+        self.cv_rmse = np.sqrt(-np.array([grid_search.cv_results_["split%d_test_score" % i][grid_search.best_index_]
+                                          for i in range(grid_search.n_splits_)]))
+        # 每个参数组合在各折上的平均训练 / 评分耗时
+        self.cv_fit_time = grid_search.cv_results_["mean_fit_time"]
+        self.cv_score_time = grid_search.cv_results_["mean_score_time"]
         self.save_model()
         myprint("%20s : Mean RMSE Score = %f  : Best Params = %s " % (self.modelname, self.rmse_score.mean(),
                                                                       str(self.best_params)))
@@ -157,11 +352,179 @@ class GridSearchModel:
         if showdetail:
             cvres = grid_search.cv_results_
             for mean_score, params in zip(cvres["mean_test_score"], cvres["params"]):
-                myprint(np.sqrt(-mean_score), params)
+                myprint("%f %s" % (np.sqrt(-mean_score), str(params)))
 
     def save_model(self):
-        from sklearn.externals import joblib
+        """
+        说明：
+            将最佳模型登记为一个新版本，见 TrainModel.save_model()
+        """
         if self.modelname != "":
-            if not os.path.exists("trainmodels"):
-                os.makedirs("trainmodels")
-            joblib.dump(self.best_model, self.modelfilename)
+            entry = self.registry.register(self.modelname, self.best_model, self.full_pipeline,
+                                           self.cv_rmse if self.cv_rmse is not None else self.rmse_score,
+                                           self.train_time,
+                                           ModelRegistry.data_fingerprint(self.train_prepared, self.train_label),
+                                           self.feature_schema)
+            self.version = entry["version"]
+
+
+def fit_and_score(model, params, train_prepared, train_label, train_index, test_index):
+    """
+    说明：
+        用指定参数训练模型的一个副本，返回 (测试折上的 MSE, 训练耗时), 供 joblib 并行调用
+    """
+    from sklearn.base import clone
+    from sklearn.metrics import mean_squared_error
+
+    start_time = time.time()
+    estimator = clone(model).set_params(**params)
+    estimator.fit(train_prepared[train_index], train_label[train_index])
+    fit_time = time.time() - start_time
+    return mean_squared_error(train_label[test_index], estimator.predict(train_prepared[test_index])), fit_time
+
+
+class HalvingSearchModel(GridSearchModel):
+    """
+    说明:
+        逐次减半(Successive Halving)的参数搜索，适用于参数组合很多，穷举 GridSearch 太慢的情况
+        1. 第一轮用很少的资源(样本数 或 n_estimators)评估所有参数组合
+        2. 每一轮只保留评分最好的 1/factor 的参数组合，资源增加 factor 倍
+        3. 直到只剩一个参数组合，或资源达到最大值
+        输出与 GridSearchModel 相同: best_params, best_model, rmse_score
+    """
+    def __init__(self, modelname, model, param_grid, train_prepared, train_label, n_jobs=-1, backend="loky",
+                 resource="n_samples", factor=3, min_resources=None, max_resources=None, cv=5, random_state=42,
+                 full_pipeline=None, feature_schema=None, registry=None):
+        """
+        输入:
+            modelname, model, param_grid, train_prepared, train_label, n_jobs, backend,
+            full_pipeline, feature_schema, registry - 同 GridSearchModel
+            resource:(string) - "n_samples": 以训练样本数作为资源; "n_estimators": 以树的个数作为资源
+            factor:(int) - 每轮淘汰的比例，以及资源增加的倍数
+            min_resources:(int) - 第一轮的资源数，缺省按参数组合个数自动计算
+            max_resources:(int) - 最大资源数，缺省为全部样本数 或 param_grid 中最大的 n_estimators
+            cv:(int) - 交叉验证的折数
+            random_state:(int) - 抽取样本子集的随机种子
+        """
+        if modelname == "":
+            modelname = "halvingsearch_model"
+        super(HalvingSearchModel, self).__init__(modelname, model, param_grid, train_prepared, train_label,
+                                                 n_jobs, backend, full_pipeline, feature_schema, registry)
+        self.resource = resource
+        self.factor = factor
+        self.min_resources = min_resources
+        self.max_resources = max_resources
+        self.cv = cv
+        self.random_state = random_state
+        self.cv_results = []
+
+    def get_candidates(self):
+        """
+        说明：
+            展开参数组合，以 n_estimators 为资源时，从参数组合中去掉 n_estimators
+        输出:
+            (candidates, max_resources)
+        """
+        from sklearn.model_selection import ParameterGrid
+
+        max_resources = self.max_resources
+        candidates = []
+        for params in ParameterGrid(self.param_grid):
+            if self.resource == "n_estimators":
+                n_estimators = params.pop("n_estimators", None)
+                if self.max_resources is None and n_estimators is not None:
+                    max_resources = max(max_resources or 0, n_estimators)
+            if params not in candidates:
+                candidates.append(params)
+
+        if max_resources is None:
+            if self.resource == "n_estimators":
+                max_resources = self.model.get_params()["n_estimators"]
+            else:
+                max_resources = len(self.train_label)
+        return candidates, max_resources
+
+    def train_model(self, showdetail=False):
+        """
+        说明:
+            训练模型
+        输入：
+            showdetail:(bool) - True : 显示每一轮每个参数组合的训练结果；缺省为 False, 不显示
+        输出:
+            无具体返回值，当会显示训练结果，并保存最佳训练器到模型同名文件
+        """
+        from sklearn.base import clone
+        from sklearn.model_selection import KFold
+
+        candidates, max_resources = self.get_candidates()
+        n_rounds = int(np.ceil(np.log(len(candidates)) / np.log(self.factor))) if len(candidates) > 1 else 0
+        min_resources = self.min_resources
+        if min_resources is None:
+            min_resources = max_resources // (self.factor ** n_rounds)
+            if self.resource == "n_samples":
+                min_resources = max(min_resources, self.cv * 20)
+        min_resources = max(1, min(min_resources, max_resources))
+
+        # 样本子集按固定的随机排列取前 n 个，保证每一轮的子集包含上一轮的子集
+        permutation = np.random.RandomState(self.random_state).permutation(len(self.train_label))
+        self.cv_results = []
+        start_time = time.time()
+
+        with shared_train_data(self.train_prepared, self.train_label) as (train_prepared, train_label):
+            with joblib.parallel_backend(self.backend, n_jobs=self.n_jobs):
+                rung = 0
+                while True:
+                    resources = int(min(max_resources, min_resources * self.factor ** rung))
+                    if self.resource == "n_samples":
+                        sample_index = np.sort(permutation[:resources])
+                        candidate_params = candidates
+                    else:
+                        sample_index = permutation
+                        candidate_params = [dict(params, n_estimators=resources) for params in candidates]
+
+                    # 所有 参数组合 x 交叉验证折数 的任务并行执行
+                    folds = list(KFold(n_splits=self.cv).split(sample_index))
+                    results = joblib.Parallel(n_jobs=self.n_jobs, pre_dispatch="2*n_jobs")(
+                        joblib.delayed(fit_and_score)(self.model, params, train_prepared, train_label,
+                                                      sample_index[train_index], sample_index[test_index])
+                        for params in candidate_params for train_index, test_index in folds)
+                    results = np.asarray(results).reshape(len(candidates), len(folds), 2)
+                    fold_scores = results[:, :, 0]
+                    mse_scores = fold_scores.mean(axis=1)
+                    fit_times = results[:, :, 1].mean(axis=1)
+
+                    for params, mse, fit_time in zip(candidate_params, mse_scores, fit_times):
+                        self.cv_results.append({"rung": rung, "resources": resources, "params": params,
+                                                "rmse": np.sqrt(mse), "mean_fit_time": fit_time})
+                    myprint("%20s : Round %d, %s = %d, %d candidates, Best RMSE Score = %f " %
+                            (self.modelname, rung, self.resource, resources, len(candidates),
+                             np.sqrt(mse_scores.min())))
+
+                    order = np.argsort(mse_scores)
+                    if len(candidates) == 1 or resources >= max_resources:
+                        break
+                    keep = max(1, int(np.ceil(len(candidates) / float(self.factor))))
+                    candidates = [candidates[i] for i in order[:keep]]
+                    rung += 1
+
+                best = order[0]
+                self.best_params = candidate_params[best]
+                if self.resource == "n_estimators":
+                    self.best_params = dict(self.best_params, n_estimators=max_resources)
+                self.best_model = clone(self.model).set_params(**self.best_params)
+                self.best_model.fit(train_prepared, train_label)
+        self.train_time = time.time() - start_time
+
+        # 显示训练性能评分，并保存最佳训练模型
+        self.mse_score = -mse_scores[best]
+        self.rmse_score = np.sqrt(-self.mse_score)
+        self.cv_rmse = np.sqrt(fold_scores[best])
+        self.cv_fit_time = np.array([result["mean_fit_time"] for result in self.cv_results])
+        self.save_model()
+        myprint("%20s : Mean RMSE Score = %f  : Best Params = %s " % (self.modelname, self.rmse_score.mean(),
+                                                                      str(self.best_params)))
+
+        if showdetail:
+            for result in self.cv_results:
+                myprint("Round %d (%s = %d) : %f %s" % (result["rung"], self.resource, result["resources"],
+                                                        result["rmse"], str(result["params"])))